@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RegistroVisitas_Backend.settings')
 
-application = get_asgi_application()
+
+class PeticionASGI(ASGIRequest):
+    # Rutas con las variantes async de los endpoints de lectura (gestion/views_async.py)
+    urlconf = 'RegistroVisitas_Backend.urls_asgi'
+
+
+class ManejadorASGI(ASGIHandler):
+    request_class = PeticionASGI
+
+
+# Lo mismo que get_asgi_application(), con el manejador de arriba
+django.setup(set_prefix=False)
+application = ManejadorASGI()
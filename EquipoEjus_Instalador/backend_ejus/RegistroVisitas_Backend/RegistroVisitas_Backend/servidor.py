@@ -0,0 +1,305 @@
+"""Servidor de producción: wsgi.application sobre waitress (o asgi.application sobre uvicorn).
+
+runserver es el servidor de desarrollo de Django: un hilo nuevo por
+conexión, sin límite ni ajustes de keep-alive. waitress es Python puro (se empaqueta con
+PyInstaller igual que el resto) y atiende cada petición en un pool de
+hilos. Se usan hilos y no procesos por lo mismo que en gestion/jobs.py: las
+cachés del proceso (catálogo, respuestas, pool de reportes) no se
+comparten entre procesos y multiprocessing complica el .exe.
+
+Al recibir SIGINT/SIGTERM (o CTRL_BREAK en Windows) el servidor deja de
+aceptar conexiones, termina las peticiones en curso (hasta
+SERVIDOR_ESPERA_CIERRE segundos) y cierra las conexiones a la base. Cada
+petición deja una línea en el logger 'ejus.accesos'.
+
+servir_asgi() usa uvicorn (con h11, también Python puro): un proceso con un
+bucle de eventos que atiende las vistas async de gestion/views_async.py sin
+ocupar un hilo por petición; el resto de las vistas corre en hilos.
+"""
+import logging
+import logging.handlers
+import signal
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from gestion import eventos
+from waitress.server import create_server
+
+logger = logging.getLogger('ejus.accesos')
+
+
+def _registrar_acceso(cliente, metodo, ruta, protocolo, estado, enviados, inicio):
+    logger.info(
+        '%s "%s %s %s" %s %s %.1fms',
+        cliente, metodo, ruta, protocolo, estado, enviados, (time.perf_counter() - inicio) * 1000,
+    )
+
+
+class _Cuerpo:
+    """Itera la respuesta contando bytes y registra la petición al cerrarla."""
+
+    def __init__(self, iterable, al_cerrar):
+        self.iterable = iterable
+        self.al_cerrar = al_cerrar
+        self.enviados = 0
+
+    def __iter__(self):
+        for bloque in self.iterable:
+            self.enviados += len(bloque)
+            yield bloque
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.al_cerrar(self.enviados)
+
+
+class RegistroAccesos:
+    """Middleware WSGI: una línea por petición con estado, bytes y duración.
+
+    Se registra al cerrar el cuerpo, así la duración incluye las respuestas
+    en streaming (exportación CSV). Los FileResponse se dejan pasar tal cual
+    para no perder el envío directo del archivo (wsgi.file_wrapper).
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        inicio = time.perf_counter()
+        respuesta = {'estado': '-', 'largo': None}
+
+        def iniciar(estado, cabeceras, exc_info=None):
+            respuesta['estado'] = estado.split(' ', 1)[0]
+            respuesta['largo'] = next((v for k, v in cabeceras if k.lower() == 'content-length'), None)
+            return start_response(estado, cabeceras, exc_info)
+
+        def registrar(enviados):
+            ruta = environ.get('PATH_INFO', '')
+            if environ.get('QUERY_STRING'):
+                ruta = f"{ruta}?{environ['QUERY_STRING']}"
+            _registrar_acceso(
+                environ.get('REMOTE_ADDR', '-'), environ.get('REQUEST_METHOD'), ruta,
+                environ.get('SERVER_PROTOCOL'), respuesta['estado'],
+                enviados if enviados is not None else (respuesta['largo'] or '-'), inicio,
+            )
+
+        cuerpo = self.application(environ, iniciar)
+        envoltura_archivo = environ.get('wsgi.file_wrapper')
+        if isinstance(envoltura_archivo, type) and isinstance(cuerpo, envoltura_archivo):
+            registrar(None)
+            return cuerpo
+        return _Cuerpo(cuerpo, registrar)
+
+
+class RegistroAccesosASGI:
+    """RegistroAccesos para asgi.application: la misma línea por petición HTTP."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        inicio = time.perf_counter()
+        respuesta = {'estado': '-', 'enviados': 0}
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                respuesta['estado'] = mensaje['status']
+            elif mensaje['type'] == 'http.response.body':
+                respuesta['enviados'] += len(mensaje.get('body', b''))
+            await send(mensaje)
+
+        try:
+            await self.application(scope, receive, enviar)
+        finally:
+            ruta = scope['path']
+            if scope.get('query_string'):
+                ruta = f"{ruta}?{scope['query_string'].decode('latin-1')}"
+            _registrar_acceso(
+                (scope.get('client') or ('-',))[0], scope['method'], ruta,
+                f"HTTP/{scope.get('http_version', '1.1')}", respuesta['estado'], respuesta['enviados'], inicio,
+            )
+
+
+def configurar_log(archivo=None):
+    """Accesos y mensajes del servidor a un archivo rotativo (o a stderr sin archivo).
+
+    El .exe se empaqueta sin consola, así que por defecto se escribe en
+    settings.SERVIDOR_LOG_ACCESOS.
+    """
+    if archivo:
+        Path(archivo).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            archivo, maxBytes=5 * 2**20, backupCount=3, encoding='utf-8'
+        )
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    for nombre in ('ejus.accesos', 'waitress', 'uvicorn.error'):
+        registro = logging.getLogger(nombre)
+        registro.addHandler(handler)
+        registro.setLevel(logging.INFO)
+        registro.propagate = False
+
+
+class PeticionesEnCurso:
+    """Middleware WSGI que cuenta las peticiones en curso para el cierre ordenado.
+
+    Después de cerrar() responde 503 a las peticiones nuevas, así la espera no
+    se alarga con clientes que reconectan (EventSource).
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.cerrando = False
+        self._activas = 0
+        self._cambio = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        if self.cerrando:
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'text/plain; charset=utf-8'), ('Retry-After', '5'),
+            ])
+            return ['Servidor deteniéndose'.encode('utf-8')]
+        with self._cambio:
+            self._activas += 1
+        try:
+            cuerpo = self.application(environ, start_response)
+        except BaseException:
+            self._terminar()
+            raise
+        envoltura_archivo = environ.get('wsgi.file_wrapper')
+        if isinstance(envoltura_archivo, type) and isinstance(cuerpo, envoltura_archivo):
+            # waitress envía el archivo por su cuenta
+            self._terminar()
+            return cuerpo
+        return _Cuerpo(cuerpo, lambda enviados: self._terminar())
+
+    def _terminar(self):
+        with self._cambio:
+            self._activas -= 1
+            self._cambio.notify_all()
+
+    def cerrar(self):
+        self.cerrando = True
+
+    def esperar(self, timeout):
+        """Espera a que terminen las peticiones en curso; False si se agotó el tiempo."""
+        with self._cambio:
+            return self._cambio.wait_for(lambda: self._activas == 0, timeout)
+
+
+class Servidor:
+    """waitress con un cierre ordenado, solo con su API pública.
+
+    waitress.serve() corta el bucle de red en cuanto llega la señal y las
+    respuestas que aún no salieron del buffer se pierden. Aquí
+    create_server(...).run() corre en su propio hilo; al pedir el cierre se
+    responde 503 a las peticiones nuevas, se espera a las que están en curso
+    (hasta SERVIDOR_ESPERA_CIERRE segundos), se deja al bucle enviar lo que
+    quedó en los buffers y al final close() libera el socket de escucha.
+    """
+
+    # Margen para que el bucle de red envíe las últimas respuestas. close()
+    # cierra también el trigger con el que los hilos de waitress despiertan
+    # al bucle: antes de eso tienen que haber terminado
+    ESPERA_ENVIO = 1.0
+
+    def __init__(self, application, host='127.0.0.1', puerto=8000, hilos=None, espera_cierre=None):
+        self.espera_cierre = settings.SERVIDOR_ESPERA_CIERRE if espera_cierre is None else espera_cierre
+        self.hilos = hilos or settings.SERVIDOR_HILOS
+        self.peticiones = PeticionesEnCurso(application)
+        self.wsgi = create_server(
+            RegistroAccesos(self.peticiones), host=host, port=puerto, threads=self.hilos, ident='ejus',
+        )
+        self._detener = threading.Event()
+
+    @property
+    def direccion(self):
+        return self.wsgi.effective_host, self.wsgi.effective_port
+
+    def detener(self, *args):
+        """Pide el cierre; se puede llamar desde un manejador de señal u otro hilo."""
+        self._detener.set()
+
+    def _servir(self):
+        while True:
+            try:
+                self.wsgi.run()
+                return
+            except OSError:
+                # close() desde otro hilo puede cerrar un socket que el select()
+                # en curso aún vigilaba; en la siguiente vuelta ya no está
+                if not self._detener.is_set():
+                    raise
+
+    def ejecutar(self):
+        bucle = threading.Thread(target=self._servir, name='waitress-bucle', daemon=True)
+        bucle.start()
+        # Con tiempo de espera para que las señales se atiendan también en Windows
+        while not self._detener.wait(0.5):
+            if not bucle.is_alive():
+                break
+
+        self.peticiones.cerrar()
+        # Los flujos de eventos (SSE) no terminan solos
+        eventos.difusor.cerrar_todas()
+        if not self.peticiones.esperar(self.espera_cierre):
+            logger.warning('Cierre con peticiones aún en curso tras %ss', self.espera_cierre)
+        # Las conexiones keep-alive inactivas mantienen vivo run(): no se las espera
+        bucle.join(self.ESPERA_ENVIO)
+        self.wsgi.close()
+        connections.close_all()
+
+
+def servir(host='127.0.0.1', puerto=8000, hilos=None, log_accesos=None):
+    """Arranca el servidor en primer plano hasta recibir una señal de cierre."""
+    from .wsgi import application
+
+    configurar_log(settings.SERVIDOR_LOG_ACCESOS if log_accesos is None else log_accesos)
+    servidor = Servidor(application, host=host, puerto=puerto, hilos=hilos)
+    for nombre in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, nombre):
+            signal.signal(getattr(signal, nombre), servidor.detener)
+    logger.info(
+        'Sirviendo en http://%s:%s con %s hilos', *servidor.direccion, servidor.hilos
+    )
+    servidor.ejecutar()
+    logger.info('Servidor detenido')
+
+
+def servir_asgi(host='127.0.0.1', puerto=8000, log_accesos=None):
+    """Como servir(), pero con asgi.application sobre uvicorn.
+
+    uvicorn maneja SIGINT/SIGTERM (y CTRL_BREAK): deja de aceptar conexiones
+    y espera a las peticiones en curso hasta SERVIDOR_ESPERA_CIERRE segundos.
+    Un solo proceso por lo mismo que con waitress.
+    """
+    import uvicorn
+
+    from .asgi import application
+
+    class ServidorASGI(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            # Los flujos de eventos (SSE) no terminan solos
+            eventos.difusor.cerrar_todas()
+            super().handle_exit(sig, frame)
+
+    configurar_log(settings.SERVIDOR_LOG_ACCESOS if log_accesos is None else log_accesos)
+    config = uvicorn.Config(
+        RegistroAccesosASGI(application), host=host, port=puerto,
+        # Implementaciones en Python puro; lifespan no lo usa Django
+        http='h11', loop='asyncio', lifespan='off',
+        log_config=None, access_log=False,
+        timeout_graceful_shutdown=settings.SERVIDOR_ESPERA_CIERRE,
+    )
+    logger.info('Sirviendo (ASGI) en http://%s:%s', host, puerto)
+    # Al terminar, uvicorn vuelve a emitir la señal recibida y el proceso sale con ella
+    ServidorASGI(config).run()
@@ -103,9 +103,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Cada hilo del servidor conserva su conexión; se verifica antes de reutilizarla
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Las transacciones toman el lock de escritura al empezar: con WAL, una
+            # transacción que lee y luego escribe no falla con "database is locked"
+            # si otra escribió en medio, sino que espera su turno (busy_timeout)
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# PRAGMAs aplicados a cada conexión SQLite nueva (gestion/sqlite.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Milisegundos que una escritura espera el lock antes de fallar
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 2**20,
+    # Negativo: en KiB (64 MiB de caché de páginas por conexión)
+    'cache_size': -64000,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -146,4 +166,55 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 # Update settings for in-place updater
 UPDATE_INSTALLER_URL = None  # configure with a URL to your installer (e.g., GitHub release asset)
-UPDATE_TOKEN = None  # set a secret token to authorize update requests
\ No newline at end of file
+UPDATE_TOKEN = None  # set a secret token to authorize update requests
+
+# Generación de reportes PDF/Excel en segundo plano (gestion/jobs.py)
+REPORTES_DIR = BASE_DIR / 'reportes_generados'
+REPORTES_JOB_WORKERS = 2
+# Los reportes terminados (y sus archivos) se borran pasado este tiempo
+REPORTES_RETENCION_HORAS = 24
+
+# Caché en disco de los PDF/Excel exportados (gestion/cache.py, CacheArchivos)
+REPORTES_CACHE_DIR = BASE_DIR / 'reportes_cache'
+REPORTES_CACHE_MAX_MB = 200
+
+# Cachés de Django. 'default' vive en la memoria del proceso; 'archivo' en disco
+# y se comparte entre procesos del mismo equipo.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ejus',
+    },
+    'archivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_respuestas',
+    },
+}
+# Caché de respuestas de lectura (gestion/cache.py, cachear_respuesta): alias de CACHES
+CACHE_RESPUESTAS = 'default'
+# Las escrituras invalidan al instante; el TTL solo acota datos que dependen de la hora
+CACHE_RESPUESTAS_TTL = 60
+
+# Servidor de producción (django_backend.py --produccion, RegistroVisitas_Backend/servidor.py)
+SERVIDOR_HILOS = 8
+# Al cerrar, segundos de espera para las peticiones en curso
+SERVIDOR_ESPERA_CIERRE = 10
+# Log de accesos (rotativo); None escribe en stderr
+SERVIDOR_LOG_ACCESOS = BASE_DIR / 'logs' / 'accesos.log'
+
+# Eventos en vivo del dashboard por SSE (gestion/eventos.py, /api/eventos/)
+# Conexiones simultáneas por WSGI: cada una ocupa uno de los SERVIDOR_HILOS
+EVENTOS_MAX_FLUJOS = 4
+# Deltas en cola por cliente antes de descartarlos y pedirle que recargue
+EVENTOS_MAX_PENDIENTES = 100
+# Los contadores se envían como mucho una vez por este intervalo (segundos)
+EVENTOS_INTERVALO_CONTADORES = 1
+# Segundos sin tráfico antes de enviar un latido
+EVENTOS_LATIDO = 15
+# Espera del navegador antes de reconectar (retry de EventSource)
+EVENTOS_REINTENTO_MS = 3000
+
+# Sincronización incremental (gestion/cambios.py, /api/visitantes/changes/): solo se
+# entregan cambios con esta antigüedad en segundos, para no saltar escrituras que aún
+# no confirmaron (SQLITE_PRAGMAS busy_timeout es de 5 s)
+CAMBIOS_MARGEN = 5
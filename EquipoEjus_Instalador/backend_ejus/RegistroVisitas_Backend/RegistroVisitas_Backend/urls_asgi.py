@@ -0,0 +1,13 @@
+"""URLconf del punto de entrada ASGI (asgi.py).
+
+Las variantes async de los endpoints de lectura (gestion/urls_async.py) van
+primero y toman esas rutas; el resto se resuelve con las mismas rutas que
+por WSGI.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as urlpatterns_wsgi
+
+urlpatterns = [
+    path('api/', include('gestion.urls_async')),
+] + urlpatterns_wsgi
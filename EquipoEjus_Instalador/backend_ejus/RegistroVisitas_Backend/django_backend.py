@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 import django
@@ -6,10 +7,38 @@ from django.core.management import execute_from_command_line
 # Configurar el entorno de Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RegistroVisitas_Backend.settings')
 
+
+def argumentos():
+    parser = argparse.ArgumentParser(description='Backend de EquipoEjus')
+    parser.add_argument('--produccion', action='store_true',
+                        default=os.environ.get('EJUS_SERVIDOR') == 'produccion',
+                        help='Servir con waitress (RegistroVisitas_Backend/servidor.py) en lugar de runserver')
+    parser.add_argument('--asgi', action='store_true',
+                        help='Con --produccion: servir asgi.application con uvicorn (vistas async de lectura)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--hilos', type=int, default=None,
+                        help='Hilos que atienden peticiones (por defecto settings.SERVIDOR_HILOS)')
+    parser.add_argument('--log-accesos', default=None,
+                        help="Archivo del log de accesos; '-' escribe en stderr")
+    # Versiones anteriores de main.js pasan "runserver 127.0.0.1:8000 --noreload": se ignoran
+    opciones, _ = parser.parse_known_args()
+    return opciones
+
+
 def main():
+    opciones = argumentos()
     django.setup()
-    # Ejecuta el servidor en el puerto 8000
-    execute_from_command_line(['manage.py', 'runserver', '127.0.0.1:8000', '--noreload'])
+    if opciones.produccion:
+        from RegistroVisitas_Backend import servidor
+        log_accesos = '' if opciones.log_accesos == '-' else opciones.log_accesos
+        if opciones.asgi:
+            servidor.servir_asgi(host=opciones.host, puerto=opciones.puerto, log_accesos=log_accesos)
+        else:
+            servidor.servir(host=opciones.host, puerto=opciones.puerto, hilos=opciones.hilos, log_accesos=log_accesos)
+    else:
+        # Servidor de desarrollo de Django
+        execute_from_command_line(['manage.py', 'runserver', f'{opciones.host}:{opciones.puerto}', '--noreload'])
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,12 +1,37 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# Módulos que se importan por nombre en tiempo de ejecución y PyInstaller no ve:
+# uvicorn elige protocolo, bucle y lifespan con cadenas (servidor.servir_asgi)
+# y las urls async se cargan con include('gestion.urls_async').
+hiddenimports = [
+    'uvicorn.logging',
+    'uvicorn.loops.auto',
+    'uvicorn.loops.asyncio',
+    'uvicorn.protocols.http.auto',
+    'uvicorn.protocols.http.h11_impl',
+    'uvicorn.protocols.websockets.auto',
+    'uvicorn.lifespan.on',
+    'uvicorn.lifespan.off',
+    'h11',
+    'waitress',
+    'waitress.server',
+    'waitress.wasyncore',
+    'waitress.channel',
+    'waitress.task',
+    'waitress.trigger',
+    'RegistroVisitas_Backend.servidor',
+    'RegistroVisitas_Backend.asgi',
+    'RegistroVisitas_Backend.urls_asgi',
+    'gestion.urls_async',
+    'gestion.views_async',
+]
 
 a = Analysis(
     ['manage.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=hiddenimports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
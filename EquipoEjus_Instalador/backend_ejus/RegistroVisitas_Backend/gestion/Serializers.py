@@ -1,9 +1,77 @@
+from django.db import models
+from django.db.models import Count
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Visitante
+from . import catalogo
+from .models import ReporteJob, Visitante, VisitanteEvento
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _clave_conteo(visitante):
+    if visitante.persona_id:
+        return ('persona', visitante.persona_id)
+    return ('cedula', visitante.cedula)
+
+
+def contar_visitas(visitantes):
+    """Cuenta las visitas de cada persona (o cédula, si no tiene persona) de un lote.
+
+    Hace como mucho dos consultas agrupadas sin importar el tamaño del lote.
+    """
+    personas = {v.persona_id for v in visitantes if v.persona_id}
+    cedulas = {v.cedula for v in visitantes if not v.persona_id}
+    conteos = {}
+    if personas:
+        filas = (Visitante.objects.filter(persona_id__in=personas).order_by()
+                 .values_list('persona').annotate(n=Count('id')))
+        conteos.update({('persona', pk): n for pk, n in filas})
+    if cedulas:
+        filas = (Visitante.objects.filter(cedula__in=cedulas).order_by()
+                 .values_list('cedula').annotate(n=Count('id')))
+        conteos.update({('cedula', cedula): n for cedula, n in filas})
+    return conteos
+
+
+class NombreCatalogoField(serializers.CharField):
+    """Municipio o parroquia como texto, aunque en la base sea una clave del catálogo.
+
+    Al leer, el nombre sale del catálogo en memoria (sin JOIN ni consulta por
+    fila); al escribir se recibe el nombre, VisitanteSerializer.validate()
+    lo revisa y VisitanteSerializer.ubicar() lo resuelve con
+    catalogo.resolver() al guardar.
+    """
+
+    def __init__(self, nombre, **kwargs):
+        self.nombre = nombre
+        kwargs.setdefault('max_length', 100)
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('allow_blank', True)
+        kwargs.setdefault('allow_null', True)
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return getattr(instance, f'{self.source}_id')
+
+    def to_representation(self, value):
+        return self.nombre(value)
+
+
+class VisitanteListSerializer(serializers.ListSerializer):
+    """Resuelve los conteos de visitas de toda la página antes de serializar cada fila.
+
+    Los conteos viajan en el contexto de una copia del hijo; el hijo
+    compartido no se modifica.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        visitantes = list(iterable)
+        hijo = self.child.__class__(context={**self.context, 'conteos_visitas': contar_visitas(visitantes)})
+        return [hijo.to_representation(visitante) for visitante in visitantes]
+
+
 class VisitanteSerializer(serializers.ModelSerializer):
     nombre_completo = serializers.SerializerMethodField()
     duracion_atencion = serializers.SerializerMethodField()
@@ -12,9 +80,12 @@ class VisitanteSerializer(serializers.ModelSerializer):
     requiere_referir = serializers.SerializerMethodField()
     visit_count = serializers.SerializerMethodField()
     persona = serializers.SerializerMethodField()
+    municipio = NombreCatalogoField(catalogo.nombre_municipio)
+    parroquia = NombreCatalogoField(catalogo.nombre_parroquia)
     
     class Meta:
         model = Visitante
+        list_serializer_class = VisitanteListSerializer
         fields = [
             'id',
             'nombre',
@@ -35,7 +106,6 @@ class VisitanteSerializer(serializers.ModelSerializer):
             'duracion_atencion',
             'estado',
             'observaciones',
-            'historial',
             'visit_count',
             'persona',
             'creado_por',
@@ -46,13 +116,23 @@ class VisitanteSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'fecha_hora_ingreso', 
             'fecha_hora_salida', 
-            'historial',
             'creado_por',
             'actualizado_por',
             'creado_en',
             'actualizado_en'
         ]
     
+    def create(self, validated_data):
+        return super().create(self.ubicar(validated_data))
+
+    def update(self, instance, validated_data):
+        self.ubicar(validated_data)
+        # Solo se escriben las columnas recibidas, más la marca de actualización
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'actualizado_en'])
+        return instance
+
     def get_nombre_completo(self, obj):
         return obj.nombre
     
@@ -68,17 +148,16 @@ class VisitanteSerializer(serializers.ModelSerializer):
     def get_requiere_referir(self, obj):
         return obj.requiere_referir
 
+    def to_representation(self, instance):
+        # context['conteos_visitas']: conteos por _clave_conteo, los de todo el lote en un listado
+        if 'conteos_visitas' in self.context:
+            return super().to_representation(instance)
+        # Serialización de un solo visitante (create, update, registrar_salida)
+        contexto = {**self.context, 'conteos_visitas': contar_visitas([instance])}
+        return self.__class__(context=contexto).to_representation(instance)
+
     def get_visit_count(self, obj):
-        # Prefer annotated value to avoid extra queries
-        try:
-            if hasattr(obj, 'visit_count'):
-                return getattr(obj, 'visit_count') or 0
-            if getattr(obj, 'persona', None):
-                return obj.persona.visitas.count()
-            return Visitante.objects.filter(cedula=obj.cedula).count()
-        except Exception as e:
-            logger.exception('Error calculando visit_count: %s', e)
-            return 0
+        return self.context['conteos_visitas'].get(_clave_conteo(obj), 0)
 
     def get_persona(self, obj):
         p = getattr(obj, 'persona', None)
@@ -90,39 +169,9 @@ class VisitanteSerializer(serializers.ModelSerializer):
             'nombre': p.nombre,
             'telefono': p.telefono,
             'creado_en': p.creado_en,
-            'visit_count': p.visitas.count()
+            'visit_count': self.context['conteos_visitas'].get(('persona', p.id), 0)
         }
 
-    # Extract creator and last updater from the historial text
-    creado_por = serializers.SerializerMethodField()
-    actualizado_por = serializers.SerializerMethodField()
-
-    def get_creado_por(self, obj):
-        if not obj.historial:
-            return None
-        # buscar la primera ocurrencia de 'Creado por:'
-        for line in (obj.historial or '').splitlines():
-            if 'Creado por:' in line:
-                try:
-                    return line.split('Creado por:')[1].strip()
-                except Exception as e:
-                    logger.exception('Error extrayendo creado_por: %s', e)
-                    return line.strip()
-        return None
-
-    def get_actualizado_por(self, obj):
-        if not obj.historial:
-            return None
-        # buscar la última ocurrencia de 'Actualizado por:'
-        lines = [l for l in (obj.historial or '').splitlines() if 'Actualizado por:' in l]
-        if lines:
-            try:
-                return lines[-1].split('Actualizado por:')[1].strip()
-            except Exception as e:
-                logger.exception('Error extrayendo actualizado_por: %s', e)
-                return lines[-1].strip()
-        return None
-    
     def validate_cedula(self, value):
         """Validación personalizada para cédula"""
         if len(value) < 6 or len(value) > 20:
@@ -138,9 +187,57 @@ class VisitanteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'otra_institucion': 'Debe especificar la otra institución'
             })
-        
+
+        if 'municipio' in data or 'parroquia' in data:
+            data['municipio'], data['parroquia'] = self._nombres_ubicacion(data)
         return data
 
+    def _nombres_ubicacion(self, data):
+        """Nombres de municipio y parroquia a guardar; ubicar() los convierte en registros.
+
+        En una edición parcial el dato que no llega se toma del visitante: la
+        parroquia se busca dentro del municipio, así que se resuelven juntos.
+        """
+        actual = self.instance
+        if 'municipio' in data:
+            municipio = data['municipio']
+        else:
+            municipio = catalogo.nombre_municipio(actual.municipio_id) if actual else None
+        if 'parroquia' in data:
+            parroquia = data['parroquia']
+        else:
+            parroquia = catalogo.nombre_parroquia(actual.parroquia_id) if actual else None
+        if catalogo.limpiar(parroquia) and not catalogo.limpiar(municipio):
+            raise serializers.ValidationError({'parroquia': 'Indique el municipio de la parroquia'})
+        return municipio, parroquia
+
+    @staticmethod
+    def ubicar(datos):
+        """Cambia los nombres validados por registros del catálogo (crea los que falten).
+
+        Se llama dentro de la transacción que guarda al visitante: si falla o
+        se revierte, no quedan municipios ni parroquias nuevos en el catálogo.
+        """
+        if 'municipio' in datos:
+            datos['municipio'], datos['parroquia'] = catalogo.resolver(datos['municipio'], datos['parroquia'])
+        return datos
+
+class VisitanteEventoSerializer(serializers.ModelSerializer):
+    accion_display = serializers.CharField(source='get_accion_display', read_only=True)
+
+    class Meta:
+        model = VisitanteEvento
+        fields = ['id', 'accion', 'accion_display', 'usuario', 'fecha', 'detalle']
+
+
+class VisitanteDetalleSerializer(VisitanteSerializer):
+    """Visitante con su bitácora de eventos; solo para detalle, alta y edición."""
+    eventos = VisitanteEventoSerializer(many=True, read_only=True)
+
+    class Meta(VisitanteSerializer.Meta):
+        fields = VisitanteSerializer.Meta.fields + ['eventos']
+
+
 class EstadisticasSerializer(serializers.Serializer):
     total = serializers.IntegerField()
     diario = serializers.IntegerField()
@@ -197,6 +294,8 @@ class VisitanteExportSerializer(serializers.ModelSerializer):
     referir_a_display = serializers.CharField(source='get_referir_a_display')
     estado = serializers.SerializerMethodField()
     requiere_referir = serializers.SerializerMethodField()
+    municipio = NombreCatalogoField(catalogo.nombre_municipio, read_only=True)
+    parroquia = NombreCatalogoField(catalogo.nombre_parroquia, read_only=True)
     
     class Meta:
         model = Visitante
@@ -236,4 +335,21 @@ class ReferidosReporteSerializer(serializers.Serializer):
     total_referidos = serializers.IntegerField()
     porcentaje_referidos = serializers.FloatField()
     instituciones = ReferidoEstadisticasSerializer(many=True)
-    metadata = serializers.DictField()
\ No newline at end of file
+    metadata = serializers.DictField()
+
+class ReporteJobSerializer(serializers.ModelSerializer):
+    url_descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteJob
+        fields = [
+            'id', 'tipo', 'estado', 'parametros', 'nombre_archivo', 'error',
+            'solicitado_por', 'creado_en', 'iniciado_en', 'finalizado_en', 'url_descarga',
+        ]
+
+    def get_url_descarga(self, obj):
+        if obj.estado != ReporteJob.COMPLETADO:
+            return None
+        url = reverse('reporte-job-descargar', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class GestionConfig(AppConfig):
     name = 'gestion'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .sqlite import configurar_conexion
+        connection_created.connect(configurar_conexion, dispatch_uid='gestion.sqlite.configurar_conexion')
@@ -0,0 +1,128 @@
+"""Búsqueda de visitantes con un índice FTS5 de SQLite.
+
+La tabla virtual gestion_visitante_fts guarda nombre, cédula, teléfono y los
+nombres de municipio y parroquia de cada visitante (rowid = id) y se mantiene
+con triggers. Municipio y parroquia son claves del catálogo en
+gestion_visitante, así que la tabla FTS guarda su propia copia del texto
+(no puede ser de contenido externo) y los triggers de gestion_municipio y
+gestion_parroquia reindexan a los visitantes de un nombre que cambia. El
+tokenizador unicode61 con remove_diacritics hace que "Jose" encuentre "José".
+Cada término busca palabras que empiecen por él: a diferencia de la búsqueda
+anterior (__icontains), un fragmento del medio de una palabra ya no
+coincide ("ribarren" no encuentra "Iribarren").
+En otros motores, o si el índice no existe, se usa la búsqueda anterior con
+__icontains.
+
+Las migraciones que reconstruyan gestion_visitante o el catálogo en SQLite
+(AlterField, RemoveField...) eliminan los triggers: deben volver a llamar a
+instalar_fts().
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'gestion_visitante_fts'
+COLUMNAS_FTS = ('nombre', 'cedula', 'telefono', 'municipio', 'parroquia')
+# Columnas de gestion_visitante de las que se alimenta el índice
+COLUMNAS_VISITANTE = ('nombre', 'cedula', 'telefono', 'municipio_id', 'parroquia_id')
+
+_fts_disponible = None
+
+
+def _valores(alias):
+    """rowid y COLUMNAS_FTS de la fila `alias` de gestion_visitante, para un INSERT ... SELECT."""
+    return (
+        f'{alias}.id, {alias}.nombre, {alias}.cedula, {alias}.telefono, '
+        f'(SELECT nombre FROM gestion_municipio WHERE id = {alias}.municipio_id), '
+        f'(SELECT nombre FROM gestion_parroquia WHERE id = {alias}.parroquia_id)'
+    )
+
+
+def instalar_fts(conn):
+    """Crea (o recrea) la tabla FTS5, sus triggers y la rellena desde gestion_visitante."""
+    columnas = ', '.join(COLUMNAS_FTS)
+    insertar = f'INSERT INTO {TABLA_FTS}(rowid, {columnas})'
+    sentencias = [
+        *_sentencias_eliminar(),
+        f"""CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+            {columnas},
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON gestion_visitante BEGIN
+            {insertar} SELECT {_valores('new')};
+        END""",
+        f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON gestion_visitante BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {', '.join(COLUMNAS_VISITANTE)} ON gestion_visitante BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+            {insertar} SELECT {_valores('new')};
+        END""",
+        *[
+            f"""CREATE TRIGGER {TABLA_FTS}_{tabla}_au AFTER UPDATE OF nombre ON gestion_{tabla} BEGIN
+                DELETE FROM {TABLA_FTS} WHERE rowid IN (SELECT id FROM gestion_visitante WHERE {tabla}_id = new.id);
+                {insertar} SELECT {_valores('v')} FROM gestion_visitante v WHERE v.{tabla}_id = new.id;
+            END"""
+            for tabla in ('municipio', 'parroquia')
+        ],
+        f"{insertar} SELECT {_valores('v')} FROM gestion_visitante v",
+    ]
+    with conn.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+
+
+def eliminar_fts(conn):
+    with conn.cursor() as cursor:
+        for sql in _sentencias_eliminar():
+            cursor.execute(sql)
+
+
+def _sentencias_eliminar():
+    return [
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_municipio_au',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_parroquia_au',
+        f'DROP TABLE IF EXISTS {TABLA_FTS}',
+    ]
+
+
+def fts_disponible():
+    """Indica si la base actual es SQLite y tiene la tabla FTS instalada."""
+    global _fts_disponible
+    if connection.vendor != 'sqlite':
+        return False
+    if _fts_disponible is None:
+        _fts_disponible = TABLA_FTS in connection.introspection.table_names()
+    return _fts_disponible
+
+
+def expresion_fts(texto):
+    """Convierte el texto del buscador en una consulta FTS5 de prefijos unidos con AND.
+
+    'jose per' -> '"jose"* "per"*'. Devuelve None si no hay términos utilizables.
+    """
+    terminos = re.findall(r'\w+', texto)
+    if not terminos:
+        return None
+    return ' '.join(f'"{t}"*' for t in terminos)
+
+
+def filtrar_busqueda(queryset, texto):
+    """Filtra visitantes por nombre, cédula, teléfono, municipio o parroquia."""
+    expresion = expresion_fts(texto) if fts_disponible() else None
+    if expresion:
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', (expresion,)
+        ))
+    return queryset.filter(
+        Q(nombre__icontains=texto) |
+        Q(cedula__icontains=texto) |
+        Q(telefono__icontains=texto) |
+        Q(municipio__nombre__icontains=texto) |
+        Q(parroquia__nombre__icontains=texto)
+    )
@@ -0,0 +1,341 @@
+"""Cachés de los endpoints de lectura más consultados.
+
+- TTLCache: resultados pequeños en memoria del proceso (estadísticas).
+- cachear_respuesta: respuestas completas de APIView en la caché de Django
+  elegida por settings.CACHE_RESPUESTAS ('default' en memoria o 'archivo' en
+  disco). Las claves incluyen un contador de generación que se incrementa
+  con cada escritura de Visitante/Persona, así todas las respuestas
+  dependientes vencen juntas sin recorrerlas. acachear_respuesta hace lo
+  mismo para las vistas async (views_async.py).
+- CacheArchivos: PDF/Excel exportados, en disco.
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+class TTLCache:
+    """Caché clave/valor con expiración por tiempo, segura entre hilos.
+
+    Pensada para resultados pequeños (dicts de conteos) que se consultan
+    muchas veces por segundo y se invalidan explícitamente al escribir.
+    """
+
+    def __init__(self, ttl, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expira, valor = item
+            if expira < time.monotonic():
+                del self._data[key]
+                return default
+            return valor
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.max_entries and key not in self._data:
+                # Descartar primero las entradas vencidas; si no hay, la más antigua
+                ahora = time.monotonic()
+                vencidas = [k for k, (expira, _) in self._data.items() if expira < ahora]
+                for k in vencidas or [next(iter(self._data))]:
+                    del self._data[k]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key, calcular):
+        """Devuelve el valor en caché o lo calcula con `calcular()` y lo guarda."""
+        valor = self.get(key)
+        if valor is None:
+            valor = calcular()
+            self.set(key, valor)
+        return valor
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Estadísticas de ContextoReporte, compartidas por /reportes/estadisticas/ y las exportaciones
+estadisticas_cache = TTLCache(ttl=10)
+# Catálogo de municipios (catalogo.py); se vacía al agregar entradas, el TTL
+# alcanza a los demás procesos
+catalogo_cache = TTLCache(ttl=60)
+
+
+def coincide_etag(request, etag):
+    """True si la petición trae If-None-Match con `etag` (o '*')."""
+    valores = [valor.strip() for valor in request.headers.get('If-None-Match', '').split(',')]
+    return etag in valores or '*' in valores
+
+
+CLAVE_GENERACION = 'gestion:generacion'
+
+
+def cache_respuestas():
+    return caches[settings.CACHE_RESPUESTAS]
+
+
+def generacion():
+    """Generación actual de los datos; cambia con cada escritura de visitantes o personas."""
+    return cache_respuestas().get_or_set(CLAVE_GENERACION, 0, timeout=None)
+
+
+def incrementar_generacion():
+    # Leer y escribir no es atómico entre procesos, pero dos incrementos que se
+    # pisan siguen cambiando el valor, que es lo único que importa
+    cache_respuestas().set(CLAVE_GENERACION, generacion() + 1, timeout=None)
+
+
+def _invalidar():
+    estadisticas_cache.clear()
+    incrementar_generacion()
+
+
+def invalidar():
+    """Invalida las cachés de lectura tras una escritura.
+
+    Se invalida en el momento y otra vez al confirmar la transacción: una
+    lectura concurrente entre ambos momentos podría haber guardado datos
+    anteriores al commit con la generación nueva.
+    """
+    _invalidar()
+    transaction.on_commit(_invalidar)
+
+
+class EstadisticasRespuestas:
+    """Aciertos, fallos y latencia media por vista de cachear_respuesta()."""
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, vista, acierto, segundos):
+        with self._lock:
+            datos = self._datos.setdefault(vista, [0, 0, 0.0, 0.0])
+            indice = 0 if acierto else 1
+            datos[indice] += 1
+            datos[indice + 2] += segundos
+
+    def resumen(self):
+        with self._lock:
+            return {
+                vista: {
+                    'aciertos': aciertos,
+                    'fallos': fallos,
+                    'ms_promedio_acierto': round(t_aciertos * 1000 / aciertos, 2) if aciertos else None,
+                    'ms_promedio_fallo': round(t_fallos * 1000 / fallos, 2) if fallos else None,
+                }
+                for vista, (aciertos, fallos, t_aciertos, t_fallos) in sorted(self._datos.items())
+            }
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+estadisticas_respuestas = EstadisticasRespuestas()
+
+
+def _usuario(request, user=None):
+    user = user if user is not None else getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'id:{user.pk}'
+    return f'x:{request.headers.get("X-Usuario", "")}'
+
+
+def clave_respuesta(request, user=None, generacion_actual=None):
+    """Ruta + parámetros normalizados + usuario + día local + generación.
+
+    Las vistas async pasan el usuario y la generación ya resueltos: leerlos
+    aquí sería una consulta síncrona.
+    """
+    if generacion_actual is None:
+        generacion_actual = generacion()
+    parametros = sorted((nombre, valor) for nombre in request.GET for valor in request.GET.getlist(nombre))
+    huella = json.dumps([
+        request.path, parametros, _usuario(request, user), timezone.localdate().isoformat(), generacion_actual,
+    ])
+    return 'gestion:respuesta:' + hashlib.sha256(huella.encode('utf-8')).hexdigest()
+
+
+def cachear_respuesta(get):
+    """Decora el get() de un APIView (o una @action) para servirlo desde cache_respuestas().
+
+    Solo se guardan respuestas 200 de DRF; se guarda su .data, no el render.
+    """
+    @functools.wraps(get)
+    def envoltura(self, request, *args, **kwargs):
+        inicio = time.perf_counter()
+        vista = f'{type(self).__name__}.{get.__name__}'
+        backend = cache_respuestas()
+        clave = clave_respuesta(request)
+        guardado = backend.get(clave)
+        if guardado is not None:
+            response = Response(guardado)
+            response['X-Cache'] = 'HIT'
+        else:
+            response = get(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                backend.set(clave, response.data, timeout=settings.CACHE_RESPUESTAS_TTL)
+            response['X-Cache'] = 'MISS'
+        estadisticas_respuestas.registrar(vista, guardado is not None, time.perf_counter() - inicio)
+        return response
+    return envoltura
+
+
+def acachear_respuesta(vista):
+    """cachear_respuesta() para las vistas async de views_async.py.
+
+    La vista devuelve los datos (lo que sería el .data del Response de DRF)
+    y aquí se renderizan con el JSONRenderer de DRF, así el cuerpo es el
+    mismo que el de la vista síncrona. La clave también es la misma, de modo
+    que ambas comparten las entradas guardadas. Requiere request.usuario_api
+    (views_async.autenticado).
+    """
+    @functools.wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        inicio = time.perf_counter()
+        backend = cache_respuestas()
+        generacion_actual = await backend.aget_or_set(CLAVE_GENERACION, 0, timeout=None)
+        clave = clave_respuesta(request, request.usuario_api, generacion_actual)
+        datos = await backend.aget(clave)
+        acierto = datos is not None
+        if not acierto:
+            datos = await vista(request, *args, **kwargs)
+            await backend.aset(clave, datos, timeout=settings.CACHE_RESPUESTAS_TTL)
+        response = HttpResponse(JSONRenderer().render(datos), content_type='application/json')
+        response['X-Cache'] = 'HIT' if acierto else 'MISS'
+        estadisticas_respuestas.registrar(f'async.{vista.__name__}', acierto, time.perf_counter() - inicio)
+        return response
+    return envoltura
+
+
+class CacheArchivos:
+    """Caché de archivos en disco con desalojo LRU por tamaño total, segura entre hilos.
+
+    Cada entrada son dos archivos: <clave>.bin con el contenido y <clave>.json
+    con sus metadatos. El último uso se guarda en el mtime del .bin, así el
+    orden LRU sobrevive a reinicios del servidor.
+
+    Un .bin puede estar abierto por un FileResponse que aún lo envía. En
+    Windows no se puede reemplazar ni borrar mientras tanto: esa escritura o
+    ese desalojo se omiten y se reintentan en la próxima escritura.
+    """
+
+    def __init__(self, directorio, max_bytes):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self.revalidaciones = 0
+        self._lock = threading.Lock()
+
+    def _rutas(self, clave):
+        return self.directorio / f'{clave}.bin', self.directorio / f'{clave}.json'
+
+    def get(self, clave):
+        """Devuelve (archivo abierto en binario, metadatos) o None si no está."""
+        datos, meta = self._rutas(clave)
+        with self._lock:
+            try:
+                metadatos = json.loads(meta.read_text(encoding='utf-8'))
+                # Se abre dentro del lock para que un desalojo concurrente no lo borre antes
+                archivo = open(datos, 'rb')
+                os.utime(datos)
+            except (OSError, ValueError):
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+        return archivo, metadatos
+
+    def set(self, clave, contenido, metadatos):
+        if len(contenido) > self.max_bytes:
+            return
+        datos, meta = self._rutas(clave)
+        with self._lock:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            temporal = datos.with_suffix('.tmp')
+            try:
+                temporal.write_bytes(contenido)
+                os.replace(temporal, datos)
+            except OSError:
+                # La versión anterior de la entrada se está enviando: esta respuesta no se guarda
+                temporal.unlink(missing_ok=True)
+                return
+            meta.write_text(json.dumps(metadatos), encoding='utf-8')
+            self._desalojar()
+
+    def registrar_revalidacion(self):
+        """Cuenta una respuesta 304 (el cliente ya tenía la versión vigente)."""
+        with self._lock:
+            self.revalidaciones += 1
+
+    def _entradas(self):
+        entradas = []
+        for ruta in self.directorio.glob('*.bin'):
+            try:
+                info = ruta.stat()
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, ruta))
+        return entradas
+
+    def _desalojar(self):
+        entradas = self._entradas()
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            if self._borrar(ruta):
+                total -= tamano
+
+    @staticmethod
+    def _borrar(ruta):
+        """Borra una entrada; False si su .bin sigue abierto (se queda para un próximo desalojo)."""
+        try:
+            ruta.unlink(missing_ok=True)
+            ruta.with_suffix('.json').unlink(missing_ok=True)
+        except OSError:
+            return False
+        return True
+
+    def estadisticas(self):
+        with self._lock:
+            entradas = self._entradas() if self.directorio.exists() else []
+            return {
+                'entradas': len(entradas),
+                'bytes': sum(tamano for _, tamano, _ in entradas),
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'revalidaciones': self.revalidaciones,
+            }
+
+    def clear(self):
+        with self._lock:
+            for ruta in list(self.directorio.glob('*.bin')) if self.directorio.exists() else []:
+                self._borrar(ruta)
+
+
+# PDF/Excel de ExportarReportePDFView y ExportarReporteExcelView
+reportes_archivos_cache = CacheArchivos(
+    settings.REPORTES_CACHE_DIR, settings.REPORTES_CACHE_MAX_MB * 1024 * 1024
+)
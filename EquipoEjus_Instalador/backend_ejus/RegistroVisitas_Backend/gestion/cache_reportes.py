@@ -0,0 +1,83 @@
+"""Caché en disco de los reportes PDF/Excel exportados.
+
+La clave es un hash del tipo de reporte, los parámetros de la petición, el
+usuario (la portada dice quién lo generó), la fecha local (el reporte
+depende de "hoy") y una versión de los datos. La
+versión cambia con cualquier alta, edición o borrado de visitantes, así que
+una entrada nunca queda desactualizada: simplemente deja de usarse y el
+desalojo LRU de CacheArchivos la elimina cuando hace falta espacio. La hora
+de "Generado:" de una copia servida desde la caché es la de su generación,
+con los mismos datos que tendría un reporte nuevo.
+
+La misma clave se envía como ETag; un cliente que repite la petición con
+If-None-Match recibe 304 sin que se genere ni lea el archivo.
+"""
+import functools
+import hashlib
+import json
+
+from django.db.models import Max, Sum
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+
+from .cache import _usuario, coincide_etag, reportes_archivos_cache
+from .models import Visitante, VisitaRollupDiario
+
+
+def version_datos():
+    """Sello de la versión de los datos de visitantes.
+
+    Max(id) cambia con cada alta, Max(actualizado_en) con cada edición y el
+    total del rollup diario con cada borrado. Los dos máximos se leen por
+    índice; la suma recorre el rollup, que tiene una fila por día y
+    combinación de filtros (miles de filas, no una por visita).
+    """
+    visitantes = Visitante.objects.aggregate(ultimo_id=Max('id'), ultima_edicion=Max('actualizado_en'))
+    total = VisitaRollupDiario.objects.aggregate(total=Sum('total'))['total'] or 0
+    ultima_edicion = visitantes['ultima_edicion']
+    return f"{visitantes['ultimo_id'] or 0}:{ultima_edicion.isoformat() if ultima_edicion else ''}:{total}"
+
+
+def clave(tipo, params, usuario):
+    parametros = sorted((nombre, valor) for nombre in params for valor in params.getlist(nombre))
+    huella = json.dumps([tipo, parametros, usuario, timezone.localdate().isoformat(), version_datos()])
+    return hashlib.sha256(huella.encode('utf-8')).hexdigest()
+
+
+def con_cache_de_archivo(tipo, content_type):
+    """Decora el get() de una vista de exportación para servirla desde la caché.
+
+    Solo se guardan respuestas 200 del content_type esperado (no el texto de
+    respaldo que devuelve la vista de Excel cuando falla la generación).
+    """
+    def decorador(get):
+        @functools.wraps(get)
+        def envoltura(self, request, *args, **kwargs):
+            clave_reporte = clave(tipo, request.GET, _usuario(request))
+            etag = f'"{clave_reporte}"'
+            if coincide_etag(request, etag):
+                reportes_archivos_cache.registrar_revalidacion()
+                response = HttpResponse(status=304)
+                response['ETag'] = etag
+                return response
+
+            entrada = reportes_archivos_cache.get(clave_reporte)
+            if entrada is not None:
+                archivo, metadatos = entrada
+                response = FileResponse(archivo, content_type=metadatos['content_type'])
+                response['Content-Disposition'] = metadatos['content_disposition']
+                response['X-Cache'] = 'HIT'
+            else:
+                response = get(self, request, *args, **kwargs)
+                if response.status_code == 200 and response.get('Content-Type', '').startswith(content_type):
+                    reportes_archivos_cache.set(clave_reporte, response.content, {
+                        'content_type': response['Content-Type'],
+                        'content_disposition': response.get('Content-Disposition', ''),
+                    })
+                response['X-Cache'] = 'MISS'
+            response['ETag'] = etag
+            # El navegador puede guardar la copia, pero debe revalidarla en cada uso
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        return envoltura
+    return decorador
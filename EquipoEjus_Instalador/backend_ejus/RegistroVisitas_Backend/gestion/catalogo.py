@@ -0,0 +1,137 @@
+"""Catálogo de municipios y parroquias (modelos Municipio y Parroquia).
+
+Visitante y VisitaRollupDiario guardan claves del catálogo, pero la API
+sigue hablando de nombres: resolver() convierte los nombres que llegan en
+registros (y crea los que falten) y los filtros por municipio se traducen a
+ids. Las variantes de escritura ("Jiménez", "JIMENEZ ", "jimenez") comparten
+registro por su clave normalizada.
+
+Los dos catálogos se guardan completos en catalogo_cache (son pocos cientos
+de filas), así resolver nombres, filtrar o mostrar un visitante no consulta
+la base. /opciones/municipios/ se sirve desde la misma caché con un ETag
+calculado sobre el contenido, así el navegador revalida sin volver a
+descargar.
+"""
+import hashlib
+import json
+import unicodedata
+
+from django.db import transaction
+
+from .cache import catalogo_cache
+from .models import Municipio, Parroquia
+
+
+def limpiar(nombre):
+    """Nombre sin espacios al inicio, al final ni repetidos."""
+    return ' '.join((nombre or '').split())
+
+
+def normalizar(nombre):
+    """Clave de catálogo: nombre limpio, sin acentos y en minúsculas."""
+    descompuesto = unicodedata.normalize('NFKD', limpiar(nombre))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+class Indice:
+    """Copia en memoria de los dos catálogos, por id y por clave."""
+
+    def __init__(self):
+        self.municipios = {m.pk: m for m in Municipio.objects.all()}
+        self.parroquias = {p.pk: p for p in Parroquia.objects.all()}
+        self.municipio_por_clave = {m.clave: m for m in self.municipios.values()}
+        self.parroquia_por_clave = {(p.municipio_id, p.clave): p for p in self.parroquias.values()}
+
+    def agregar(self, objeto):
+        if isinstance(objeto, Municipio):
+            self.municipios[objeto.pk] = objeto
+            self.municipio_por_clave[objeto.clave] = objeto
+        else:
+            self.parroquias[objeto.pk] = objeto
+            self.parroquia_por_clave[(objeto.municipio_id, objeto.clave)] = objeto
+
+
+def indice():
+    return catalogo_cache.get_or_set('indice', Indice)
+
+
+def _al_confirmar_cambio():
+    # La entrada nueva solo existe para los demás cuando se confirma la transacción
+    transaction.on_commit(catalogo_cache.clear)
+
+
+def resolver(municipio, parroquia=None):
+    """(Municipio, Parroquia) del catálogo para unos nombres; crea los que falten.
+
+    Un nombre vacío da None. La parroquia se busca dentro del municipio, así
+    que sin municipio tampoco hay parroquia.
+    """
+    nombre = limpiar(municipio)
+    if not nombre:
+        return None, None
+    datos = indice()
+    objeto = datos.municipio_por_clave.get(normalizar(nombre))
+    if objeto is None:
+        objeto, creado = Municipio.objects.get_or_create(clave=normalizar(nombre), defaults={'nombre': nombre})
+        if creado:
+            _al_confirmar_cambio()
+
+    nombre_parroquia = limpiar(parroquia)
+    if not nombre_parroquia:
+        return objeto, None
+    clave = normalizar(nombre_parroquia)
+    encontrada = datos.parroquia_por_clave.get((objeto.pk, clave))
+    if encontrada is None:
+        encontrada, creada = Parroquia.objects.get_or_create(
+            municipio=objeto, clave=clave, defaults={'nombre': nombre_parroquia}
+        )
+        if creada:
+            _al_confirmar_cambio()
+    return objeto, encontrada
+
+
+def ids_municipio(valor):
+    """Ids de municipio para un filtro de query string.
+
+    Acepta un id o un texto; el texto se busca como parte del nombre sin
+    distinguir mayúsculas ni acentos (lo que hacía municipio__icontains),
+    pero sobre el catálogo en memoria: la consulta filtra por la clave entera.
+    """
+    valor = limpiar(valor)
+    if valor.isdigit():
+        return [int(valor)]
+    buscado = normalizar(valor)
+    return [m.pk for clave, m in indice().municipio_por_clave.items() if buscado in clave]
+
+
+def nombre_municipio(municipio_id):
+    return _nombre(municipio_id, 'municipios')
+
+
+def nombre_parroquia(parroquia_id):
+    return _nombre(parroquia_id, 'parroquias')
+
+
+def _nombre(pk, catalogo):
+    if pk is None:
+        return None
+    objeto = getattr(indice(), catalogo).get(pk)
+    if objeto is None:
+        # Creado después de cargar el índice (p. ej. en la transacción en curso):
+        # se busca solo esa fila y entra al índice cuando se confirma
+        modelo = Municipio if catalogo == 'municipios' else Parroquia
+        objeto = modelo.objects.filter(pk=pk).first()
+        if objeto is not None:
+            transaction.on_commit(lambda: indice().agregar(objeto))
+    return objeto.nombre if objeto else None
+
+
+def _cargar_municipios():
+    nombres = sorted((m.nombre for m in indice().municipios.values()), key=normalizar)
+    etag = '"%s"' % hashlib.sha256(json.dumps(nombres).encode('utf-8')).hexdigest()[:32]
+    return nombres, etag
+
+
+def municipios():
+    """(nombres de municipios ordenados, ETag)."""
+    return catalogo_cache.get_or_set('municipios', _cargar_municipios)
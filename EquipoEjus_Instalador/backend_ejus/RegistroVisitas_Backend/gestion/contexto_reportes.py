@@ -0,0 +1,232 @@
+"""Datos compartidos por los reportes de trámites, visitas mensuales y estadísticas.
+
+ContextoReporte se construye una vez por petición (o por exportación) y
+resuelve con una sola consulta agrupada sobre VisitaRollupDiario lo que
+esas tres salidas necesitan: totales, conteos por trámite y por municipio,
+primera fecha con visitas, los trámites del periodo y la serie mensual.
+Las vistas JSON y los exportadores PDF/Excel arman sus respuestas desde el
+mismo contexto, así una exportación no repite consultas ni recalcula "hoy"
+tres veces.
+"""
+from datetime import timedelta
+
+from django.db.models import BooleanField, Case, Count, IntegerField, Min, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import catalogo
+from .cache import estadisticas_cache
+from .models import Visitante, VisitaRollupDiario
+from .reportes import (
+    PARAMETROS_FILTRO, PERIODO_MES, desplazar_periodo, fecha_inicio_periodo, filtrar_visitantes, inicio_periodo,
+    leer_entero, medianoche_local,
+)
+
+MESES_ES = {
+    1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
+    7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'
+}
+
+
+def _porcentaje(parte, total):
+    return round((parte / total) * 100, 2) if total > 0 else 0
+
+
+class ContextoReporte:
+    """Agregados de los reportes para unos filtros (query string) y un instante dados.
+
+    Acepta ?periodo= (ventana de los trámites), ?months= (serie mensual) y
+    los filtros de filtrar_visitantes(). Las consultas se hacen al pedir el
+    primer dato y se reutilizan en el resto.
+    """
+
+    def __init__(self, params, ahora=None):
+        self.params = params
+        self.periodo = params.get('periodo', 'mes')
+        self.meses = leer_entero(params, 'months', 6, maximo=120)
+        self.ahora = timezone.localtime(ahora)
+        self.hoy = self.ahora.date()
+        self.desde = fecha_inicio_periodo(self.periodo, self.ahora)
+        self._cargado = False
+        self._parroquia = None
+
+    def _cargar(self):
+        if self._cargado:
+            return
+        self._cargado = True
+
+        # Días completos del periodo en el rollup; 'semana' y 'trimestre' empiezan
+        # a media jornada y ese tramo se cuenta aparte sobre Visitante
+        primer_dia = self.desde.date()
+        parcial = self.desde != medianoche_local(primer_dia)
+        if parcial:
+            primer_dia += timedelta(days=1)
+
+        actual = inicio_periodo(self.hoy, PERIODO_MES)
+        self.inicios_mes = [desplazar_periodo(actual, PERIODO_MES, -k) for k in range(self.meses - 1, -1, -1)]
+        fines = [desplazar_periodo(inicio, PERIODO_MES, 1) for inicio in self.inicios_mes]
+        # Mismos límites que serie_por_periodo(); -1 = fuera de la serie
+        mes = Case(
+            When(fecha__lt=self.inicios_mes[0], then=Value(-1)),
+            *[When(fecha__lt=fin, then=Value(n)) for n, fin in enumerate(fines)],
+            default=Value(-1),
+            output_field=IntegerField(),
+        )
+        en_periodo = Case(
+            When(fecha__gte=primer_dia, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+        filas = filtrar_visitantes(VisitaRollupDiario.objects.filter(total__gt=0), self.params).annotate(
+            mes=mes, en_periodo=en_periodo,
+        ).values('tipo_visita', 'municipio', 'mes', 'en_periodo').annotate(
+            total=Sum('total'), completados=Sum('completados'), primera=Min('fecha'),
+        ).order_by()
+
+        self.total = self.completados = 0
+        self.primera_fecha = None
+        self.por_tipo = {}
+        self.por_municipio = {}
+        self.tramites_periodo = {}
+        self.por_mes = [[0, 0] for _ in self.inicios_mes]
+        for fila in filas:
+            total, completados = fila['total'], fila['completados']
+            self.total += total
+            self.completados += completados
+            if self.primera_fecha is None or fila['primera'] < self.primera_fecha:
+                self.primera_fecha = fila['primera']
+            self._sumar(self.por_tipo, fila['tipo_visita'], total, completados)
+            self._sumar(self.por_municipio, fila['municipio'], total, completados)
+            if fila['en_periodo']:
+                self._sumar(self.tramites_periodo, fila['tipo_visita'], total, completados)
+            if fila['mes'] >= 0:
+                self.por_mes[fila['mes']][0] += total
+                self.por_mes[fila['mes']][1] += completados
+
+        if parcial:
+            tramo = filtrar_visitantes(Visitante.objects.filter(
+                fecha_hora_ingreso__gte=self.desde,
+                fecha_hora_ingreso__lt=medianoche_local(primer_dia),
+            ), self.params).values('tipo_visita').annotate(
+                total=Count('id'), completados=Count('id', filter=Q(atencion_completada=True)),
+            ).order_by()
+            for fila in tramo:
+                self._sumar(self.tramites_periodo, fila['tipo_visita'], fila['total'], fila['completados'])
+
+    @staticmethod
+    def _sumar(acumulado, clave, total, completados):
+        previo = acumulado.get(clave, (0, 0))
+        acumulado[clave] = (previo[0] + total, previo[1] + completados)
+
+    def parroquia_mas_visitada(self):
+        # La parroquia no forma parte del rollup: se consulta sobre Visitante
+        if self._parroquia is None:
+            try:
+                fila = filtrar_visitantes(Visitante.objects.all(), self.params).exclude(
+                    parroquia__isnull=True
+                ).values('parroquia').annotate(count=Count('id')).order_by('-count').first()
+                self._parroquia = catalogo.nombre_parroquia(fila['parroquia']) if fila else 'No disponible'
+            except Exception:
+                self._parroquia = 'No disponible'
+        return self._parroquia
+
+    def tramites(self):
+        """Cuerpo de /reportes/tramites/: trámites del periodo, de más a menos frecuente."""
+        self._cargar()
+        datos = [
+            {
+                'nombre': tipo,
+                'cantidad': total,
+                'completados': completados,
+                'porcentaje_completados': _porcentaje(completados, total),
+            }
+            for tipo, (total, completados) in sorted(
+                self.tramites_periodo.items(), key=lambda t: t[1][0], reverse=True
+            )
+        ]
+        total_tramites = sum(t['cantidad'] for t in datos)
+        total_completados = sum(t['completados'] for t in datos)
+        return {
+            'success': True,
+            'periodo': self.periodo,
+            'total_tramites': total_tramites,
+            'porcentaje_total_completados': _porcentaje(total_completados, total_tramites),
+            'datos': datos,
+        }
+
+    def visitas_mensuales(self):
+        """Cuerpo de /reportes/visitas-mensuales/: del mes más antiguo al actual."""
+        self._cargar()
+        datos = []
+        for inicio_mes, (total_visitas, completados) in zip(self.inicios_mes, self.por_mes):
+            datos.append({
+                'mes': MESES_ES.get(inicio_mes.month, inicio_mes.strftime('%b')),
+                'mes_numero': inicio_mes.month,
+                'anio': inicio_mes.year,
+                'total_visitas': total_visitas,
+                'completados': completados,
+                'porcentaje_completados': float(_porcentaje(completados, total_visitas)),
+            })
+        return {
+            'success': True,
+            'meses': self.meses,
+            'datos': datos,
+        }
+
+    def estadisticas(self):
+        """Cuerpo de /reportes/estadisticas/ (totales desde la primera visita).
+
+        No depende del periodo: se guarda en estadisticas_cache por filtros y
+        día, así el dashboard y las exportaciones comparten el resultado
+        hasta la próxima escritura de visitantes o el vencimiento del TTL.
+        """
+        filtros = tuple((nombre, self.params.get(nombre) or '') for nombre in PARAMETROS_FILTRO)
+        return estadisticas_cache.get_or_set(
+            ('reporte_estadisticas', filtros, self.hoy), self._calcular_estadisticas
+        )
+
+    def _calcular_estadisticas(self):
+        self._cargar()
+        if not self.primera_fecha:
+            return {
+                'success': True,
+                'total_visitas': 0,
+                'promedio_diario': 0,
+                'tramite_mas_comun': 'No disponible',
+                'porcentaje_completados': 0,
+                'municipio_mas_visitado': 'No disponible',
+                'mensaje': 'No hay visitas registradas en el periodo/filtro seleccionado'
+            }
+
+        dias_transcurridos = max((self.hoy - self.primera_fecha).days + 1, 1)
+        total_visitas = self.total
+        promedio_diario = total_visitas / dias_transcurridos
+
+        por_tramite = sorted(self.por_tipo.items(), key=lambda t: t[1][0], reverse=True)
+        tramite_mas_comun = por_tramite[0][0] if por_tramite else 'No disponible'
+
+        # Agrupado por id del catálogo; el nombre se busca solo para el ganador
+        por_municipio = [(municipio, total) for municipio, (total, _) in self.por_municipio.items() if municipio]
+        if por_municipio:
+            municipio = catalogo.nombre_municipio(max(por_municipio, key=lambda m: m[1])[0])
+        else:
+            municipio = 'No disponible'
+
+        completados_total = self.completados
+        return {
+            'success': True,
+            'total_visitas': total_visitas,
+            'visitas_completadas': completados_total,
+            'visitas_pendientes': total_visitas - completados_total,
+            'visitas_activas': total_visitas - completados_total,
+            'promedio_diario': round(promedio_diario, 2),
+            'tramite_mas_comun': tramite_mas_comun,
+            'porcentaje_completados': float(_porcentaje(completados_total, total_visitas)),
+            'municipio_mas_visitado': municipio,
+            'parroquia_mas_visitada': self.parroquia_mas_visitada(),
+            'tipos_tramite_diferentes': len(por_tramite),
+            'dias_transcurridos': dias_transcurridos,
+            'primera_visita_fecha': self.primera_fecha.strftime('%d/%m/%Y'),
+            'hoy': self.hoy.strftime('%d/%m/%Y'),
+            '_formula_promedio': f"{total_visitas} visitas / {dias_transcurridos} días = {round(promedio_diario, 2)}",
+            '_muestra_tramites': [{'tipo_visita': tipo, 'count': total} for tipo, (total, _) in por_tramite[:5]]
+        }
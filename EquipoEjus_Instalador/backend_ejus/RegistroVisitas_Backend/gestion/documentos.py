@@ -0,0 +1,292 @@
+"""PDF y Excel de los reportes de visitas.
+
+Los generan las vistas de exportación (ExportarReportePDFView y
+ExportarReporteExcelView) y los jobs en segundo plano (jobs.py). Cada
+función recibe los parámetros de la query string (QueryDict o dict) y el
+nombre de quien pide el reporte, que se imprime en el documento, y
+devuelve (contenido, nombre de archivo, content type).
+"""
+import logging
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .contexto_reportes import ContextoReporte
+
+try:
+    from openpyxl.utils import get_column_letter
+    import openpyxl
+    from openpyxl.styles import Font
+except Exception:
+    get_column_letter = None
+    openpyxl = None
+    Font = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_PDF = 'application/pdf'
+CONTENT_TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def generar_pdf(params, usuario=None):
+    """Reporte PDF: portada, estadísticas, trámites, serie mensual y firmas."""
+    periodo = params.get('periodo', 'mes')
+    nombre = f'reporte_{periodo}_{datetime.now().strftime("%Y%m%d")}.pdf'
+
+    # Estadísticas, trámites y serie mensual salen de las mismas consultas
+    contexto = ContextoReporte(params)
+
+    buffer = BytesIO()
+
+    # Usar Platypus para estructura profesional
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=40, leftMargin=40,
+                            topMargin=60, bottomMargin=40)
+    styles = getSampleStyleSheet()
+    styleH = ParagraphStyle('Heading', parent=styles['Heading1'], fontSize=14, leading=18)
+    styleN = ParagraphStyle('Normal', parent=styles['Normal'], fontSize=10, leading=14)
+
+    elements = []
+
+    # Portada con líneas exactas solicitadas
+    cover_style = ParagraphStyle('Cover', parent=styles['Title'], alignment=1, fontSize=14, leading=18)
+    cover_lines = [
+        'REPUBLICA BOLIVARIANA DE VENEZUELA',
+        'TRIBUNAL SUPREMO DE JUSTICIA',
+        'DIRECCION EJECUTIVA DE LA MAGISTRATURA',
+        'EQUIPO DE JUSTICIA SOCIAL',
+        'BARQUISIMETO-ESTADO LARA'
+    ]
+    elements.append(Spacer(1, 40))
+    for line in cover_lines:
+        elements.append(Paragraph(line, cover_style))
+        elements.append(Spacer(1, 6))
+    # Subtítulo con período y fecha de generación
+    subtitle = Paragraph(f'Reporte de Visitas - Período: {periodo}', ParagraphStyle('Subtitle', parent=styles['Normal'], alignment=1, fontSize=11))
+    genDate = Paragraph(f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}', ParagraphStyle('GenDate', parent=styles['Normal'], alignment=1, fontSize=9))
+    genUser = Paragraph(f'Generado por: {usuario}' if usuario else 'Generado por: Usuario no identificado', ParagraphStyle('GenUser', parent=styles['Normal'], alignment=1, fontSize=9))
+    elements.extend([Spacer(1, 12), subtitle, Spacer(1, 6), genDate, Spacer(1,4), genUser, PageBreak()])
+
+    # En lugar de tabla de contenidos, colocamos directamente las secciones
+    # Todas las tablas se agregarán en la misma hoja (sin saltos de página entre ellas)
+
+    # Estadísticas principales (diseño más profesional)
+    elements.append(Paragraph('Estadísticas Principales', styleH))
+    stats_data = contexto.estadisticas()
+
+    stats_table_data = []
+    stats_rows = [
+        ('Total visitas', stats_data.get('total_visitas', 0)),
+        ('Promedio diario', stats_data.get('promedio_diario', 0)),
+        ('Trámite más común', stats_data.get('tramite_mas_comun', 'N/A')),
+        ('Porcentaje completados', f"{stats_data.get('porcentaje_completados', 0)}%"),
+        ('Municipio más visitado', stats_data.get('municipio_mas_visitado', 'N/A')),
+    ]
+
+    # Crear filas con clave en negrita y valor alineado a la izquierda
+    for k, v in stats_rows:
+        stats_table_data.append([Paragraph(f'<b>{k}</b>', styleN), Paragraph(str(v), styleN)])
+
+    t = Table(stats_table_data, colWidths=[240, 260], hAlign='LEFT')
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (0,-1), colors.HexColor('#F3F6FA')),
+        ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#D6DCE6')),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+        ('LEFTPADDING', (0,0), (-1,-1), 8),
+        ('RIGHTPADDING', (0,0), (-1,-1), 8),
+        ('TOPPADDING', (0,0), (-1,-1), 6),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+    ]))
+    elements.extend([Spacer(1,8), t, Spacer(1,12)])
+
+    # Distribución por trámite
+    elements.append(Paragraph('Distribución por Trámite', styleH))
+    tramites_data = contexto.tramites()
+    tramites_table = [[ 'Trámite', 'Cantidad', 'Completados', '% Completados' ]]
+    for tr in tramites_data.get('datos', []):
+        tramites_table.append([ tr.get('nombre',''), tr.get('cantidad',0), tr.get('completados',0), tr.get('porcentaje_completados','') ])
+    if len(tramites_table) == 1:
+        tramites_table.append(['No hay datos', '', '', ''])
+
+    tt = Table(tramites_table, colWidths=[260, 80, 80, 80], hAlign='LEFT')
+    tt.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2C7857')),
+        ('TEXTCOLOR',(0,0),(-1,0),colors.white),
+        ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#D6DCE6')),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('ALIGN',(1,1),(-1,-1),'CENTER'),
+        ('LEFTPADDING', (0,0), (-1,-1), 6),
+        ('RIGHTPADDING', (0,0), (-1,-1), 6),
+    ]))
+    elements.extend([Spacer(1,6), tt, Spacer(1,12)])
+
+    # Visitas mensuales
+    elements.append(Paragraph('Visitas Mensuales', styleH))
+    mensual_data = contexto.visitas_mensuales()
+    mensual_table = [[ 'Mes', 'Visitas', 'Completados' ]]
+    for m in mensual_data.get('datos', []):
+        mensual_table.append([ m.get('mes',''), m.get('total_visitas', m.get('visitas',0)), m.get('completados',0) ])
+    if len(mensual_table) == 1:
+        mensual_table.append(['No hay datos', '', ''])
+
+    mt = Table(mensual_table, colWidths=[200, 160, 160], hAlign='LEFT')
+    mt.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2B6CE4')),
+        ('TEXTCOLOR',(0,0),(-1,0),colors.white),
+        ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#D6DCE6')),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('ALIGN',(1,1),(-1,-1),'CENTER'),
+        ('LEFTPADDING', (0,0), (-1,-1), 6),
+        ('RIGHTPADDING', (0,0), (-1,-1), 6),
+    ]))
+    elements.extend([Spacer(1,6), mt, Spacer(1,12)])
+
+    # Agregar firmas al final de la misma hoja (dos bloques lado a lado)
+    elements.append(Spacer(1, 18))
+    sign_table_data = [
+        ['_______________________________', '_______________________________'],
+        ['Coordinadora de Equipo de Justicia Social', 'Directora Administrativa Regional']
+    ]
+    sign_table = Table(sign_table_data, colWidths=[260, 260], hAlign='CENTER')
+    sign_table.setStyle(TableStyle([
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('FONTNAME', (0,1), (-1,1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0,0), (-1,-1), 11),
+        ('TOPPADDING', (0,0), (-1,-1), 12),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+    ]))
+    elements.append(sign_table)
+    elements.append(Spacer(1, 18))
+    elements.append(Paragraph('Fin del reporte', styleN))
+
+    # Build PDF
+    with buffer:
+        doc.build(elements)
+        return buffer.getvalue(), nombre, CONTENT_TYPE_PDF
+
+
+def generar_excel(params, usuario=None):
+    """Reporte Excel con hojas de resumen, trámites, serie mensual, metadata y firmas.
+
+    Si pandas falla se devuelve un .txt con el período en lugar del libro.
+    """
+    periodo = params.get('periodo', 'mes')
+    
+    # Obtener datos (un único contexto para las tres hojas)
+    contexto = ContextoReporte(params)
+    tramites_data = contexto.tramites()
+    mensual_data = contexto.visitas_mensuales()
+    stats_data = contexto.estadisticas()
+    
+    # Crear DataFrames de pandas
+    df_tramites = pd.DataFrame(tramites_data.get('datos', []))
+    df_mensual = pd.DataFrame(mensual_data.get('datos', []))
+    
+    # Crear archivo Excel en memoria
+    output = BytesIO()
+    
+    try:
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            # Hoja de resumen
+            df_resumen = pd.DataFrame([{
+                'Total Visitas': stats_data.get('total_visitas', 0),
+                'Promedio Diario': stats_data.get('promedio_diario', 0),
+                'Trámite más Común': stats_data.get('tramite_mas_comun', ''),
+                'Porcentaje Completados': f"{stats_data.get('porcentaje_completados', 0)}%",
+                'Municipio más Visitado': stats_data.get('municipio_mas_visitado', ''),
+                # 'Hora Pico' removed per request
+                'Período Reporte': periodo
+            }])
+            df_resumen.to_excel(writer, sheet_name='Resumen', index=False)
+            
+            # Hoja de trámites
+            if not df_tramites.empty:
+                df_tramites.to_excel(writer, sheet_name='Trámites', index=False)
+            
+            # Hoja mensual
+            if not df_mensual.empty:
+                df_mensual.to_excel(writer, sheet_name='Visitas Mensuales', index=False)
+            
+            # Hoja de metadata
+            df_metadata = pd.DataFrame([{
+                'Período': periodo,
+                'Fecha Generación': datetime.now().strftime('%d/%m/%Y %H:%M'),
+                'Generado por': usuario or '',
+                'Total Registros': len(df_tramites) + len(df_mensual)
+            }])
+            df_metadata.to_excel(writer, sheet_name='Metadata', index=False)
+            # Hoja de firmas (en Excel para impresión)
+            df_firmas = pd.DataFrame({
+                'Coordinadora': [''],
+                'Directora Administrativa Regional': ['']
+            })
+            df_firmas.to_excel(writer, sheet_name='Firmas', index=False)
+
+            # Mejoras de formato si openpyxl está disponible
+            try:
+                if openpyxl is not None and get_column_letter is not None:
+                    wb = writer.book
+                    # Formato resumen
+                    ws_res = writer.sheets.get('Resumen') or wb['Resumen']
+                    # Ajustar anchos de columna
+                    for i, col in enumerate(df_resumen.columns, 1):
+                        ws_res.column_dimensions[get_column_letter(i)].width = max(15, len(col) + 6)
+                    # Encabezados en negrita
+                    if Font is not None:
+                        for cell in ws_res[1]:
+                            cell.font = Font(bold=True)
+
+                    # Formato trámites
+                    if not df_tramites.empty:
+                        ws_tr = writer.sheets.get('Trámites') or wb['Trámites']
+                        for i, col in enumerate(df_tramites.columns, 1):
+                            ws_tr.column_dimensions[get_column_letter(i)].width = max(12, len(str(col)) + 6)
+                        for cell in ws_tr[1]:
+                            cell.font = Font(bold=True)
+
+                    # Formato mensual
+                    if not df_mensual.empty:
+                        ws_m = writer.sheets.get('Visitas Mensuales') or wb['Visitas Mensuales']
+                        for i, col in enumerate(df_mensual.columns, 1):
+                            ws_m.column_dimensions[get_column_letter(i)].width = max(12, len(str(col)) + 6)
+                        for cell in ws_m[1]:
+                            cell.font = Font(bold=True)
+
+                    # Hoja firmas: ajustar ancho y centrar texto
+                    ws_f = writer.sheets.get('Firmas') or wb['Firmas']
+                    ws_f.column_dimensions[get_column_letter(1)].width = 40
+                    ws_f.column_dimensions[get_column_letter(2)].width = 40
+                    for cell in ws_f[1]:
+                        cell.font = Font(bold=False)
+                    # Poner líneas de firma como texto grande
+                    ws_f.cell(row=1, column=1).value = '_______________________________'
+                    ws_f.cell(row=1, column=2).value = '_______________________________'
+                    ws_f.cell(row=2, column=1).value = 'Coordinadora de Equipo de Justicia Social'
+                    ws_f.cell(row=2, column=2).value = 'Directora Administrativa Regional'
+            except Exception as fe:
+                # Si falla el formateo con openpyxl, seguir sin formato
+                logger.warning('No se pudo aplicar formato Excel (openpyxl): %s', fe)
+        
+        output.seek(0)
+        content_type = CONTENT_TYPE_EXCEL
+        filename = f"reporte_{periodo}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        
+    except Exception as e:
+        # Fallback simple si hay error con pandas
+        logger.exception('Error generando Excel: %s', e)
+        output = BytesIO()
+        output.write(b"Reporte generado el " + datetime.now().strftime('%d/%m/%Y %H:%M').encode())
+        output.write(b"\nPeriodo: " + periodo.encode())
+        output.seek(0)
+        content_type = 'text/plain'
+        filename = f"reporte_{periodo}_{datetime.now().strftime('%Y%m%d')}.txt"
+    
+    return output.getvalue(), filename, content_type
+
+
+GENERADORES = {'pdf': generar_pdf, 'excel': generar_excel}
@@ -0,0 +1,237 @@
+"""Eventos en vivo para el dashboard de recepción (Server-Sent Events, /api/eventos/).
+
+Las vistas que escriben visitantes publican un delta compacto al confirmar
+la transacción (publicar): 'visitante' (alta o edición), 'salida',
+'eliminado' o 'resincronizar' (operaciones en lote). Cada pantalla abierta
+tiene una Suscripcion que recibe los deltas y los envía por su conexión,
+así las pantallas dejan de consultar el listado y las estadísticas en
+bucle.
+
+- Los contadores del dashboard no viajan en cada delta: cada escritura solo
+  los marca como pendientes y el flujo los envía como mucho una vez por
+  EVENTOS_INTERVALO_CONTADORES, por muchas escrituras que haya habido.
+- Quien publica nunca espera a los clientes. Cada suscripción guarda hasta
+  EVENTOS_MAX_PENDIENTES deltas; si un cliente lento se atrasa más, sus
+  deltas se descartan y recibe un solo 'resincronizar' (vuelve a pedir el
+  listado).
+- Sin tráfico se envía un comentario cada EVENTOS_LATIDO segundos: mantiene
+  viva la conexión y detecta clientes que se fueron.
+
+El registro de suscripciones vive en la memoria del proceso, como las demás
+cachés (ver servidor.py). Por WSGI cada flujo ocupa un hilo del servidor
+durante toda la conexión (de ahí EVENTOS_MAX_FLUJOS); por ASGI
+(views_async.eventos) solo espera en el bucle de eventos.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+# Campos de Visitante incluidos en los deltas 'visitante'
+CAMPOS_DELTA = (
+    'id', 'nombre', 'cedula', 'tipo_visita', 'referir_a', 'municipio_id', 'parroquia_id',
+    'fecha_hora_ingreso', 'fecha_hora_salida', 'atencion_completada', 'actualizado_en',
+)
+
+CONTADORES = 'contadores'
+RESINCRONIZAR = 'resincronizar'
+LATIDO = b': latido\n\n'
+_CERRAR = object()
+
+
+def mensaje(tipo, datos):
+    """Un evento en formato text/event-stream."""
+    return f'event: {tipo}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n'.encode('utf-8')
+
+
+def delta_visitante(visitante, accion):
+    datos = {campo: getattr(visitante, campo) for campo in CAMPOS_DELTA}
+    datos['accion'] = accion
+    return datos
+
+
+class Suscripcion:
+    """Deltas pendientes de una conexión; segura entre hilos y con el bucle async."""
+
+    def __init__(self, max_pendientes, intervalo_contadores):
+        self.max_pendientes = max_pendientes
+        self.intervalo_contadores = intervalo_contadores
+        self.descartados = 0
+        self._pendientes = deque()
+        self._contadores = True  # la conexión empieza con los contadores actuales
+        self._ultimo_contadores = float('-inf')
+        self._resincronizar = False
+        self._cerrada = False
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._bucle = None
+        self._despertar_async = None
+
+    def usar_bucle(self):
+        """Para esperar con aesperar(); se llama desde el bucle de eventos que atiende la conexión."""
+        self._bucle = asyncio.get_running_loop()
+        self._despertar_async = asyncio.Event()
+
+    def _notificar(self):
+        self._despertar.set()
+        if self._bucle is not None:
+            try:
+                self._bucle.call_soon_threadsafe(self._despertar_async.set)
+            except RuntimeError:
+                # El bucle ya se cerró (servidor detenido)
+                pass
+
+    def entregar(self, tipo, datos):
+        with self._lock:
+            self._contadores = True
+            if tipo == RESINCRONIZAR:
+                self._pendientes.clear()
+                self._resincronizar = True
+            elif self._resincronizar:
+                # El cliente va a recargar todo: este delta ya está incluido
+                self.descartados += 1
+            elif len(self._pendientes) >= self.max_pendientes:
+                self.descartados += len(self._pendientes) + 1
+                self._pendientes.clear()
+                self._resincronizar = True
+            else:
+                self._pendientes.append((tipo, datos))
+        self._notificar()
+
+    def cerrar(self):
+        with self._lock:
+            self._cerrada = True
+        self._notificar()
+
+    def _espera(self):
+        """Segundos hasta el próximo envío de contadores pendiente, o el latido."""
+        with self._lock:
+            if self._cerrada or self._pendientes or self._resincronizar:
+                return 0
+            if self._contadores:
+                falta = self._ultimo_contadores + self.intervalo_contadores - time.monotonic()
+                return min(max(falta, 0), settings.EVENTOS_LATIDO)
+        return settings.EVENTOS_LATIDO
+
+    def tomar(self):
+        """Lo que hay para enviar ahora: [(tipo, datos)], con _CERRAR al final si se cerró.
+
+        Los contadores salen como (CONTADORES, None): el flujo los calcula al enviarlos.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            self._despertar.clear()
+            if self._despertar_async is not None:
+                self._despertar_async.clear()
+            if self._cerrada:
+                return [(_CERRAR, None)]
+            salida = list(self._pendientes)
+            self._pendientes.clear()
+            if self._resincronizar:
+                salida = [(RESINCRONIZAR, {'descartados': self.descartados})]
+                self._resincronizar = False
+            if self._contadores and ahora >= self._ultimo_contadores + self.intervalo_contadores:
+                salida.append((CONTADORES, None))
+                self._contadores = False
+                self._ultimo_contadores = ahora
+            return salida
+
+    def esperar(self):
+        """Bloquea hasta que haya algo que enviar; False si venció el latido sin novedades."""
+        espera = self._espera()
+        return self._despertar.wait(espera) or espera < settings.EVENTOS_LATIDO
+
+    async def aesperar(self):
+        espera = self._espera()
+        try:
+            await asyncio.wait_for(self._despertar_async.wait(), espera)
+        except asyncio.TimeoutError:
+            return espera < settings.EVENTOS_LATIDO
+        return True
+
+
+class Difusor:
+    """Registro de las suscripciones abiertas del proceso."""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self.publicados = 0
+
+    def suscribir(self, limite=None):
+        """Nueva Suscripcion, o None si ya hay `limite` abiertas."""
+        suscripcion = Suscripcion(settings.EVENTOS_MAX_PENDIENTES, settings.EVENTOS_INTERVALO_CONTADORES)
+        with self._lock:
+            if limite is not None and len(self._suscripciones) >= limite:
+                return None
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def difundir(self, tipo, datos):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+            self.publicados += 1
+        for suscripcion in suscripciones:
+            suscripcion.entregar(tipo, datos)
+
+    def cerrar_todas(self):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.cerrar()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'clientes': len(self._suscripciones),
+                'publicados': self.publicados,
+                'descartados': sum(s.descartados for s in self._suscripciones),
+            }
+
+
+difusor = Difusor()
+
+
+def publicar(tipo, datos):
+    """Difunde el delta cuando se confirma la transacción (nada si se revierte)."""
+    transaction.on_commit(lambda: difusor.difundir(tipo, datos))
+
+
+def flujo(suscripcion, contadores):
+    """Cuerpo text/event-stream para StreamingHttpResponse; contadores() da los del dashboard."""
+    try:
+        yield f'retry: {settings.EVENTOS_REINTENTO_MS}\n\n'.encode('ascii')
+        while True:
+            for tipo, datos in suscripcion.tomar():
+                if tipo is _CERRAR:
+                    return
+                yield mensaje(tipo, contadores() if tipo == CONTADORES else datos)
+            if not suscripcion.esperar():
+                yield LATIDO
+    finally:
+        difusor.desuscribir(suscripcion)
+
+
+async def aflujo(suscripcion, acontadores):
+    """flujo() para las vistas async; acontadores es una corrutina."""
+    suscripcion.usar_bucle()
+    try:
+        yield f'retry: {settings.EVENTOS_REINTENTO_MS}\n\n'.encode('ascii')
+        while True:
+            for tipo, datos in suscripcion.tomar():
+                if tipo is _CERRAR:
+                    return
+                yield mensaje(tipo, await acontadores() if tipo == CONTADORES else datos)
+            if not await suscripcion.aesperar():
+                yield LATIDO
+    finally:
+        difusor.desuscribir(suscripcion)
@@ -0,0 +1,106 @@
+"""Exportación fila a fila de visitantes (CSV y XLSX) con memoria constante.
+
+Las filas se leen con .values_list().iterator(), sin instanciar modelos ni
+cargar el resultado completo. El CSV se genera mientras se envía; el XLSX se
+escribe con openpyxl en modo write-only a un archivo temporal (un .xlsx es
+un zip y no se puede enviar antes de cerrarlo) y luego se envía por bloques.
+"""
+import csv
+import io
+import tempfile
+
+from django.utils import timezone
+
+from . import catalogo
+from .models import Visitante
+
+TAMANO_LOTE = 2000
+# Límite de filas de una hoja de Excel, sin contar el encabezado
+MAX_FILAS_HOJA = 1_048_575
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+_TIPOS = dict(Visitante.TIPO_VISITA_CHOICES)
+_INSTITUCIONES = dict(Visitante.INSTITUCION_CHOICES)
+
+# Marca de conversión: fecha y hora local sin tzinfo (openpyxl no acepta datetimes con zona)
+FECHA_LOCAL = object()
+
+# Mismas columnas que VisitanteExportSerializer: (encabezado, campo, conversión)
+COLUMNAS = [
+    ('Cédula', 'cedula', None),
+    ('Nombre', 'nombre', None),
+    ('Teléfono', 'telefono', None),
+    # Claves del catálogo: el nombre se toma del catálogo en memoria, sin JOIN
+    ('Municipio', 'municipio', catalogo.nombre_municipio),
+    ('Parroquia', 'parroquia', catalogo.nombre_parroquia),
+    ('Tipo de trámite', 'tipo_visita', lambda v: _TIPOS.get(v, v)),
+    ('Referido a', 'referir_a', lambda v: _INSTITUCIONES.get(v, v)),
+    ('Otra institución', 'otra_institucion', None),
+    ('Fecha y hora de ingreso', 'fecha_hora_ingreso', FECHA_LOCAL),
+    ('Fecha y hora de salida', 'fecha_hora_salida', FECHA_LOCAL),
+    ('Estado', 'atencion_completada', lambda v: 'Completado' if v else 'En proceso'),
+    ('Requiere referir', 'referir_a', lambda v: 'No' if v == 'NO_REFERIDO' else 'Sí'),
+    ('Observaciones', 'observaciones', None),
+]
+ENCABEZADOS = [encabezado for encabezado, _, _ in COLUMNAS]
+_CAMPOS = list(dict.fromkeys(campo for _, campo, _ in COLUMNAS))
+_INDICES = [_CAMPOS.index(campo) for _, campo, _ in COLUMNAS]
+
+
+def filas(queryset):
+    """Genera las filas (listas ya formateadas) del queryset, leyendo por lotes."""
+    # La zona se resuelve una vez: timezone.localtime() la busca en cada llamada
+    zona = timezone.get_current_timezone()
+
+    def fecha_local(valor):
+        return valor.astimezone(zona).replace(tzinfo=None) if valor else None
+
+    conversiones = [
+        (i, fecha_local if conversion is FECHA_LOCAL else conversion)
+        for i, (_, _, conversion) in zip(_INDICES, COLUMNAS)
+    ]
+    consulta = queryset.order_by('-fecha_hora_ingreso', '-id').values_list(*_CAMPOS)
+    for registro in consulta.iterator(chunk_size=TAMANO_LOTE):
+        yield [conversion(registro[i]) if conversion else registro[i] for i, conversion in conversiones]
+
+
+def generar_csv(queryset):
+    """Genera el CSV en bloques de TAMANO_LOTE filas, para StreamingHttpResponse."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el archivo como UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(ENCABEZADOS)
+    for n, fila in enumerate(filas(queryset), start=1):
+        writer.writerow([
+            valor.strftime(FORMATO_FECHA) if hasattr(valor, 'strftime') else valor
+            for valor in fila
+        ])
+        if n % TAMANO_LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def escribir_xlsx(queryset, openpyxl):
+    """Escribe el XLSX en un archivo temporal y lo devuelve abierto al inicio.
+
+    El archivo se borra al cerrarse (lo hace FileResponse al terminar de enviar).
+    """
+    libro = openpyxl.Workbook(write_only=True)
+    hoja, filas_hoja, numero = None, MAX_FILAS_HOJA, 0
+    for fila in filas(queryset):
+        if filas_hoja >= MAX_FILAS_HOJA:
+            numero += 1
+            hoja = libro.create_sheet('Visitantes' if numero == 1 else f'Visitantes {numero}')
+            hoja.append(ENCABEZADOS)
+            filas_hoja = 0
+        hoja.append(fila)
+        filas_hoja += 1
+    if hoja is None:
+        libro.create_sheet('Visitantes').append(ENCABEZADOS)
+    archivo = tempfile.TemporaryFile(suffix='.xlsx')
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
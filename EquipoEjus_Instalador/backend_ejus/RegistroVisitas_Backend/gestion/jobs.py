@@ -0,0 +1,110 @@
+"""Generación de reportes PDF/Excel en segundo plano.
+
+Las peticiones crean un ReporteJob y vuelven enseguida; un pool de hilos del
+mismo proceso genera el documento (documentos.py, igual que las vistas
+ExportarReporte*View) y lo guarda en settings.REPORTES_DIR. El cliente
+consulta el estado y descarga el archivo cuando el job está COMPLETADO.
+
+Se usan hilos y no procesos porque el servidor es un solo proceso (waitress
+o uvicorn, ver RegistroVisitas_Backend/servidor.py), también empaquetado
+como .exe, donde multiprocessing complica el arranque y las cachés del
+proceso no se compartirían. El hilo del job comparte el GIL, pero el
+intérprete alterna entre hilos, así que las demás peticiones se siguen
+atendiendo mientras se genera el reporte. Los jobs
+que quedaron a medias por un reinicio se marcan como ERROR la primera vez
+que se usa el pool.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import documentos
+from .models import ReporteJob
+
+logger = logging.getLogger(__name__)
+
+# Tipos de job aceptados
+TIPOS = tuple(documentos.GENERADORES)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def directorio_reportes():
+    directorio = Path(settings.REPORTES_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def _obtener_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Lo que estaba pendiente o en proceso pertenecía a un proceso anterior
+            ReporteJob.objects.filter(
+                estado__in=[ReporteJob.PENDIENTE, ReporteJob.EN_PROCESO]
+            ).update(estado=ReporteJob.ERROR, error='Interrumpido por un reinicio del servidor',
+                     finalizado_en=timezone.now())
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REPORTES_JOB_WORKERS, thread_name_prefix='reportes'
+            )
+        return _executor
+
+
+def encolar(tipo, parametros, usuario=''):
+    """Crea el job y lo envía al pool cuando la transacción se confirma."""
+    executor = _obtener_executor()
+    limpiar()
+    job = ReporteJob.objects.create(tipo=tipo, parametros=parametros, solicitado_por=usuario or '')
+    transaction.on_commit(lambda: executor.submit(ejecutar, job.pk))
+    return job
+
+
+def ejecutar(job_id):
+    """Genera el reporte de un job. Corre en un hilo del pool."""
+    close_old_connections()
+    try:
+        # Reclamar el job: si ya no está PENDIENTE (p. ej. lo limpiaron) no se hace nada
+        if not ReporteJob.objects.filter(pk=job_id, estado=ReporteJob.PENDIENTE).update(
+            estado=ReporteJob.EN_PROCESO, iniciado_en=timezone.now()
+        ):
+            return
+        job = ReporteJob.objects.get(pk=job_id)
+        try:
+            generar = documentos.GENERADORES[job.tipo]
+            contenido, nombre, content_type = generar(job.parametros, job.solicitado_por)
+            destino = directorio_reportes() / f'{job.pk}{Path(nombre).suffix}'
+            destino.write_bytes(contenido)
+
+            ReporteJob.objects.filter(pk=job.pk).update(
+                estado=ReporteJob.COMPLETADO, archivo=str(destino), nombre_archivo=nombre,
+                content_type=content_type, finalizado_en=timezone.now(),
+            )
+        except Exception as e:
+            logger.exception('Error generando el reporte %s: %s', job_id, e)
+            ReporteJob.objects.filter(pk=job_id).update(
+                estado=ReporteJob.ERROR, error=str(e)[:1000], finalizado_en=timezone.now()
+            )
+    finally:
+        # Cada hilo del pool tiene su propia conexión: no dejarla abierta entre jobs
+        connection.close()
+
+
+def limpiar(horas=None):
+    """Borra los jobs terminados hace más de `horas` (por defecto REPORTES_RETENCION_HORAS) y sus archivos."""
+    horas = settings.REPORTES_RETENCION_HORAS if horas is None else horas
+    limite = timezone.now() - timedelta(hours=horas)
+    vencidos = ReporteJob.objects.filter(finalizado_en__lt=limite)
+    borrados = 0
+    for job in vencidos.only('pk', 'archivo'):
+        if job.archivo:
+            Path(job.archivo).unlink(missing_ok=True)
+        job.delete()
+        borrados += 1
+    return borrados
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestion import jobs
+
+
+class Command(BaseCommand):
+    help = 'Borra los reportes generados en segundo plano más antiguos que el periodo de retención.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int, default=None,
+            help=f'Antigüedad mínima en horas. Por defecto REPORTES_RETENCION_HORAS ({settings.REPORTES_RETENCION_HORAS}).',
+        )
+
+    def handle(self, *args, **options):
+        borrados = jobs.limpiar(horas=options['horas'])
+        self.stdout.write(self.style.SUCCESS(f'Reportes borrados: {borrados}'))
@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion import rollups
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Fecha inválida '{valor}', use el formato AAAA-MM-DD")
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla VisitaRollupDiario a partir de Visitante para un rango de fechas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primer día a reconstruir (AAAA-MM-DD). Por defecto, desde el inicio.')
+        parser.add_argument('--hasta', help='Último día a reconstruir (AAAA-MM-DD), inclusive. Por defecto, sin límite.')
+
+    def handle(self, *args, **options):
+        desde = _fecha(options['desde']) if options['desde'] else None
+        hasta = _fecha(options['hasta']) if options['hasta'] else None
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        filas = rollups.reconstruir(desde=desde, hasta=hasta)
+        rango = f"{desde or 'inicio'} a {hasta or 'hoy'}"
+        self.stdout.write(self.style.SUCCESS(f'Rollup reconstruido ({rango}): {filas} filas'))
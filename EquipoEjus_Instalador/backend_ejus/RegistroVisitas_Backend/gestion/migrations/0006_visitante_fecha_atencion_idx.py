@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0005_alter_visitante_cedula_persona_visitante_persona_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['fecha_hora_ingreso', 'atencion_completada'], name='gestion_vis_fecha_h_02baa7_idx'),
+        ),
+    ]
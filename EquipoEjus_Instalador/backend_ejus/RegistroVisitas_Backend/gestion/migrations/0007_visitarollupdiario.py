@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 08:24
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def poblar_rollup(apps, schema_editor):
+    # Lo que hacía rollups.reconstruir() con el municipio como texto; desde
+    # 0014 el rollup usa claves del catálogo y esta migración no puede llamarla
+    Visitante = apps.get_model('gestion', 'Visitante')
+    VisitaRollupDiario = apps.get_model('gestion', 'VisitaRollupDiario')
+    filas = Visitante.objects.annotate(fecha=TruncDate('fecha_hora_ingreso')).values(
+        'fecha', 'municipio', 'tipo_visita', 'referir_a'
+    ).annotate(
+        total=Count('id'),
+        completados=Count('id', filter=Q(atencion_completada=True)),
+        referidos=Count('id', filter=~Q(referir_a='NO_REFERIDO')),
+    ).order_by()
+
+    # NULL y '' comparten fila en el rollup
+    acumulado = {}
+    for fila in filas:
+        clave = (fila['fecha'], fila['municipio'] or '', fila['tipo_visita'], fila['referir_a'])
+        previo = acumulado.get(clave, (0, 0, 0))
+        acumulado[clave] = (previo[0] + fila['total'], previo[1] + fila['completados'], previo[2] + fila['referidos'])
+
+    VisitaRollupDiario.objects.bulk_create([
+        VisitaRollupDiario(
+            fecha=fecha, municipio=municipio, tipo_visita=tipo, referir_a=referir,
+            total=total, completados=completados, referidos=referidos,
+        )
+        for (fecha, municipio, tipo, referir), (total, completados, referidos) in acumulado.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0006_visitante_fecha_atencion_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitaRollupDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('municipio', models.CharField(blank=True, default='', max_length=100, verbose_name='Municipio')),
+                ('tipo_visita', models.CharField(max_length=80, verbose_name='Tipo de trámite')),
+                ('referir_a', models.CharField(max_length=50, verbose_name='Referido a')),
+                ('total', models.IntegerField(default=0, verbose_name='Total de visitas')),
+                ('completados', models.IntegerField(default=0, verbose_name='Atenciones completadas')),
+                ('referidos', models.IntegerField(default=0, verbose_name='Visitas referidas')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de visitas',
+                'verbose_name_plural': 'Resúmenes diarios de visitas',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'municipio', 'tipo_visita', 'referir_a'), name='gestion_rollup_diario_clave_uniq')],
+            },
+        ),
+        migrations.RunPython(poblar_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+import logging
+
+from django.db import OperationalError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLA_FTS = 'gestion_visitante_fts'
+COLUMNAS_FTS = ('nombre', 'cedula', 'telefono', 'municipio', 'parroquia')
+
+
+def _sentencias_eliminar():
+    return [
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au',
+        f'DROP TABLE IF EXISTS {TABLA_FTS}',
+    ]
+
+
+def instalar_fts_texto(conn):
+    """El índice tal como se creó aquí, con municipio y parroquia como texto.
+
+    busqueda.instalar_fts() indexa desde 0014 los nombres del catálogo y no
+    sirve para el esquema de esta migración.
+    """
+    columnas = ', '.join(COLUMNAS_FTS)
+    nuevas = ', '.join(f'new.{c}' for c in COLUMNAS_FTS)
+    viejas = ', '.join(f'old.{c}' for c in COLUMNAS_FTS)
+    sentencias = [
+        *_sentencias_eliminar(),
+        f"""CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+            {columnas},
+            content='gestion_visitante', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON gestion_visitante BEGIN
+            INSERT INTO {TABLA_FTS}(rowid, {columnas}) VALUES (new.id, {nuevas});
+        END""",
+        f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON gestion_visitante BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {columnas}) VALUES ('delete', old.id, {viejas});
+        END""",
+        f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {columnas} ON gestion_visitante BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {columnas}) VALUES ('delete', old.id, {viejas});
+            INSERT INTO {TABLA_FTS}(rowid, {columnas}) VALUES (new.id, {nuevas});
+        END""",
+        f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')",
+    ]
+    with conn.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+
+
+def crear_indice_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            instalar_fts_texto(schema_editor.connection)
+    except OperationalError as e:
+        # SQLite compilado sin FTS5: la búsqueda sigue funcionando con __icontains
+        logger.warning('No se pudo crear el índice FTS5 de visitantes: %s', e)
+
+
+def eliminar_indice_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in _sentencias_eliminar():
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_visitarollupdiario'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fts, eliminar_indice_fts),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 6.0 on 2026-10-18 08:37
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+LOTE = 2000
+
+# Formatos que escribían perform_create, perform_update y Visitante.registrar_salida
+RE_CREADO = re.compile(r'^Creado por:\s*(?P<usuario>.*?)(?:\s+-\s+(?P<fecha>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}))?$')
+RE_ACTUALIZADO = re.compile(r'^Actualizado por:\s*(?P<usuario>.*?)(?:\s+-\s+(?P<fecha>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}))?$')
+RE_SALIDA = re.compile(r'^\[Salida registrada:\s*(?P<fecha>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]$')
+
+
+def _leer_fecha(texto, defecto):
+    if not texto:
+        return defecto
+    # timezone.now().strftime() escribía la hora en UTC
+    return datetime.strptime(texto, FORMATO_FECHA).replace(tzinfo=dt_timezone.utc)
+
+
+def parsear_historial(visitante):
+    """Convierte el texto de historial de un visitante en una lista de (accion, usuario, fecha, detalle)."""
+    eventos = []
+    for linea in (visitante.historial or '').splitlines():
+        linea = linea.strip()
+        if not linea:
+            continue
+        for accion, regex in (('CREADO', RE_CREADO), ('ACTUALIZADO', RE_ACTUALIZADO), ('SALIDA', RE_SALIDA)):
+            encontrado = regex.match(linea)
+            if encontrado:
+                datos = encontrado.groupdict()
+                defecto = visitante.creado_en if accion == 'CREADO' else visitante.actualizado_en
+                eventos.append((accion, datos.get('usuario') or '', _leer_fecha(datos['fecha'], defecto), ''))
+                break
+        else:
+            eventos.append(('NOTA', '', visitante.creado_en, linea))
+    return eventos
+
+
+def importar_historial(apps, schema_editor):
+    Visitante = apps.get_model('gestion', 'Visitante')
+    VisitanteEvento = apps.get_model('gestion', 'VisitanteEvento')
+    pendientes = Visitante.objects.exclude(historial__isnull=True).exclude(historial='').only(
+        'historial', 'creado_en', 'actualizado_en'
+    )
+    eventos, visitantes = [], []
+    for visitante in pendientes.iterator(chunk_size=LOTE):
+        parseados = parsear_historial(visitante)
+        eventos.extend(
+            VisitanteEvento(visitante_id=visitante.pk, accion=accion, usuario=usuario, fecha=fecha, detalle=detalle)
+            for accion, usuario, fecha, detalle in parseados
+        )
+        creadores = [usuario for accion, usuario, _, _ in parseados if accion == 'CREADO' and usuario]
+        editores = [usuario for accion, usuario, _, _ in parseados if accion == 'ACTUALIZADO' and usuario]
+        if creadores or editores:
+            visitante.creado_por = creadores[0] if creadores else None
+            visitante.actualizado_por = editores[-1] if editores else None
+            visitantes.append(visitante)
+        if len(eventos) >= LOTE:
+            VisitanteEvento.objects.bulk_create(eventos)
+            eventos = []
+        if len(visitantes) >= LOTE:
+            Visitante.objects.bulk_update(visitantes, ['creado_por', 'actualizado_por'])
+            visitantes = []
+    VisitanteEvento.objects.bulk_create(eventos)
+    Visitante.objects.bulk_update(visitantes, ['creado_por', 'actualizado_por'], batch_size=LOTE)
+
+
+def exportar_historial(apps, schema_editor):
+    """Reverso: vuelve a escribir los eventos como texto de historial."""
+    Visitante = apps.get_model('gestion', 'Visitante')
+    VisitanteEvento = apps.get_model('gestion', 'VisitanteEvento')
+    lineas = {}
+    for evento in VisitanteEvento.objects.order_by('visitante_id', 'fecha', 'id').iterator(chunk_size=LOTE):
+        fecha = evento.fecha.astimezone(dt_timezone.utc).strftime(FORMATO_FECHA)
+        if evento.accion == 'CREADO':
+            linea = f'Creado por: {evento.usuario} - {fecha}'
+        elif evento.accion == 'ACTUALIZADO':
+            linea = f'Actualizado por: {evento.usuario} - {fecha}'
+        elif evento.accion == 'SALIDA':
+            linea = f'[Salida registrada: {fecha}]'
+        else:
+            linea = evento.detalle
+        lineas.setdefault(evento.visitante_id, []).append(linea)
+    visitantes = []
+    for visitante in Visitante.objects.filter(pk__in=lineas).only('pk'):
+        visitante.historial = '\n' + '\n'.join(lineas[visitante.pk])
+        visitantes.append(visitante)
+    Visitante.objects.bulk_update(visitantes, ['historial'], batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0008_visitante_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitante',
+            name='actualizado_por',
+            field=models.CharField(blank=True, max_length=150, null=True, verbose_name='Actualizado por'),
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='creado_por',
+            field=models.CharField(blank=True, max_length=150, null=True, verbose_name='Creado por'),
+        ),
+        migrations.CreateModel(
+            name='VisitanteEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accion', models.CharField(choices=[('CREADO', 'Creado'), ('ACTUALIZADO', 'Actualizado'), ('SALIDA', 'Salida registrada'), ('NOTA', 'Nota')], max_length=20, verbose_name='Acción')),
+                ('usuario', models.CharField(blank=True, default='', max_length=150, verbose_name='Usuario')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('detalle', models.TextField(blank=True, default='', verbose_name='Detalle')),
+                ('visitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='gestion.visitante')),
+            ],
+            options={
+                'verbose_name': 'Evento de visitante',
+                'verbose_name_plural': 'Eventos de visitantes',
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['visitante', 'fecha'], name='gestion_vis_visitan_23adb4_idx'), models.Index(fields=['fecha'], name='gestion_vis_fecha_afa77e_idx')],
+            },
+        ),
+        migrations.RunPython(importar_historial, exportar_historial),
+        migrations.RemoveField(
+            model_name='visitante',
+            name='historial',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 08:57
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_visitanteevento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel')], max_length=10, verbose_name='Tipo de reporte')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('archivo', models.CharField(blank=True, default='', max_length=255, verbose_name='Ruta del archivo generado')),
+                ('nombre_archivo', models.CharField(blank=True, default='', max_length=150, verbose_name='Nombre de descarga')),
+                ('content_type', models.CharField(blank=True, default='', max_length=100, verbose_name='Tipo de contenido')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('solicitado_por', models.CharField(blank=True, default='', max_length=150, verbose_name='Solicitado por')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, verbose_name='Creado en')),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado en')),
+                ('finalizado_en', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado en')),
+            ],
+            options={
+                'verbose_name': 'Reporte en segundo plano',
+                'verbose_name_plural': 'Reportes en segundo plano',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['estado'], name='gestion_rep_estado_a32486_idx'), models.Index(fields=['finalizado_en'], name='gestion_rep_finaliz_c773d8_idx')],
+            },
+        ),
+    ]
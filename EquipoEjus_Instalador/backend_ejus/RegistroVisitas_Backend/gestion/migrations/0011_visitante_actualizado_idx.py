@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0010_reportejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['actualizado_en'], name='gestion_vis_actuali_a1d63d_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_visitante_actualizado_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['parroquia'], name='gestion_vis_parroqu_9a9d31_idx'),
+        ),
+    ]
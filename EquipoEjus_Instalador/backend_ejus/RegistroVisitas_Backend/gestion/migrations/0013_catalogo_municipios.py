@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 09:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_catalogo(apps, schema_editor):
+    """Crea el catálogo con los municipios y parroquias distintos ya registrados."""
+    Visitante = apps.get_model('gestion', 'Visitante')
+    Municipio = apps.get_model('gestion', 'Municipio')
+    Parroquia = apps.get_model('gestion', 'Parroquia')
+
+    pares = set()
+    for municipio, parroquia in Visitante.objects.values_list('municipio', 'parroquia').distinct().iterator():
+        municipio = (municipio or '').strip()
+        if municipio:
+            pares.add((municipio, (parroquia or '').strip()))
+
+    Municipio.objects.bulk_create(
+        [Municipio(nombre=nombre) for nombre in sorted({m for m, _ in pares})], ignore_conflicts=True
+    )
+    ids = dict(Municipio.objects.values_list('nombre', 'id'))
+    Parroquia.objects.bulk_create(
+        [Parroquia(municipio_id=ids[m], nombre=p) for m, p in sorted(pares) if p],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_visitante_parroquia_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Municipio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+            ],
+            options={
+                'verbose_name': 'Municipio',
+                'verbose_name_plural': 'Municipios',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Parroquia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('municipio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parroquias', to='gestion.municipio', verbose_name='Municipio')),
+            ],
+            options={
+                'verbose_name': 'Parroquia',
+                'verbose_name_plural': 'Parroquias',
+                'ordering': ['municipio__nombre', 'nombre'],
+                'constraints': [models.UniqueConstraint(fields=('municipio', 'nombre'), name='gestion_parroquia_municipio_nombre_uniq')],
+            },
+        ),
+        migrations.RunPython(poblar_catalogo, migrations.RunPython.noop),
+    ]
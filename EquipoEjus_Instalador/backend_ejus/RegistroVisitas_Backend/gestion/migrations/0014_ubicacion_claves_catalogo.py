@@ -0,0 +1,336 @@
+# Generated by Django 6.0 on 2026-10-18 10:02
+
+import logging
+import unicodedata
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models, transaction
+from django.db.models import Case, Count, Q, When
+from django.db.models.functions import TruncDate
+
+logger = logging.getLogger(__name__)
+
+# Valores de texto distintos por UPDATE (límite de parámetros de SQLite)
+LOTE = 200
+
+TABLA_FTS = 'gestion_visitante_fts'
+COLUMNAS_FTS = ('nombre', 'cedula', 'telefono', 'municipio', 'parroquia')
+COLUMNAS_VISITANTE = ('nombre', 'cedula', 'telefono', 'municipio_id', 'parroquia_id')
+
+
+def _limpiar(nombre):
+    return ' '.join((nombre or '').split())
+
+
+def _normalizar(nombre):
+    # Igual que catalogo.normalizar(): copiado para no depender del código actual
+    descompuesto = unicodedata.normalize('NFKD', _limpiar(nombre))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def _preferido(escrituras):
+    """La escritura más usada; a igualdad, la que lleva acentos o mayúsculas."""
+    return max(escrituras.items(), key=lambda e: (e[1], e[0] != e[0].lower(), e[0] != _normalizar(e[0]), e[0]))[0]
+
+
+def _sentencias_eliminar_fts():
+    return [
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_municipio_au',
+        f'DROP TRIGGER IF EXISTS {TABLA_FTS}_parroquia_au',
+        f'DROP TABLE IF EXISTS {TABLA_FTS}',
+    ]
+
+
+def _valores_fts(alias):
+    return (
+        f'{alias}.id, {alias}.nombre, {alias}.cedula, {alias}.telefono, '
+        f'(SELECT nombre FROM gestion_municipio WHERE id = {alias}.municipio_id), '
+        f'(SELECT nombre FROM gestion_parroquia WHERE id = {alias}.parroquia_id)'
+    )
+
+
+def _ejecutar(conn, sentencias):
+    with conn.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+
+
+def quitar_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # Los triggers del índice leen las columnas de texto que se eliminan
+    _ejecutar(schema_editor.connection, _sentencias_eliminar_fts())
+
+
+def normalizar_ubicaciones(apps, schema_editor):
+    """Rehace el catálogo uniendo variantes de escritura y asigna las claves a los visitantes.
+
+    Las variantes se agrupan por nombre sin mayúsculas, acentos ni espacios
+    repetidos; queda la escritura más usada. Un visitante con parroquia pero
+    sin municipio queda sin parroquia (no hay en qué municipio buscarla).
+    """
+    Visitante = apps.get_model('gestion', 'Visitante')
+    Municipio = apps.get_model('gestion', 'Municipio')
+    Parroquia = apps.get_model('gestion', 'Parroquia')
+
+    usos = Visitante.objects.values_list('municipio_texto', 'parroquia_texto').annotate(n=Count('id')).order_by()
+    usos = [(m, p, n) for m, p, n in usos]
+    escrituras_municipio = defaultdict(Counter)
+    escrituras_parroquia = defaultdict(Counter)
+    for municipio, parroquia, n in usos:
+        if _limpiar(municipio):
+            escrituras_municipio[_normalizar(municipio)][_limpiar(municipio)] += n
+            if _limpiar(parroquia):
+                clave = (_normalizar(municipio), _normalizar(parroquia))
+                escrituras_parroquia[clave][_limpiar(parroquia)] += n
+    # Lo que ya estaba en el catálogo se conserva aunque ningún visitante lo use
+    for parroquia in Parroquia.objects.select_related('municipio'):
+        escrituras_municipio[_normalizar(parroquia.municipio.nombre)][_limpiar(parroquia.municipio.nombre)] += 0
+        clave = (_normalizar(parroquia.municipio.nombre), _normalizar(parroquia.nombre))
+        escrituras_parroquia[clave][_limpiar(parroquia.nombre)] += 0
+    for nombre in Municipio.objects.values_list('nombre', flat=True):
+        escrituras_municipio[_normalizar(nombre)][_limpiar(nombre)] += 0
+
+    Parroquia.objects.all().delete()
+    Municipio.objects.all().delete()
+    Municipio.objects.bulk_create([
+        Municipio(clave=clave, nombre=_preferido(escrituras))
+        for clave, escrituras in sorted(escrituras_municipio.items())
+    ])
+    municipios = dict(Municipio.objects.values_list('clave', 'id'))
+    Parroquia.objects.bulk_create([
+        Parroquia(municipio_id=municipios[municipio], clave=clave, nombre=_preferido(escrituras))
+        for (municipio, clave), escrituras in sorted(escrituras_parroquia.items())
+    ], batch_size=1000)
+    parroquias = {
+        (municipio_id, clave): pk
+        for pk, municipio_id, clave in Parroquia.objects.values_list('id', 'municipio_id', 'clave')
+    }
+
+    # Un UPDATE por lote de municipios (escritos como en la base), con un CASE
+    # por municipio y otro anidado por parroquia: una pasada por lote
+    por_municipio = defaultdict(dict)
+    for municipio, parroquia, _ in usos:
+        if _limpiar(municipio):
+            municipio_id = municipios[_normalizar(municipio)]
+            por_municipio[municipio][parroquia] = (
+                parroquias[(municipio_id, _normalizar(parroquia))] if _limpiar(parroquia) else None
+            )
+    textos = list(por_municipio)
+    for inicio in range(0, len(textos), LOTE):
+        lote = textos[inicio:inicio + LOTE]
+        Visitante.objects.filter(municipio_texto__in=lote).update(
+            municipio_id=Case(*[
+                When(municipio_texto=texto, then=municipios[_normalizar(texto)]) for texto in lote
+            ], output_field=models.BigIntegerField()),
+            parroquia_id=Case(*[
+                When(municipio_texto=texto, then=Case(*[
+                    When(parroquia_texto=parroquia, then=parroquia_id)
+                    for parroquia, parroquia_id in por_municipio[texto].items()
+                    if parroquia is not None and parroquia_id is not None
+                ], default=None, output_field=models.BigIntegerField()))
+                for texto in lote
+            ], output_field=models.BigIntegerField()),
+        )
+
+    huerfanas = sum(n for m, p, n in usos if _limpiar(p) and not _limpiar(m))
+    if huerfanas:
+        logger.warning('%s visitantes con parroquia pero sin municipio quedaron sin parroquia', huerfanas)
+
+
+def restaurar_texto(apps, schema_editor):
+    """Vuelve a escribir los nombres en las columnas de texto (reversa)."""
+    Visitante = apps.get_model('gestion', 'Visitante')
+    Municipio = apps.get_model('gestion', 'Municipio')
+    Parroquia = apps.get_model('gestion', 'Parroquia')
+    for pk, nombre in Municipio.objects.values_list('id', 'nombre'):
+        Visitante.objects.filter(municipio_id=pk).update(municipio_texto=nombre)
+    for pk, nombre in Parroquia.objects.values_list('id', 'nombre'):
+        Visitante.objects.filter(parroquia_id=pk).update(parroquia_texto=nombre)
+
+
+def reconstruir_rollup(apps, schema_editor):
+    # Lo que hace rollups.reconstruir() con el esquema de esta migración,
+    # copiado para que los cambios posteriores de rollups.py no la afecten
+    Visitante = apps.get_model('gestion', 'Visitante')
+    VisitaRollupDiario = apps.get_model('gestion', 'VisitaRollupDiario')
+    filas = Visitante.objects.annotate(fecha=TruncDate('fecha_hora_ingreso')).values(
+        'fecha', 'municipio', 'tipo_visita', 'referir_a'
+    ).annotate(
+        total=Count('id'),
+        completados=Count('id', filter=Q(atencion_completada=True)),
+        referidos=Count('id', filter=~Q(referir_a='NO_REFERIDO')),
+    ).order_by()
+
+    VisitaRollupDiario.objects.all().delete()
+    VisitaRollupDiario.objects.bulk_create([
+        VisitaRollupDiario(
+            fecha=fila['fecha'], municipio_id=fila['municipio'], tipo_visita=fila['tipo_visita'],
+            referir_a=fila['referir_a'], total=fila['total'], completados=fila['completados'],
+            referidos=fila['referidos'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+def vaciar_rollup(apps, schema_editor):
+    # Reversa: las filas por id de municipio no sirven para el rollup de texto
+    apps.get_model('gestion', 'VisitaRollupDiario').objects.all().delete()
+
+
+def instalar_fts(apps, schema_editor):
+    """El índice de busqueda.instalar_fts() tal como era aquí: guarda su copia de los nombres del catálogo."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    columnas = ', '.join(COLUMNAS_FTS)
+    insertar = f'INSERT INTO {TABLA_FTS}(rowid, {columnas})'
+    sentencias = [
+        *_sentencias_eliminar_fts(),
+        f"""CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+            {columnas},
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON gestion_visitante BEGIN
+            {insertar} SELECT {_valores_fts('new')};
+        END""",
+        f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON gestion_visitante BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {', '.join(COLUMNAS_VISITANTE)} ON gestion_visitante BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+            {insertar} SELECT {_valores_fts('new')};
+        END""",
+        *[
+            f"""CREATE TRIGGER {TABLA_FTS}_{tabla}_au AFTER UPDATE OF nombre ON gestion_{tabla} BEGIN
+                DELETE FROM {TABLA_FTS} WHERE rowid IN (SELECT id FROM gestion_visitante WHERE {tabla}_id = new.id);
+                {insertar} SELECT {_valores_fts('v')} FROM gestion_visitante v WHERE v.{tabla}_id = new.id;
+            END"""
+            for tabla in ('municipio', 'parroquia')
+        ],
+        f"{insertar} SELECT {_valores_fts('v')} FROM gestion_visitante v",
+    ]
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            _ejecutar(schema_editor.connection, sentencias)
+    except OperationalError as e:
+        # SQLite compilado sin FTS5: la búsqueda sigue funcionando con __icontains
+        logger.warning('No se pudo crear el índice FTS5 de visitantes: %s', e)
+
+
+def eliminar_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    _ejecutar(schema_editor.connection, _sentencias_eliminar_fts())
+
+
+class Migration(migrations.Migration):
+    """Municipio y parroquia de texto a claves del catálogo.
+
+    Al revertir, los visitantes recuperan el texto (ya sin variantes) y el
+    índice FTS5 queda eliminado hasta volver a migrar (la búsqueda usa
+    __icontains); el rollup queda vacío y se debe rehacer con
+    `manage.py rebuild_rollups`.
+    """
+
+    dependencies = [
+        ('gestion', '0013_catalogo_municipios'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_fts, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='visitante',
+            name='gestion_vis_municip_914528_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='visitante',
+            name='gestion_vis_parroqu_9a9d31_idx',
+        ),
+        migrations.RenameField(
+            model_name='visitante',
+            old_name='municipio',
+            new_name='municipio_texto',
+        ),
+        migrations.RenameField(
+            model_name='visitante',
+            old_name='parroquia',
+            new_name='parroquia_texto',
+        ),
+        migrations.RemoveConstraint(
+            model_name='parroquia',
+            name='gestion_parroquia_municipio_nombre_uniq',
+        ),
+        migrations.AlterField(
+            model_name='municipio',
+            name='nombre',
+            field=models.CharField(max_length=100, verbose_name='Nombre'),
+        ),
+        migrations.AddField(
+            model_name='municipio',
+            name='clave',
+            field=models.CharField(default='', editable=False, max_length=100, verbose_name='Clave'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='parroquia',
+            name='clave',
+            field=models.CharField(default='', editable=False, max_length=100, verbose_name='Clave'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='municipio',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visitantes', to='gestion.municipio', verbose_name='Municipio'),
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='parroquia',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='visitantes', to='gestion.parroquia', verbose_name='Parroquia'),
+        ),
+        migrations.RunPython(normalizar_ubicaciones, restaurar_texto),
+        migrations.RemoveField(
+            model_name='visitante',
+            name='municipio_texto',
+        ),
+        migrations.RemoveField(
+            model_name='visitante',
+            name='parroquia_texto',
+        ),
+        migrations.AlterField(
+            model_name='municipio',
+            name='clave',
+            field=models.CharField(editable=False, max_length=100, unique=True, verbose_name='Clave'),
+        ),
+        migrations.AddConstraint(
+            model_name='parroquia',
+            constraint=models.UniqueConstraint(fields=('municipio', 'clave'), name='gestion_parroquia_municipio_clave_uniq'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='visitarollupdiario',
+            name='gestion_rollup_diario_clave_uniq',
+        ),
+        migrations.RemoveField(
+            model_name='visitarollupdiario',
+            name='municipio',
+        ),
+        migrations.AddField(
+            model_name='visitarollupdiario',
+            name='municipio',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.municipio', verbose_name='Municipio'),
+        ),
+        # Antes de las restricciones: con la columna nueva todas las filas tienen municipio nulo
+        migrations.RunPython(reconstruir_rollup, vaciar_rollup),
+        migrations.AddConstraint(
+            model_name='visitarollupdiario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'municipio', 'tipo_visita', 'referir_a'), name='gestion_rollup_diario_clave_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitarollupdiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('municipio__isnull', True)), fields=('fecha', 'tipo_visita', 'referir_a'), name='gestion_rollup_diario_sin_municipio_uniq'),
+        ),
+        migrations.RunPython(instalar_fts, eliminar_fts),
+    ]
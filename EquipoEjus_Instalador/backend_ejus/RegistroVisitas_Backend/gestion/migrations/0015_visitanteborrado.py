@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_ubicacion_claves_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitanteBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visitante_id', models.BigIntegerField(verbose_name='Id del visitante')),
+                ('borrado_en', models.DateTimeField(auto_now_add=True, verbose_name='Borrado en')),
+            ],
+            options={
+                'verbose_name': 'Visitante borrado',
+                'verbose_name_plural': 'Visitantes borrados',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.utils import timezone
 
 class Visitante(models.Model):
@@ -65,8 +67,14 @@ class Visitante(models.Model):
     telefono = models.CharField(max_length=20, verbose_name="Teléfono", blank=True, null=True)
     
     # Información de ubicación
-    municipio = models.CharField(max_length=100, verbose_name="Municipio", blank=True, null=True)
-    parroquia = models.CharField(max_length=100, verbose_name="Parroquia", blank=True, null=True)
+    municipio = models.ForeignKey(
+        'Municipio', null=True, blank=True, on_delete=models.PROTECT, related_name='visitantes',
+        verbose_name="Municipio"
+    )
+    parroquia = models.ForeignKey(
+        'Parroquia', null=True, blank=True, on_delete=models.PROTECT, related_name='visitantes',
+        verbose_name="Parroquia"
+    )
     direccion = models.TextField(verbose_name="Dirección completa", blank=True, null=True)
     
     # Información del trámite/consulta
@@ -98,9 +106,10 @@ class Visitante(models.Model):
     atencion_completada = models.BooleanField(default=False, verbose_name="Atención completada")
     
     observaciones = models.TextField(blank=True, verbose_name="Observaciones")
-    historial = models.TextField(blank=True, verbose_name="Historial de cambios", null=True)
     
-    # Campos de auditoría
+    # Campos de auditoría (el detalle de cada cambio está en VisitanteEvento)
+    creado_por = models.CharField(max_length=150, blank=True, null=True, verbose_name="Creado por")
+    actualizado_por = models.CharField(max_length=150, blank=True, null=True, verbose_name="Actualizado por")
     creado_en = models.DateTimeField(auto_now_add=True, verbose_name="Creado en")
     actualizado_en = models.DateTimeField(auto_now=True, verbose_name="Actualizado en")
     
@@ -140,13 +149,21 @@ class Visitante(models.Model):
         """Indica si requiere ser referido a otra institución"""
         return self.referir_a != 'NO_REFERIDO'
     
-    def registrar_salida(self):
+    def registrar_salida(self, usuario=None):
         """Método para registrar salida del visitante"""
         if not self.atencion_completada:
             self.fecha_hora_salida = timezone.now()
             self.atencion_completada = True
-            self.historial = f"{self.historial or ''}\n[Salida registrada: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}]"
-            self.save()
+            if usuario:
+                self.actualizado_por = usuario
+            with transaction.atomic():
+                self.save(update_fields=[
+                    'fecha_hora_salida', 'atencion_completada', 'actualizado_por', 'actualizado_en',
+                ])
+                VisitanteEvento.objects.create(
+                    visitante=self, accion=VisitanteEvento.SALIDA, usuario=usuario or '',
+                    fecha=self.fecha_hora_salida,
+                )
             return True
         return False
     
@@ -160,11 +177,62 @@ class Visitante(models.Model):
             models.Index(fields=['referir_a']),
             models.Index(fields=['atencion_completada']),
             models.Index(fields=['fecha_hora_ingreso']),
-            models.Index(fields=['municipio']),
+            # Cubre los conteos por rango de fechas con/sin atención completada
+            models.Index(fields=['fecha_hora_ingreso', 'atencion_completada']),
             models.Index(fields=['persona']),
+            # Max(actualizado_en) sin recorrer la tabla (versión de datos de la caché de reportes)
+            models.Index(fields=['actualizado_en']),
+        ]
+
+
+class VisitanteEvento(models.Model):
+    """Bitácora de cambios de un visitante: quién creó, actualizó o registró la salida y cuándo."""
+    CREADO = 'CREADO'
+    ACTUALIZADO = 'ACTUALIZADO'
+    SALIDA = 'SALIDA'
+    NOTA = 'NOTA'
+    ACCION_CHOICES = [
+        (CREADO, 'Creado'),
+        (ACTUALIZADO, 'Actualizado'),
+        (SALIDA, 'Salida registrada'),
+        (NOTA, 'Nota'),
+    ]
+
+    visitante = models.ForeignKey(Visitante, on_delete=models.CASCADE, related_name='eventos')
+    accion = models.CharField(max_length=20, choices=ACCION_CHOICES, verbose_name="Acción")
+    usuario = models.CharField(max_length=150, blank=True, default='', verbose_name="Usuario")
+    fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+    # Texto libre: las líneas del historial anterior que no siguen ningún formato conocido
+    detalle = models.TextField(blank=True, default='', verbose_name="Detalle")
+
+    def __str__(self):
+        return f"{self.get_accion_display()} - {self.visitante_id} - {self.fecha:%Y-%m-%d %H:%M:%S}"
+
+    class Meta:
+        ordering = ['fecha', 'id']
+        verbose_name = 'Evento de visitante'
+        verbose_name_plural = 'Eventos de visitantes'
+        indexes = [
+            models.Index(fields=['visitante', 'fecha']),
+            models.Index(fields=['fecha']),
         ]
 
 
+class VisitanteBorrado(models.Model):
+    """Registro de visitantes borrados, para que /visitantes/changes/ informe las bajas.
+
+    Lo escribe la señal post_delete de Visitante. No tiene clave foránea: la
+    fila original ya no existe. El id es autoincremental y nunca se reutiliza.
+    """
+    visitante_id = models.BigIntegerField(verbose_name="Id del visitante")
+    borrado_en = models.DateTimeField(auto_now_add=True, verbose_name="Borrado en")
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Visitante borrado'
+        verbose_name_plural = 'Visitantes borrados'
+
+
 class Persona(models.Model):
     """Registry of persons so we can track multiple visits per person."""
     cedula = models.CharField(max_length=20, unique=True, verbose_name="Cédula")
@@ -178,4 +246,126 @@ class Persona(models.Model):
     class Meta:
         verbose_name = 'Persona'
         verbose_name_plural = 'Personas'
-        indexes = [models.Index(fields=['cedula'])]
\ No newline at end of file
+        indexes = [models.Index(fields=['cedula'])]
+
+
+class Municipio(models.Model):
+    """Catálogo de municipios, alimentado con los valores de los visitantes (ver catalogo.py).
+
+    `clave` es el nombre sin mayúsculas, acentos ni espacios repetidos: las
+    variantes de escritura de un mismo municipio comparten registro.
+    """
+    nombre = models.CharField(max_length=100, verbose_name="Nombre")
+    clave = models.CharField(max_length=100, unique=True, editable=False, verbose_name="Clave")
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = 'Municipio'
+        verbose_name_plural = 'Municipios'
+
+
+class Parroquia(models.Model):
+    """Catálogo de parroquias de cada municipio."""
+    municipio = models.ForeignKey(
+        Municipio, on_delete=models.CASCADE, related_name='parroquias', verbose_name="Municipio"
+    )
+    nombre = models.CharField(max_length=100, verbose_name="Nombre")
+    clave = models.CharField(max_length=100, editable=False, verbose_name="Clave")
+
+    def __str__(self):
+        return f"{self.nombre} ({self.municipio})"
+
+    class Meta:
+        ordering = ['municipio__nombre', 'nombre']
+        verbose_name = 'Parroquia'
+        verbose_name_plural = 'Parroquias'
+        constraints = [
+            models.UniqueConstraint(fields=['municipio', 'clave'], name='gestion_parroquia_municipio_clave_uniq'),
+        ]
+
+
+class VisitaRollupDiario(models.Model):
+    """Conteos diarios precalculados de visitas, para que los reportes no recorran Visitante.
+
+    Se mantiene incrementalmente con señales sobre Visitante (ver signals.py)
+    y se puede reconstruir con `manage.py rebuild_rollups`. La fecha es el día
+    local (TIME_ZONE) de fecha_hora_ingreso; las visitas sin municipio van en
+    filas con municipio nulo.
+    """
+    fecha = models.DateField(verbose_name="Fecha")
+    municipio = models.ForeignKey(
+        Municipio, null=True, blank=True, on_delete=models.CASCADE, related_name='+', verbose_name="Municipio"
+    )
+    tipo_visita = models.CharField(max_length=80, verbose_name="Tipo de trámite")
+    referir_a = models.CharField(max_length=50, verbose_name="Referido a")
+
+    # IntegerField (no Positive) para que una deriva nunca haga fallar el save del visitante
+    total = models.IntegerField(default=0, verbose_name="Total de visitas")
+    completados = models.IntegerField(default=0, verbose_name="Atenciones completadas")
+    referidos = models.IntegerField(default=0, verbose_name="Visitas referidas")
+
+    def __str__(self):
+        return f"{self.fecha} {self.municipio_id or '-'} {self.tipo_visita} {self.referir_a}: {self.total}"
+
+    class Meta:
+        verbose_name = 'Resumen diario de visitas'
+        verbose_name_plural = 'Resúmenes diarios de visitas'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'municipio', 'tipo_visita', 'referir_a'],
+                name='gestion_rollup_diario_clave_uniq',
+            ),
+            # NULL no choca con NULL en un índice único: las filas sin municipio necesitan el suyo
+            models.UniqueConstraint(
+                fields=['fecha', 'tipo_visita', 'referir_a'],
+                condition=models.Q(municipio__isnull=True),
+                name='gestion_rollup_diario_sin_municipio_uniq',
+            ),
+        ]
+
+
+class ReporteJob(models.Model):
+    """Solicitud de generación de un reporte PDF/Excel en segundo plano (ver jobs.py)."""
+    PENDIENTE = 'PENDIENTE'
+    EN_PROCESO = 'EN_PROCESO'
+    COMPLETADO = 'COMPLETADO'
+    ERROR = 'ERROR'
+    ESTADO_CHOICES = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+    TIPO_CHOICES = [
+        ('pdf', 'PDF'),
+        ('excel', 'Excel'),
+    ]
+
+    # UUID para que no se puedan adivinar los reportes de otros usuarios
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, verbose_name="Tipo de reporte")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parámetros")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE, verbose_name="Estado")
+    archivo = models.CharField(max_length=255, blank=True, default='', verbose_name="Ruta del archivo generado")
+    nombre_archivo = models.CharField(max_length=150, blank=True, default='', verbose_name="Nombre de descarga")
+    content_type = models.CharField(max_length=100, blank=True, default='', verbose_name="Tipo de contenido")
+    error = models.TextField(blank=True, default='', verbose_name="Error")
+    solicitado_por = models.CharField(max_length=150, blank=True, default='', verbose_name="Solicitado por")
+    creado_en = models.DateTimeField(auto_now_add=True, verbose_name="Creado en")
+    iniciado_en = models.DateTimeField(null=True, blank=True, verbose_name="Iniciado en")
+    finalizado_en = models.DateTimeField(null=True, blank=True, verbose_name="Finalizado en")
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.id} - {self.get_estado_display()}"
+
+    class Meta:
+        ordering = ['-creado_en']
+        verbose_name = 'Reporte en segundo plano'
+        verbose_name_plural = 'Reportes en segundo plano'
+        indexes = [
+            models.Index(fields=['estado']),
+            models.Index(fields=['finalizado_en']),
+        ]
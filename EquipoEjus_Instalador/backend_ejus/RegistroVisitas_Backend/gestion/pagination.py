@@ -1,7 +1,86 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
+    """Paginación por número de página, con un modo cursor (keyset) opcional.
+
+    Si la petición trae ?cursor= (vacío para la primera página) se pagina por
+    (fecha_hora_ingreso, id) descendente, igual que el orden por defecto del
+    modelo: cada página continúa desde el último registro de la anterior sin
+    OFFSET y sin COUNT(*). El total solo se calcula con ?count=true.
+    """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = self.cursor_query_param in request.query_params
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        posicion = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        self.total = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.total = queryset.count()
+
+        queryset = queryset.order_by('-fecha_hora_ingreso', '-id')
+        if posicion is not None:
+            fecha, pk = posicion
+            queryset = queryset.filter(
+                Q(fecha_hora_ingreso__lt=fecha) | Q(fecha_hora_ingreso=fecha, id__lt=pk)
+            )
+
+        # Se pide un registro de más para saber si existe una página siguiente
+        resultados = list(queryset[:page_size + 1])
+        self.siguiente = None
+        if len(resultados) > page_size:
+            resultados = resultados[:page_size]
+            ultimo = resultados[-1]
+            self.siguiente = (ultimo.fecha_hora_ingreso, ultimo.id)
+        return resultados
+
+    def get_paginated_response(self, data):
+        if not self.modo_cursor:
+            return super().get_paginated_response(data)
+        respuesta = {
+            'next': self.get_next_cursor_link(),
+            'previous': None,
+            'results': data,
+        }
+        if self.total is not None:
+            respuesta['count'] = self.total
+        return Response(respuesta)
+
+    def get_next_cursor_link(self):
+        if self.siguiente is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.siguiente))
+
+    def encode_cursor(self, fecha, pk):
+        valor = f'{fecha.isoformat()}|{pk}'.encode('ascii')
+        return base64.urlsafe_b64encode(valor).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            fecha, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(fecha), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound('Cursor inválido')
@@ -0,0 +1,124 @@
+"""Utilidades de agregación compartidas por las vistas de reportes."""
+from datetime import date, datetime, timedelta
+
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from . import catalogo
+from .models import VisitaRollupDiario
+
+PERIODO_MES = 'mes'
+PERIODO_SEMANA = 'semana'
+# Parámetros de query string que aplica filtrar_visitantes()
+PARAMETROS_FILTRO = ('municipio', 'tipo_visita', 'referir_a')
+
+
+def filtrar_visitantes(queryset, params):
+    """Aplica los filtros opcionales municipio/tipo_visita/referir_a de los reportes.
+
+    Sirve para Visitante y para VisitaRollupDiario: en ambos el municipio es
+    una clave del catálogo y ?municipio= se resuelve con catalogo.ids_municipio().
+    """
+    municipio_param = params.get('municipio')
+    tipo_param = params.get('tipo_visita')
+    referir_param = params.get('referir_a')
+    if municipio_param:
+        queryset = queryset.filter(municipio__in=catalogo.ids_municipio(municipio_param))
+    if tipo_param:
+        queryset = queryset.filter(tipo_visita=tipo_param)
+    if referir_param:
+        queryset = queryset.filter(referir_a=referir_param)
+    return queryset
+
+
+def leer_entero(params, nombre, defecto, minimo=1, maximo=None):
+    """Lee un parámetro entero de la query string, acotado a [minimo, maximo]."""
+    try:
+        valor = int(params.get(nombre, defecto))
+    except (TypeError, ValueError):
+        valor = defecto
+    valor = max(valor, minimo)
+    if maximo is not None:
+        valor = min(valor, maximo)
+    return valor
+
+
+def fecha_inicio_periodo(periodo, fecha_actual=None):
+    """Inicio del periodo ('hoy', 'semana', 'mes', 'trimestre', 'anio') de los reportes.
+
+    'semana' y 'trimestre' son ventanas móviles (ahora - 7/90 días); el resto
+    empieza a medianoche local. Un periodo desconocido equivale a 'mes'.
+    """
+    fecha_actual = timezone.localtime(fecha_actual)
+    if periodo == 'hoy':
+        return fecha_actual.replace(hour=0, minute=0, second=0, microsecond=0)
+    if periodo == 'semana':
+        return fecha_actual - timedelta(days=7)
+    if periodo == 'trimestre':
+        return fecha_actual - timedelta(days=90)
+    if periodo == 'anio':
+        return fecha_actual.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def medianoche_local(dia):
+    """Datetime consciente de zona horaria a las 00:00 locales del día dado."""
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+
+
+def inicio_periodo(dia, unidad):
+    """Primer día del mes o lunes de la semana que contiene `dia`."""
+    if unidad == PERIODO_MES:
+        return dia.replace(day=1)
+    return dia - timedelta(days=dia.weekday())
+
+
+def desplazar_periodo(inicio, unidad, pasos):
+    """Mueve un inicio de periodo `pasos` meses/semanas (negativo = hacia atrás)."""
+    if unidad == PERIODO_MES:
+        indice = inicio.year * 12 + (inicio.month - 1) + pasos
+        return date(indice // 12, indice % 12 + 1, 1)
+    return inicio + timedelta(weeks=pasos)
+
+
+def serie_por_periodo(params, unidad, cantidad):
+    """Cuenta visitas y atenciones completadas por mes o semana calendario.
+
+    Devuelve `cantidad` periodos consecutivos terminando en el actual (el más
+    antiguo primero), cada uno como dict con 'inicio', 'fin' (exclusivo),
+    'total' y 'completados'. `params` son los filtros de filtrar_visitantes().
+    Se resuelve con una sola consulta agrupada sobre VisitaRollupDiario; los
+    periodos sin visitas se rellenan con cero.
+
+    Los límites de cada periodo se calculan aquí y se pasan como un CASE
+    sobre la fecha en lugar de TruncMonth / TruncWeek, que en SQLite se
+    evalúan en Python fila por fila.
+    """
+    actual = inicio_periodo(timezone.localdate(), unidad)
+    inicios = [desplazar_periodo(actual, unidad, -k) for k in range(cantidad - 1, -1, -1)]
+    fines = [desplazar_periodo(inicio, unidad, 1) for inicio in inicios]
+
+    periodo = Case(
+        *[When(fecha__lt=fin, then=Value(n)) for n, fin in enumerate(fines)],
+        output_field=IntegerField(),
+    )
+    queryset = filtrar_visitantes(VisitaRollupDiario.objects.all(), params)
+    filas = queryset.filter(
+        fecha__gte=inicios[0],
+        fecha__lt=fines[-1],
+    ).annotate(periodo=periodo).values('periodo').annotate(
+        total=Sum('total'),
+        completados=Sum('completados'),
+    ).order_by()
+    conteos = {fila['periodo']: fila for fila in filas}
+
+    serie = []
+    for n, (inicio, fin) in enumerate(zip(inicios, fines)):
+        fila = conteos.get(n, {})
+        serie.append({
+            'inicio': inicio,
+            'fin': fin,
+            'total': fila.get('total') or 0,
+            'completados': fila.get('completados') or 0,
+        })
+    return serie
@@ -0,0 +1,225 @@
+"""Mantenimiento y consulta de la tabla de conteos diarios VisitaRollupDiario.
+
+Las escrituras sobre Visitante hechas con save()/delete() actualizan el
+rollup mediante señales. Las operaciones masivas (queryset.update(),
+bulk_create) no emiten señales y deben llamar a registrar_cambio(),
+registrar_cambios() o reconstruir() por su cuenta.
+"""
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Visitante, VisitaRollupDiario
+from .reportes import filtrar_visitantes, medianoche_local
+
+CAMPOS_CONTEO = ('total', 'completados', 'referidos')
+# Columnas de Visitante de las que depende estado_rollup()
+CAMPOS_ESTADO = ('fecha_hora_ingreso', 'municipio', 'tipo_visita', 'referir_a', 'atencion_completada')
+
+
+def estado_rollup(visitante):
+    """Clave del rollup y aportes (total, completados, referidos) de un visitante."""
+    clave = {
+        'fecha': timezone.localtime(visitante.fecha_hora_ingreso).date(),
+        'municipio_id': visitante.municipio_id,
+        'tipo_visita': visitante.tipo_visita,
+        'referir_a': visitante.referir_a,
+    }
+    aportes = (1, int(bool(visitante.atencion_completada)), int(visitante.referir_a != 'NO_REFERIDO'))
+    return clave, aportes
+
+
+def aplicar_delta(clave, total, completados, referidos):
+    """Suma (o resta) conteos a la fila del rollup identificada por `clave`."""
+    if not (total or completados or referidos):
+        return
+    cambios = {
+        'total': F('total') + total,
+        'completados': F('completados') + completados,
+        'referidos': F('referidos') + referidos,
+    }
+    with transaction.atomic():
+        if VisitaRollupDiario.objects.filter(**clave).update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                VisitaRollupDiario.objects.create(
+                    **clave, total=total, completados=completados, referidos=referidos
+                )
+        except IntegrityError:
+            # Otra petición creó la fila entre el update y el create
+            VisitaRollupDiario.objects.filter(**clave).update(**cambios)
+
+
+def registrar_cambio(anterior=None, nuevo=None):
+    """Aplica al rollup el paso de un estado a otro (cualquiera puede ser None).
+
+    Cada estado es el resultado de estado_rollup(); si ambos caen en la misma
+    clave se aplica un único delta.
+    """
+    if anterior and nuevo and anterior[0] == nuevo[0]:
+        aplicar_delta(anterior[0], *(n - a for a, n in zip(anterior[1], nuevo[1])))
+        return
+    if anterior:
+        aplicar_delta(anterior[0], *(-a for a in anterior[1]))
+    if nuevo:
+        aplicar_delta(nuevo[0], *nuevo[1])
+
+
+def registrar_cambios(cambios):
+    """Versión por lotes de registrar_cambio(): recibe pares (anterior, nuevo).
+
+    Acumula los deltas por clave y escribe una vez por fila del rollup, no
+    una vez por visitante.
+    """
+    acumulados = {}
+    for anterior, nuevo in cambios:
+        for estado, signo in ((anterior, -1), (nuevo, 1)):
+            if not estado:
+                continue
+            clave, aportes = estado
+            acumulado = acumulados.setdefault(tuple(sorted(clave.items())), [0, 0, 0])
+            for i, aporte in enumerate(aportes):
+                acumulado[i] += signo * aporte
+    for clave, deltas in acumulados.items():
+        aplicar_delta(dict(clave), *deltas)
+
+
+def reconstruir(desde=None, hasta=None, visitante_model=None, rollup_model=None):
+    """Recalcula el rollup para los días [desde, hasta] (ambos opcionales e inclusivos).
+
+    Acepta los modelos como parámetros para poder usarse desde migraciones.
+    Devuelve el número de filas de rollup creadas.
+    """
+    visitante_model = visitante_model or Visitante
+    rollup_model = rollup_model or VisitaRollupDiario
+
+    visitas = visitante_model.objects.all()
+    existentes = rollup_model.objects.all()
+    if desde:
+        visitas = visitas.filter(fecha_hora_ingreso__gte=medianoche_local(desde))
+        existentes = existentes.filter(fecha__gte=desde)
+    if hasta:
+        visitas = visitas.filter(fecha_hora_ingreso__lt=medianoche_local(hasta + timedelta(days=1)))
+        existentes = existentes.filter(fecha__lte=hasta)
+
+    filas = visitas.annotate(fecha=TruncDate('fecha_hora_ingreso')).values(
+        'fecha', 'municipio', 'tipo_visita', 'referir_a'
+    ).annotate(
+        total=Count('id'),
+        completados=Count('id', filter=Q(atencion_completada=True)),
+        referidos=Count('id', filter=~Q(referir_a='NO_REFERIDO')),
+    ).order_by()
+
+    acumulado = {
+        (fila['fecha'], fila['municipio'], fila['tipo_visita'], fila['referir_a']):
+            tuple(fila[c] for c in CAMPOS_CONTEO)
+        for fila in filas
+    }
+
+    with transaction.atomic():
+        existentes.delete()
+        rollup_model.objects.bulk_create([
+            rollup_model(
+                fecha=fecha, municipio_id=municipio, tipo_visita=tipo, referir_a=referir,
+                total=total, completados=completados, referidos=referidos,
+            )
+            for (fecha, municipio, tipo, referir), (total, completados, referidos) in acumulado.items()
+        ], batch_size=1000)
+    return len(acumulado)
+
+
+def conteos(params=None, desde=None, campos=(), filtro=None):
+    """Total, completados y referidos de las visitas con ingreso >= `desde`.
+
+    `campos` es un subconjunto de ('fecha', 'municipio', 'tipo_visita',
+    'referir_a'); sin campos devuelve un único dict de totales y con campos una
+    lista de dicts (solo grupos con visitas; el municipio es su id en el
+    catálogo, None si no tiene). `params` son los filtros de query
+    string de filtrar_visitantes() y `filtro` un Q adicional sobre esos campos.
+
+    Los días completos se leen del rollup. Si `desde` no cae a medianoche
+    local, el tramo parcial del primer día se cuenta sobre Visitante para
+    conservar el resultado exacto.
+    """
+    resultados = []
+    for queryset, agregados in _consultas_conteo(params, desde, campos, filtro):
+        resultados.append(list(queryset) if agregados is None else [queryset.aggregate(**agregados)])
+    return _acumular(resultados, campos)
+
+
+async def aconteos(params=None, desde=None, campos=(), filtro=None):
+    """conteos() con el ORM async, para las vistas de views_async.py."""
+    if (params or {}).get('municipio'):
+        # ?municipio= se resuelve con el catálogo, que puede tener que leerse de la base
+        consultas = await sync_to_async(_consultas_conteo)(params, desde, campos, filtro)
+    else:
+        consultas = _consultas_conteo(params, desde, campos, filtro)
+    resultados = []
+    for queryset, agregados in consultas:
+        if agregados is None:
+            resultados.append([fila async for fila in queryset])
+        else:
+            resultados.append([await queryset.aaggregate(**agregados)])
+    return _acumular(resultados, campos)
+
+
+def _consultas_conteo(params, desde, campos, filtro):
+    """Pares (queryset, agregados) de conteos(); con `campos` el queryset ya
+    viene agrupado y agregados es None."""
+    rollup_qs = VisitaRollupDiario.objects.all()
+    consultas = []
+    if desde is not None:
+        primer_dia = timezone.localtime(desde).date()
+        if desde != medianoche_local(primer_dia):
+            primer_dia += timedelta(days=1)
+            parcial = Visitante.objects.filter(
+                fecha_hora_ingreso__gte=desde,
+                fecha_hora_ingreso__lt=medianoche_local(primer_dia),
+            )
+            if 'fecha' in campos:
+                parcial = parcial.annotate(fecha=TruncDate('fecha_hora_ingreso'))
+            consultas.append((parcial, {
+                'total': Count('id'),
+                'completados': Count('id', filter=Q(atencion_completada=True)),
+                'referidos': Count('id', filter=~Q(referir_a='NO_REFERIDO')),
+            }))
+        rollup_qs = rollup_qs.filter(fecha__gte=primer_dia)
+    consultas.append((rollup_qs, {c: Sum(c) for c in CAMPOS_CONTEO}))
+
+    preparadas = []
+    for queryset, agregados in consultas:
+        queryset = filtrar_visitantes(queryset, params or {})
+        if filtro is not None:
+            queryset = queryset.filter(filtro)
+        if campos:
+            preparadas.append((queryset.values(*campos).annotate(**agregados).order_by(), None))
+        else:
+            preparadas.append((queryset, agregados))
+    return preparadas
+
+
+def _acumular(resultados, campos):
+    acumulado = {}
+    for filas in resultados:
+        for fila in filas:
+            clave = tuple(fila[c] for c in campos)
+            previo = acumulado.get(clave, (0, 0, 0))
+            acumulado[clave] = tuple(p + (fila[c] or 0) for p, c in zip(previo, CAMPOS_CONTEO))
+
+    if not campos:
+        return dict(zip(CAMPOS_CONTEO, acumulado.get((), (0, 0, 0))))
+    return [
+        {**dict(zip(campos, clave)), **dict(zip(CAMPOS_CONTEO, valores))}
+        for clave, valores in acumulado.items() if valores[0] > 0
+    ]
+
+
+def primera_fecha(params=None):
+    """Día local de la primera visita que cumple los filtros, o None."""
+    queryset = filtrar_visitantes(VisitaRollupDiario.objects.filter(total__gt=0), params or {})
+    return queryset.aggregate(primera=Min('fecha'))['primera']
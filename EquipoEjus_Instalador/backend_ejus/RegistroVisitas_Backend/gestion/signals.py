@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, rollups
+from .models import Persona, Visitante, VisitanteBorrado
+
+
+@receiver(post_save, sender=Visitante)
+@receiver(post_delete, sender=Visitante)
+@receiver(post_save, sender=Persona)
+@receiver(post_delete, sender=Persona)
+def invalidar_cache(sender, **kwargs):
+    """Cualquier alta, edición, salida o borrado de un visitante o persona invalida las cachés de lectura."""
+    cache.invalidar()
+
+
+@receiver(pre_save, sender=Visitante)
+def capturar_estado_rollup(sender, instance, update_fields=None, **kwargs):
+    """Guarda el estado previo en BD para poder descontarlo del rollup tras el save."""
+    instance._estado_rollup_anterior = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(rollups.CAMPOS_ESTADO).intersection(update_fields):
+        # El save no toca la clave ni los aportes: el delta es cero sin leer la fila
+        instance._estado_rollup_anterior = rollups.estado_rollup(instance)
+        return
+    anterior = Visitante.objects.filter(pk=instance.pk).only(*rollups.CAMPOS_ESTADO).first()
+    if anterior is not None:
+        instance._estado_rollup_anterior = rollups.estado_rollup(anterior)
+
+
+@receiver(post_save, sender=Visitante)
+def actualizar_rollup(sender, instance, **kwargs):
+    rollups.registrar_cambio(
+        getattr(instance, '_estado_rollup_anterior', None),
+        rollups.estado_rollup(instance),
+    )
+
+
+@receiver(post_delete, sender=Visitante)
+def descontar_rollup(sender, instance, **kwargs):
+    rollups.registrar_cambio(rollups.estado_rollup(instance), None)
+
+
+@receiver(post_delete, sender=Visitante)
+def registrar_borrado(sender, instance, **kwargs):
+    """Deja constancia de la baja para los clientes que sincronizan con /visitantes/changes/."""
+    VisitanteBorrado.objects.create(visitante_id=instance.pk)
@@ -0,0 +1,30 @@
+"""Ajustes de SQLite para cada conexión nueva (settings.SQLITE_PRAGMAS).
+
+Con el journal por defecto (DELETE) una escritura bloquea toda la base y
+los lectores del dashboard esperan a que termine. En modo WAL los lectores
+leen la última versión confirmada mientras alguien escribe; solo las
+escrituras se turnan entre sí. synchronous=NORMAL hace un fsync por
+checkpoint en lugar de uno por commit: un corte de luz puede perder los
+últimos commits, pero la base no se corrompe, y cerrar el proceso a la
+fuerza (taskkill) no pierde nada.
+
+journal_mode queda guardado en el archivo; los demás ajustes son de la
+conexión, por eso se aplican en connection_created. Con CONN_MAX_AGE las
+conexiones se reutilizan entre peticiones y esto corre una vez por hilo.
+"""
+from django.conf import settings
+
+
+def configurar_conexion(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {valor}')
+
+
+def checkpoint(connection):
+    """Vuelca el WAL al archivo principal (antes de copiar db.sqlite3)."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
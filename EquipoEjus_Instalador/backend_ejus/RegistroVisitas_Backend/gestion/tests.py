@@ -1,3 +1,1327 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import cambios, catalogo, documentos, eventos, exportacion, jobs, rollups, views, views_async
+from . import cache
+from .cache import catalogo_cache, reportes_archivos_cache
+from .contexto_reportes import ContextoReporte
+from .models import (
+    Municipio, Parroquia, Persona, ReporteJob, Visitante, VisitanteBorrado, VisitanteEvento,
+    VisitaRollupDiario,
+)
+from .Serializers import VisitanteSerializer
+from .reportes import PERIODO_SEMANA, medianoche_local, serie_por_periodo
+
+
+def recargar_catalogo():
+    """Vacía el catálogo en memoria (los ids de otras clases de tests ya no existen) y lo vuelve a cargar."""
+    catalogo_cache.clear()
+    catalogo.indice()
+
+
+class VisitanteListQueriesTest(TestCase):
+    """El listado de visitantes no debe hacer consultas por fila."""
+
+    @classmethod
+    def setUpTestData(cls):
+        personas = Persona.objects.bulk_create([
+            Persona(cedula=f'V{i:07d}', nombre=f'Persona {i}') for i in range(40)
+        ])
+        catalogo_cache.clear()
+        municipio, parroquia = catalogo.resolver('Iribarren', 'Catedral')
+        visitantes = []
+        for i in range(120):
+            persona = personas[i % 40] if i % 4 else None
+            visitantes.append(Visitante(
+                nombre=f'Visitante {i}',
+                cedula=persona.cedula if persona else f'S{i:07d}',
+                telefono='04141234567',
+                municipio=municipio,
+                parroquia=parroquia,
+                direccion='Centro',
+                tipo_visita='ASESORIA',
+                persona=persona,
+            ))
+        Visitante.objects.bulk_create(visitantes)
+
+    def setUp(self):
+        self.client = APIClient()
+        recargar_catalogo()
+
+    def test_pagina_de_100_con_consultas_constantes(self):
+        # COUNT de la paginación + página + conteo por persona + conteo por cédula
+        with self.assertNumQueries(4):
+            respuesta = self.client.get('/api/visitantes/', {'page_size': 100})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data['results']), 100)
+
+    def test_pagina_cursor_con_consultas_constantes(self):
+        with self.assertNumQueries(3):
+            respuesta = self.client.get('/api/visitantes/', {'cursor': '', 'page_size': 100})
+        self.assertEqual(len(respuesta.data['results']), 100)
+
+    def test_conteos_de_visitas(self):
+        respuesta = self.client.get('/api/visitantes/', {'page_size': 100})
+        for fila in respuesta.data['results']:
+            visitante = Visitante.objects.get(pk=fila['id'])
+            if visitante.persona_id:
+                esperado = Visitante.objects.filter(persona_id=visitante.persona_id).count()
+                self.assertEqual(fila['persona']['visit_count'], esperado)
+            else:
+                esperado = Visitante.objects.filter(cedula=visitante.cedula).count()
+                self.assertIsNone(fila['persona'])
+            self.assertEqual(fila['visit_count'], esperado)
+
+    def test_serializador_compartido_sin_estado(self):
+        serializer = VisitanteSerializer(Visitante.objects.all()[:10], many=True, context={'origen': 'test'})
+        primera = serializer.data
+        self.assertEqual(serializer.context, {'origen': 'test'})
+        self.assertFalse(hasattr(serializer.child, 'conteos_visitas'))
+        # Otro lote con el mismo hijo calcula sus propios conteos
+        otro = VisitanteSerializer(many=True).to_representation(Visitante.objects.order_by('-id')[:5])
+        self.assertEqual(len(otro), 5)
+        self.assertEqual(len(primera), 10)
+
+    def test_detalle_resuelve_conteo(self):
+        visitante = Visitante.objects.filter(persona__isnull=False).first()
+        # visitante + conteo de visitas + eventos
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(f'/api/visitantes/{visitante.pk}/')
+        self.assertEqual(respuesta.data['visit_count'],
+                         Visitante.objects.filter(persona_id=visitante.persona_id).count())
+
+
+class CatalogoNombreTest(TestCase):
+    """Un id que no está en el índice se busca solo y entra al índice al confirmar."""
+
+    def setUp(self):
+        recargar_catalogo()
+
+    def test_fila_nueva_se_consulta_sola(self):
+        municipio = Municipio.objects.create(nombre='Jiménez', clave='jimenez')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                self.assertEqual(catalogo.nombre_municipio(municipio.pk), 'Jiménez')
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogo.nombre_municipio(municipio.pk), 'Jiménez')
+        self.assertIs(catalogo.indice().municipio_por_clave['jimenez'], catalogo.indice().municipios[municipio.pk])
+
+    def test_transaccion_revertida_no_queda_en_el_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    municipio = Municipio.objects.create(nombre='Urdaneta', clave='urdaneta')
+                    parroquia = Parroquia.objects.create(municipio=municipio, nombre='Siquisique', clave='siquisique')
+                    self.assertEqual(catalogo.nombre_parroquia(parroquia.pk), 'Siquisique')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertNotIn(parroquia.pk, catalogo.indice().parroquias)
+        self.assertIsNone(catalogo.nombre_parroquia(parroquia.pk))
+
+
+class ReporteContextoQueriesTest(TestCase):
+    """Las exportaciones PDF/Excel resuelven todos sus agregados con un número fijo de consultas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ahora = timezone.now()
+        tipos = ['ASESORIA', 'CURATELA', 'TUTELA']
+        catalogo_cache.clear()
+        visitantes = []
+        for i in range(90):
+            municipio, parroquia = catalogo.resolver(['Iribarren', 'Palavecino', ''][i % 3],
+                                                     ['Catedral', 'Cabudare'][i % 2])
+            visitantes.append(Visitante(
+                nombre=f'Visitante {i}',
+                cedula=f'V{i:07d}',
+                telefono='04141234567',
+                municipio=municipio,
+                parroquia=parroquia,
+                direccion='Centro',
+                tipo_visita=tipos[i % 3],
+                atencion_completada=i % 4 == 0,
+                fecha_hora_ingreso=ahora - timedelta(days=i * 3, hours=i % 5),
+            ))
+        Visitante.objects.bulk_create(visitantes)
+        # bulk_create no emite señales
+        rollups.reconstruir()
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        recargar_catalogo()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        cache_en_tmp = mock.patch.object(reportes_archivos_cache, 'directorio', Path(directorio.name))
+        cache_en_tmp.start()
+        self.addCleanup(cache_en_tmp.stop)
+
+    def test_exportaciones_con_consultas_constantes(self):
+        # versión de datos de la caché (2) + rollup agrupado + parroquia más visitada
+        for url in ('/api/reportes/exportar/pdf/', '/api/reportes/exportar/excel/'):
+            cache.invalidar()
+            with self.subTest(url=url), self.assertNumQueries(4):
+                respuesta = self.client.get(url, {'periodo': 'mes'})
+            self.assertEqual(respuesta.status_code, 200)
+
+    def test_cache_de_archivo_por_usuario(self):
+        url = '/api/reportes/exportar/pdf/'
+        primera = self.client.get(url, {'periodo': 'mes'}, HTTP_X_USUARIO='ana')
+        self.assertEqual(primera['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url, {'periodo': 'mes'}, HTTP_X_USUARIO='ana')['X-Cache'], 'HIT')
+        # La portada lleva el nombre de quien lo generó: otro usuario no recibe esa copia
+        otra = self.client.get(url, {'periodo': 'mes'}, HTTP_X_USUARIO='luis')
+        self.assertEqual(otra['X-Cache'], 'MISS')
+        self.assertNotEqual(otra['ETag'], primera['ETag'])
+
+    def test_archivo_abierto_no_rompe_la_cache(self):
+        # En Windows no se puede reemplazar ni borrar un archivo que un FileResponse aún envía
+        url = '/api/reportes/exportar/excel/'
+        with mock.patch('gestion.cache.os.replace', side_effect=PermissionError):
+            respuesta = self.client.get(url, {'periodo': 'mes'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(reportes_archivos_cache.estadisticas()['entradas'], 0)
+        self.assertEqual(list(reportes_archivos_cache.directorio.iterdir()), [])
+
+        self.client.get(url, {'periodo': 'mes'})
+        with mock.patch.object(reportes_archivos_cache, 'max_bytes', 1), \
+                mock.patch.object(Path, 'unlink', side_effect=PermissionError):
+            reportes_archivos_cache.set('otra', b'x', {'content_type': 'text/plain'})
+        # El desalojo se omite y la entrada sigue sirviéndose
+        self.assertEqual(self.client.get(url, {'periodo': 'mes'})['X-Cache'], 'HIT')
+
+    def test_estadisticas_de_cache_solo_administradores(self):
+        self.client.get('/api/reportes/exportar/pdf/', {'periodo': 'mes'})
+        self.assertIn(self.client.get('/api/cache/').status_code, (401, 403))
+        self.assertEqual(self.client.get('/api/reportes/cache/').status_code, 404)
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        respuesta = self.client.get('/api/cache/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['reportes_archivos'], reportes_archivos_cache.estadisticas())
+        self.assertEqual(respuesta.data['reportes_archivos']['entradas'], 1)
+
+    def test_periodo_movil_suma_el_tramo_parcial(self):
+        # 'semana' empieza a media jornada: una consulta más sobre Visitante
+        with self.assertNumQueries(5):
+            self.client.get('/api/reportes/exportar/pdf/', {'periodo': 'semana'})
+
+    def test_estadisticas_json_con_consultas_constantes(self):
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/reportes/estadisticas/')
+        self.assertEqual(respuesta.data['total_visitas'], 90)
+
+    def test_estadisticas_en_cache_por_filtros(self):
+        self.client.get('/api/reportes/estadisticas/', {'municipio': 'Iribarren'})
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/reportes/estadisticas/', {'municipio': 'Iribarren', 'periodo': 'anio'})
+        self.assertEqual(respuesta.data['total_visitas'], 30)
+        # Otro filtro es otra entrada
+        with self.assertNumQueries(2):
+            self.client.get('/api/reportes/estadisticas/', {'municipio': 'Palavecino'})
+        # Una exportación reutiliza las estadísticas y solo consulta trámites y serie mensual
+        with self.assertNumQueries(3):
+            self.client.get('/api/reportes/exportar/pdf/', {'municipio': 'Iribarren'})
+
+    def test_escritura_invalida_estadisticas(self):
+        self.client.get('/api/reportes/estadisticas/')
+        visitante = Visitante.objects.first()
+        visitante.atencion_completada = not visitante.atencion_completada
+        visitante.save()
+        respuesta = self.client.get('/api/reportes/estadisticas/')
+        self.assertEqual(respuesta.data['visitas_completadas'],
+                         Visitante.objects.filter(atencion_completada=True).count())
+
+    def test_contexto_coincide_con_conteos(self):
+        params = QueryDict('periodo=trimestre&months=4')
+        contexto = ContextoReporte(params)
+
+        tramites = contexto.tramites()
+        esperado = rollups.conteos(params, desde=contexto.desde, campos=['tipo_visita'])
+        self.assertEqual(
+            {t['nombre']: (t['cantidad'], t['completados']) for t in tramites['datos']},
+            {t['tipo_visita']: (t['total'], t['completados']) for t in esperado},
+        )
+
+        estadisticas = contexto.estadisticas()
+        totales = rollups.conteos(params)
+        self.assertEqual(estadisticas['total_visitas'], totales['total'])
+        self.assertEqual(estadisticas['visitas_completadas'], totales['completados'])
+        self.assertEqual(estadisticas['primera_visita_fecha'],
+                         rollups.primera_fecha(params).strftime('%d/%m/%Y'))
+
+        mensuales = contexto.visitas_mensuales()['datos']
+        self.assertEqual(len(mensuales), 4)
+        inicio = timezone.localdate().replace(day=1)
+        self.assertEqual(mensuales[-1]['total_visitas'],
+                         rollups.conteos(params, desde=medianoche_local(inicio))['total'])
+
+
+class EjecutorEnLinea:
+    """Sustituye al pool de jobs: ejecuta el trabajo en el mismo hilo al enviarlo."""
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class ReporteJobsTest(TestCase):
+    """Ciclo de vida de los jobs de reportes: encolar, generar, errores, reinicio, limpieza y descarga."""
+
+    @classmethod
+    def setUpTestData(cls):
+        catalogo_cache.clear()
+        municipio, parroquia = catalogo.resolver('Iribarren', 'Catedral')
+        Visitante.objects.bulk_create([
+            Visitante(nombre=f'Visitante {i}', cedula=f'V{i:07d}', telefono='04141234567',
+                      municipio=municipio, parroquia=parroquia, direccion='Centro',
+                      tipo_visita='ASESORIA', fecha_hora_ingreso=timezone.now() - timedelta(days=i))
+            for i in range(5)
+        ])
+        rollups.reconstruir()
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        recargar_catalogo()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        ajustes = self.settings(REPORTES_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        en_linea = mock.patch.object(jobs, '_executor', EjecutorEnLinea())
+        en_linea.start()
+        self.addCleanup(en_linea.stop)
+
+    def encolar(self, tipo='pdf', usuario='ana'):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/api/reportes/jobs/', {'tipo': tipo, 'parametros': {'periodo': 'mes'}},
+                                         format='json', HTTP_X_USUARIO=usuario)
+        self.assertEqual(respuesta.status_code, 202)
+        return ReporteJob.objects.get(pk=respuesta.data['id'])
+
+    def test_encolar_y_descargar(self):
+        for tipo, content_type in (('pdf', documentos.CONTENT_TYPE_PDF), ('excel', documentos.CONTENT_TYPE_EXCEL)):
+            with self.subTest(tipo=tipo):
+                job = self.encolar(tipo)
+                self.assertEqual(job.estado, ReporteJob.COMPLETADO)
+                self.assertEqual(job.solicitado_por, 'ana')
+                self.assertEqual(job.content_type, content_type)
+                self.assertEqual(Path(job.archivo).parent, self.directorio)
+
+                detalle = self.client.get(f'/api/reportes/jobs/{job.pk}/', HTTP_X_USUARIO='ana')
+                self.assertEqual(detalle.data['estado'], ReporteJob.COMPLETADO)
+                self.assertTrue(detalle.data['url_descarga'])
+
+                descarga = self.client.get(f'/api/reportes/jobs/{job.pk}/descargar/', HTTP_X_USUARIO='ana')
+                self.assertEqual(descarga.status_code, 200)
+                self.assertEqual(b''.join(descarga.streaming_content), Path(job.archivo).read_bytes())
+                self.assertIn(job.nombre_archivo, descarga['Content-Disposition'])
+
+    def test_mismo_documento_que_la_vista(self):
+        job = self.encolar('excel')
+        vista = self.client.get('/api/reportes/exportar/excel/', {'periodo': 'mes'}, HTTP_X_USUARIO='ana')
+        self.assertEqual(vista['Content-Type'], job.content_type)
+        self.assertIn(job.nombre_archivo, vista['Content-Disposition'])
+
+    def test_error_al_generar(self):
+        fallido = mock.Mock(side_effect=RuntimeError('sin datos'))
+        with mock.patch.dict(documentos.GENERADORES, {'pdf': fallido}), self.assertLogs('gestion.jobs', 'ERROR'):
+            job = self.encolar('pdf')
+        fallido.assert_called_once_with({'periodo': 'mes'}, 'ana')
+        self.assertEqual(job.estado, ReporteJob.ERROR)
+        self.assertEqual(job.error, 'sin datos')
+        self.assertIsNotNone(job.finalizado_en)
+        self.assertEqual(list(self.directorio.iterdir()), [])
+        # Un job con error tampoco se descarga
+        respuesta = self.client.get(f'/api/reportes/jobs/{job.pk}/descargar/', HTTP_X_USUARIO='ana')
+        self.assertEqual(respuesta.status_code, 409)
+
+    def test_reinicio_marca_interrumpidos(self):
+        pendiente = ReporteJob.objects.create(tipo='pdf')
+        en_proceso = ReporteJob.objects.create(tipo='excel', estado=ReporteJob.EN_PROCESO)
+        completado = ReporteJob.objects.create(tipo='pdf', estado=ReporteJob.COMPLETADO)
+        # Primer uso del pool en un proceso nuevo
+        with mock.patch.object(jobs, '_executor', None), \
+                mock.patch.object(jobs, 'ThreadPoolExecutor') as pool:
+            self.assertIs(jobs._obtener_executor(), pool.return_value)
+            # Las siguientes llamadas reutilizan el pool sin volver a marcar nada
+            ReporteJob.objects.create(tipo='pdf')
+            jobs._obtener_executor()
+        pool.assert_called_once()
+
+        for job in (pendiente, en_proceso):
+            job.refresh_from_db()
+            self.assertEqual(job.estado, ReporteJob.ERROR)
+            self.assertIn('reinicio', job.error)
+        completado.refresh_from_db()
+        self.assertEqual(completado.estado, ReporteJob.COMPLETADO)
+        self.assertEqual(ReporteJob.objects.filter(estado=ReporteJob.PENDIENTE).count(), 1)
+
+    def test_limpiar_por_retencion(self):
+        viejo = self.encolar('pdf')
+        reciente = self.encolar('excel')
+        pendiente = ReporteJob.objects.create(tipo='pdf')
+        ReporteJob.objects.filter(pk=viejo.pk).update(finalizado_en=timezone.now() - timedelta(hours=25))
+
+        with self.settings(REPORTES_RETENCION_HORAS=24):
+            self.assertEqual(jobs.limpiar(), 1)
+        self.assertFalse(Path(viejo.archivo).exists())
+        self.assertTrue(Path(reciente.archivo).exists())
+        self.assertEqual(set(ReporteJob.objects.values_list('pk', flat=True)), {reciente.pk, pendiente.pk})
+        # Sin finalizado_en (aún pendiente) nunca se borra
+        self.assertEqual(jobs.limpiar(horas=0), 1)
+        self.assertEqual(list(ReporteJob.objects.values_list('pk', flat=True)), [pendiente.pk])
+
+    def test_descarga_no_encontrado_y_no_listo(self):
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{uuid.uuid4()}/descargar/').status_code, 404)
+        pendiente = ReporteJob.objects.create(tipo='pdf', solicitado_por='ana')
+        respuesta = self.client.get(f'/api/reportes/jobs/{pendiente.pk}/descargar/', HTTP_X_USUARIO='ana')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.data['estado'], ReporteJob.PENDIENTE)
+
+        job = self.encolar('pdf')
+        Path(job.archivo).unlink()
+        respuesta = self.client.get(f'/api/reportes/jobs/{job.pk}/descargar/', HTTP_X_USUARIO='ana')
+        self.assertEqual(respuesta.status_code, 410)
+
+    def test_jobs_de_otro_usuario(self):
+        de_ana = self.encolar('pdf', 'ana')
+        de_luis = self.encolar('excel', 'luis')
+
+        listado = self.client.get('/api/reportes/jobs/', HTTP_X_USUARIO='ana')
+        self.assertEqual([j['id'] for j in listado.data], [str(de_ana.pk)])
+        # Sin usuario no se ve ninguno
+        self.assertEqual(self.client.get('/api/reportes/jobs/').data, [])
+        for url in (f'/api/reportes/jobs/{de_luis.pk}/', f'/api/reportes/jobs/{de_luis.pk}/descargar/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_X_USUARIO='ana').status_code, 404)
+
+        # Los administradores ven todos
+        admin = User.objects.create_user('admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        listado = self.client.get('/api/reportes/jobs/')
+        self.assertEqual({j['id'] for j in listado.data}, {str(de_ana.pk), str(de_luis.pk)})
+        self.assertEqual(self.client.get(f'/api/reportes/jobs/{de_luis.pk}/descargar/').status_code, 200)
+
+
+class EstadisticasReferidosTest(TestCase):
+    """Forma, valores y consultas de /api/estadisticas/referidos/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ahora = timezone.now()
+        instituciones = ['NO_REFERIDO', 'MINISTERIO_PUBLICO', 'PREFECTURA', 'MINISTERIO_PUBLICO', 'JUECES_DE_PAZ']
+        catalogo_cache.clear()
+        municipio, parroquia = catalogo.resolver('Iribarren', 'Catedral')
+        Visitante.objects.bulk_create([
+            Visitante(
+                nombre=f'Visitante {i}',
+                cedula=f'V{i:07d}',
+                telefono='04141234567',
+                municipio=municipio,
+                parroquia=parroquia,
+                direccion='Centro',
+                tipo_visita='ASESORIA',
+                referir_a=instituciones[i % len(instituciones)],
+                # Horas escalonadas para que algunas caigan en el tramo parcial de la ventana de 7 días
+                fecha_hora_ingreso=ahora - timedelta(days=i, hours=i * 7 % 24),
+            )
+            for i in range(60)
+        ])
+        rollups.reconstruir()
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        recargar_catalogo()
+
+    def contar(self, desde=None):
+        visitantes = Visitante.objects.all()
+        if desde is not None:
+            visitantes = visitantes.filter(fecha_hora_ingreso__gte=desde)
+        return visitantes.count(), visitantes.exclude(referir_a='NO_REFERIDO').count()
+
+    def test_forma_y_valores(self):
+        # rollup agrupado por institución + tramo parcial de la semana
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/estadisticas/referidos/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(set(respuesta.data), {'success', 'estadisticas', 'periodo_actual'})
+        estadisticas = respuesta.data['estadisticas']
+        self.assertEqual(set(estadisticas),
+                         {'hoy', 'semana', 'mes', 'total_general', 'instituciones_top'})
+
+        ahora = timezone.localtime()
+        ventanas = {
+            'hoy': ahora.replace(hour=0, minute=0, second=0, microsecond=0),
+            'semana': ahora - timedelta(days=7),
+            'mes': ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+        }
+        for nombre, desde in ventanas.items():
+            total, referidos = self.contar(desde)
+            self.assertEqual(set(estadisticas[nombre]), {'referidos', 'total', 'porcentaje'})
+            self.assertEqual((estadisticas[nombre]['total'], estadisticas[nombre]['referidos']),
+                             (total, referidos), nombre)
+        self.assertEqual(estadisticas['total_general'], self.contar()[1])
+
+        top = estadisticas['instituciones_top']
+        self.assertEqual(top[0], {'institucion': 'Ministerio Público', 'total': 24, 'codigo': 'MINISTERIO_PUBLICO'})
+        self.assertEqual({i['codigo'] for i in top}, {'MINISTERIO_PUBLICO', 'PREFECTURA', 'JUECES_DE_PAZ'})
+
+    def test_cache_e_invalidacion(self):
+        self.client.get('/api/estadisticas/referidos/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/estadisticas/referidos/')
+
+        visitante = Visitante.objects.filter(referir_a='NO_REFERIDO').first()
+        visitante.referir_a = 'PREFECTURA'
+        visitante.save()
+        respuesta = self.client.get('/api/estadisticas/referidos/')
+        self.assertEqual(respuesta.data['estadisticas']['total_general'], self.contar()[1])
+
+
+class ReporteReferidosTest(TestCase):
+    """Forma, valores y consultas de /api/reportes/referidos/."""
+
+    AHORA = datetime(2026, 3, 20, 15, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        # (referir_a, tipo_visita, otra_institucion, cantidad) dentro de marzo
+        grupos = [
+            ('MINISTERIO_PUBLICO', 'ASESORIA', None, 5),
+            ('MINISTERIO_PUBLICO', 'CURATELA', None, 3),
+            ('MINISTERIO_PUBLICO', 'TUTELA', None, 2),
+            ('MINISTERIO_PUBLICO', 'CARTA_SOLTERIA', None, 1),
+            ('PREFECTURA', 'ASESORIA', None, 4),
+            ('OTRA_INSTITUCION', 'TUTELA', 'Fiscalía', 3),
+            ('OTRA_INSTITUCION', 'TUTELA', 'Consejo Comunal', 2),
+            ('OTRA_INSTITUCION', 'TUTELA', None, 1),
+            ('NO_REFERIDO', 'ASESORIA', None, 9),
+        ]
+        filas = [(r, t, o) for r, t, o, cantidad in grupos for _ in range(cantidad)]
+        inicio = datetime(2026, 3, 1, 0, 30, tzinfo=dt_timezone.utc)
+        visitantes = [
+            Visitante(nombre=f'V{i}', cedula=f'V{i:07d}', referir_a=r, tipo_visita=t, otra_institucion=o,
+                      fecha_hora_ingreso=inicio + timedelta(hours=13 * i))
+            for i, (r, t, o) in enumerate(filas)
+        ]
+        # Febrero queda fuera del periodo 'mes', también para la consulta de otra_institucion
+        visitantes += [
+            Visitante(nombre=f'F{i}', cedula=f'F{i:07d}', referir_a='OTRA_INSTITUCION', otra_institucion='Registro',
+                      fecha_hora_ingreso=datetime(2026, 2, 10 + i, 12, 0, tzinfo=dt_timezone.utc))
+            for i in range(4)
+        ]
+        Visitante.objects.bulk_create(visitantes)
+        rollups.reconstruir()
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        reloj = mock.patch('django.utils.timezone.now', return_value=self.AHORA)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+
+    def test_forma_y_valores(self):
+        # rollup agrupado por (institución, trámite) + otra_institucion sobre Visitante
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/reportes/referidos/')
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.data
+        self.assertEqual(set(datos), {'success', 'periodo', 'total_visitantes', 'total_referidos',
+                                      'porcentaje_referidos', 'instituciones', 'metadata'})
+        self.assertEqual((datos['periodo'], datos['total_visitantes'], datos['total_referidos']), ('mes', 30, 21))
+        self.assertEqual(datos['porcentaje_referidos'], 70.0)
+        self.assertEqual(datos['metadata']['fecha_inicio'], '2026-03-01 00:00:00')
+        self.assertEqual(datos['metadata']['periodo_seleccionado'], 'mes')
+
+        self.assertEqual(datos['instituciones'], [
+            {'institucion': 'Ministerio Público', 'codigo_institucion': 'MINISTERIO_PUBLICO', 'total_referidos': 11,
+             'porcentaje': 52.38, 'tramites_comunes': ['Asesoría', 'Curatela', 'Tutela']},
+            {'institucion': 'Otras Instituciones', 'codigo_institucion': 'OTRA_INSTITUCION', 'total_referidos': 6,
+             'porcentaje': 28.57, 'tramites_comunes': ['Fiscalía', 'Consejo Comunal']},
+            {'institucion': 'Prefectura', 'codigo_institucion': 'PREFECTURA', 'total_referidos': 4,
+             'porcentaje': 19.05, 'tramites_comunes': ['Asesoría']},
+        ])
+
+    def test_filtros_y_ventana_movil(self):
+        # Sin OTRA_INSTITUCION entre los resultados no hace falta la segunda consulta
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/reportes/referidos/', {'tipo_visita': 'ASESORIA'})
+        self.assertEqual((respuesta.data['total_visitantes'], respuesta.data['total_referidos']), (18, 9))
+        self.assertEqual([(i['codigo_institucion'], i['total_referidos']) for i in respuesta.data['instituciones']],
+                         [('MINISTERIO_PUBLICO', 5), ('PREFECTURA', 4)])
+
+        # 'semana' empieza a media jornada: una consulta más para el tramo parcial
+        # (en esos siete días nadie fue referido a OTRA_INSTITUCION)
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/reportes/referidos/', {'periodo': 'semana'})
+        visitantes = Visitante.objects.filter(fecha_hora_ingreso__gte=self.AHORA - timedelta(days=7))
+        self.assertEqual(respuesta.data['total_visitantes'], visitantes.count())
+        self.assertEqual(respuesta.data['total_referidos'], visitantes.exclude(referir_a='NO_REFERIDO').count())
+
+    def test_cache(self):
+        self.client.get('/api/reportes/referidos/')
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/reportes/referidos/')
+        self.assertEqual(respuesta.data['total_referidos'], 21)
+
+
+class SeriePorPeriodoTest(TestCase):
+    """Meses y semanas de serie_por_periodo() contra un conteo directo, con el cambio de año dentro de la ventana."""
+
+    # Miércoles: la semana actual empieza el lunes 12 de enero
+    AHORA = datetime(2026, 1, 14, 15, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        tipos = ['ASESORIA', 'CURATELA']
+        inicio = datetime(2025, 9, 20, 0, 30, tzinfo=dt_timezone.utc)
+        # Una visita cada 17 horas: caen a todas las horas, también junto a la medianoche
+        Visitante.objects.bulk_create([
+            Visitante(nombre=f'V{i}', cedula=f'V{i:07d}', tipo_visita=tipos[i % 2],
+                      atencion_completada=i % 3 == 0, fecha_hora_ingreso=inicio + timedelta(hours=17 * i))
+            for i in range(164)
+        ] + [
+            Visitante(nombre='Fin de año', cedula='V9000001', fecha_hora_ingreso=datetime(2025, 12, 31, 23, 59, tzinfo=dt_timezone.utc)),
+            Visitante(nombre='Año nuevo', cedula='V9000002', fecha_hora_ingreso=datetime(2026, 1, 1, 0, 0, tzinfo=dt_timezone.utc)),
+        ])
+        rollups.reconstruir()
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        reloj = mock.patch('django.utils.timezone.now', return_value=self.AHORA)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+
+    def contar(self, inicio, fin, **filtros):
+        visitantes = Visitante.objects.filter(
+            fecha_hora_ingreso__gte=medianoche_local(inicio), fecha_hora_ingreso__lt=medianoche_local(fin), **filtros
+        )
+        return visitantes.count(), visitantes.filter(atencion_completada=True).count()
+
+    def test_meses(self):
+        respuesta = self.client.get('/api/reportes/visitas-mensuales/', {'months': 4})
+        self.assertEqual([(m['anio'], m['mes_numero']) for m in respuesta.data['datos']],
+                         [(2025, 10), (2025, 11), (2025, 12), (2026, 1)])
+        limites = [date(2025, 10, 1), date(2025, 11, 1), date(2025, 12, 1), date(2026, 1, 1), date(2026, 2, 1)]
+        for mes, inicio, fin in zip(respuesta.data['datos'], limites, limites[1:]):
+            with self.subTest(inicio=inicio):
+                self.assertEqual((mes['total_visitas'], mes['completados']), self.contar(inicio, fin))
+
+    def test_semanas(self):
+        respuesta = self.client.get('/api/reportes/tendencia-semanal/', {'weeks': 4, 'tipo_visita': 'ASESORIA'})
+        lunes = [date(2025, 12, 22), date(2025, 12, 29), date(2026, 1, 5), date(2026, 1, 12)]
+        self.assertEqual([(s['fecha_inicio'], s['fecha_fin']) for s in respuesta.data['datos']],
+                         [('22/12', '29/12'), ('29/12', '05/01'), ('05/01', '12/01'), ('12/01', '19/01')])
+        for semana, inicio in zip(respuesta.data['datos'], lunes):
+            with self.subTest(inicio=inicio):
+                self.assertEqual((semana['total_visitas'], semana['completados']),
+                                 self.contar(inicio, inicio + timedelta(days=7), tipo_visita='ASESORIA'))
+
+    def test_serie_sin_filtros_cruza_el_anio(self):
+        serie = serie_por_periodo(QueryDict(), PERIODO_SEMANA, 3)
+        self.assertEqual([p['inicio'] for p in serie], [date(2025, 12, 29), date(2026, 1, 5), date(2026, 1, 12)])
+        for periodo in serie:
+            self.assertEqual((periodo['total'], periodo['completados']), self.contar(periodo['inicio'], periodo['fin']))
+        # La semana del cambio de año incluye las visitas de ambos lados de la medianoche
+        self.assertGreaterEqual(serie[0]['total'], 2)
+
+
+class ExportarVisitantesTest(TestCase):
+    """GET /api/reportes/exportar/visitantes/ en CSV (streaming) y XLSX."""
+
+    url = '/api/reportes/exportar/visitantes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        ahora = timezone.now()
+        catalogo_cache.clear()
+        ubicaciones = [catalogo.resolver('Iribarren', 'Catedral'), catalogo.resolver('Palavecino', 'Cabudare')]
+        Visitante.objects.bulk_create([
+            Visitante(
+                nombre=f'Visitante {i}', cedula=f'V{i:07d}', telefono='04141234567',
+                municipio=ubicaciones[i % 2][0], parroquia=ubicaciones[i % 2][1],
+                tipo_visita=['ASESORIA', 'CURATELA', 'TUTELA'][i % 3],
+                referir_a='PREFECTURA' if i % 4 == 0 else 'NO_REFERIDO',
+                atencion_completada=i % 5 == 0,
+                fecha_hora_ingreso=ahora - timedelta(days=i // 3, hours=i % 3),
+            )
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        recargar_catalogo()
+
+    def csv(self, **params):
+        respuesta = self.client.get(self.url, {'formato': 'csv', **params})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return respuesta, b''.join(respuesta.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        with mock.patch('gestion.exportacion.TAMANO_LOTE', 7):
+            respuesta, texto = self.csv()
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="visitantes_', respuesta['Content-Disposition'])
+        # BOM para Excel, encabezado y una línea por visitante
+        self.assertTrue(texto.startswith('\ufeff'))
+        filas = list(csv.reader(io.StringIO(texto[1:])))
+        self.assertEqual(filas[0], exportacion.ENCABEZADOS)
+        self.assertEqual(len(filas) - 1, 30)
+        primera = Visitante.objects.order_by('-fecha_hora_ingreso', '-id').first()
+        self.assertEqual(filas[1][:5], [primera.cedula, primera.nombre, primera.telefono,
+                                        catalogo.nombre_municipio(primera.municipio_id),
+                                        catalogo.nombre_parroquia(primera.parroquia_id)])
+
+    def test_csv_con_los_filtros_del_listado(self):
+        filtros = {'tipo_visita': 'ASESORIA', 'municipio': 'iribarren', 'referido': '1'}
+        listado = self.client.get('/api/visitantes/', {**filtros, 'page_size': 100}).data['results']
+        _, texto = self.csv(**filtros)
+        cedulas = [fila[0] for fila in csv.reader(io.StringIO(texto[1:]))][1:]
+        self.assertEqual(cedulas, [fila['cedula'] for fila in listado])
+        self.assertTrue(cedulas)
+
+    def test_rango_de_fechas(self):
+        hoy = timezone.localdate()
+        _, texto = self.csv(desde=hoy.isoformat(), hasta=hoy.isoformat())
+        esperado = Visitante.objects.filter(fecha_hora_ingreso__gte=medianoche_local(hoy)).count()
+        self.assertEqual(len(texto.splitlines()) - 1, esperado)
+        for params in ({'desde': '2026-13-01'}, {'hasta': 'ayer'}, {'formato': 'pdf'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_consultas_constantes(self):
+        # Una sola consulta para todas las filas; los nombres salen del catálogo en memoria
+        respuesta = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            b''.join(respuesta.streaming_content)
+
+    def test_xlsx_divide_en_hojas(self):
+        with mock.patch('gestion.exportacion.MAX_FILAS_HOJA', 12):
+            respuesta = self.client.get(self.url, {'formato': 'xlsx'})
+        self.assertEqual(respuesta.status_code, 200)
+        libro = openpyxl.load_workbook(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(libro.sheetnames, ['Visitantes', 'Visitantes 2', 'Visitantes 3'])
+        hojas = [list(libro[nombre].values) for nombre in libro.sheetnames]
+        for hoja in hojas:
+            self.assertEqual(list(hoja[0]), exportacion.ENCABEZADOS)
+        self.assertEqual([len(hoja) - 1 for hoja in hojas], [12, 12, 6])
+        cedulas = [fila[0] for hoja in hojas for fila in hoja[1:]]
+        self.assertEqual(cedulas, list(Visitante.objects.order_by('-fecha_hora_ingreso', '-id')
+                                       .values_list('cedula', flat=True)))
+
+    def test_xlsx_vacio(self):
+        respuesta = self.client.get(self.url, {'formato': 'xlsx', 'tipo_visita': 'OTRO'})
+        libro = openpyxl.load_workbook(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual([list(fila) for fila in libro['Visitantes'].values], [exportacion.ENCABEZADOS])
+
+
+class ReporteDiarioTest(TestCase):
+    """El parámetro days de /api/reportes/diario/ se acota a [1, 366]."""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+
+    def test_dias_acotados(self):
+        for dias, esperado in (('100000000', 366), ('-5', 1), ('0', 1), ('x', 14), ('7', 7)):
+            with self.subTest(days=dias):
+                respuesta = self.client.get('/api/reportes/diario/', {'days': dias})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.data['dias'], esperado)
+                self.assertEqual(len(respuesta.data['datos']), esperado)
+
+
+def filas_rollup():
+    """Filas del rollup con algún conteo, comparables entre sí."""
+    return sorted(
+        VisitaRollupDiario.objects.exclude(total=0, completados=0, referidos=0).values_list(
+            'fecha', 'municipio_id', 'tipo_visita', 'referir_a', 'total', 'completados', 'referidos',
+        )
+    )
+
+
+class RollupAssertsMixin:
+    def assertRollupReconstruido(self):
+        """El rollup mantenido por señales o registrar_cambios() es el que daría reconstruir()."""
+        incremental = filas_rollup()
+        rollups.reconstruir()
+        self.assertEqual(incremental, filas_rollup())
+
+
+class RollupSenalesTest(RollupAssertsMixin, TestCase):
+    """Las señales de Visitante mantienen el rollup igual a lo que calcularía reconstruir()."""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        recargar_catalogo()
+        respuesta = self.client.post('/api/visitantes/', {
+            'nombre': 'Ana Pérez', 'cedula': 'V1234567', 'municipio': 'Iribarren', 'parroquia': 'Catedral',
+            'tipo_visita': 'ASESORIA', 'referir_a': 'NO_REFERIDO',
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.pk = respuesta.data['id']
+
+    def test_alta(self):
+        self.assertEqual(filas_rollup()[0][4:], (1, 0, 0))
+        self.assertRollupReconstruido()
+
+    def test_edicion_parcial_de_la_clave(self):
+        for cambio in ({'tipo_visita': 'CURATELA'}, {'municipio': 'Palavecino', 'parroquia': 'Cabudare'},
+                       {'referir_a': 'PREFECTURA'}):
+            with self.subTest(cambio=cambio):
+                respuesta = self.client.patch(f'/api/visitantes/{self.pk}/', cambio, format='json')
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertRollupReconstruido()
+
+    def test_edicion_completa(self):
+        respuesta = self.client.put(f'/api/visitantes/{self.pk}/', {
+            'nombre': 'Ana Pérez', 'cedula': 'V1234567', 'municipio': 'Palavecino', 'parroquia': '',
+            'tipo_visita': 'TUTELA', 'referir_a': 'MINISTERIO_PUBLICO',
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertRollupReconstruido()
+
+    def test_salida(self):
+        self.client.post(f'/api/visitantes/{self.pk}/registrar-salida/')
+        self.assertEqual(filas_rollup()[0][4:], (1, 1, 0))
+        self.assertRollupReconstruido()
+
+    def test_borrado(self):
+        self.assertEqual(self.client.delete(f'/api/visitantes/{self.pk}/').status_code, 204)
+        self.assertEqual(filas_rollup(), [])
+        self.assertRollupReconstruido()
+
+
+class BusquedaFTSTest(TestCase):
+    """?search= del listado usa el índice FTS5 (busqueda.py) con prefijos y sin acentos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        catalogo_cache.clear()
+        iribarren = catalogo.resolver('Iribarren', 'Catedral')
+        palavecino = catalogo.resolver('Palavecino', 'Cabudare')
+        for nombre, cedula, (municipio, parroquia) in (
+            ('José Pérez', 'V11111111', iribarren),
+            ('María Gómez', 'V22222222', palavecino),
+            ('Pedro Jiménez', 'V33333333', palavecino),
+        ):
+            Visitante.objects.create(nombre=nombre, cedula=cedula, telefono='04141234567',
+                                     municipio=municipio, parroquia=parroquia)
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.invalidar()
+        recargar_catalogo()
+
+    def buscar(self, texto):
+        respuesta = self.client.get('/api/visitantes/', {'search': texto})
+        self.assertEqual(respuesta.status_code, 200)
+        return sorted(fila['nombre'] for fila in respuesta.data['results'])
+
+    def test_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self.buscar('pérez'), ['José Pérez'])
+        self.assertEqual(self.buscar('jose'), ['José Pérez'])
+        self.assertEqual(self.buscar('JIMENEZ'), ['Pedro Jiménez'])
+
+    def test_prefijos_unidos_con_and(self):
+        self.assertEqual(self.buscar('ma go'), ['María Gómez'])
+        self.assertEqual(self.buscar('V3333'), ['Pedro Jiménez'])
+        self.assertEqual(self.buscar('pedro gomez'), [])
+
+    def test_solo_prefijos(self):
+        # A diferencia del icontains anterior, un fragmento del medio de una palabra no coincide
+        self.assertEqual(self.buscar('ribarren'), [])
+        self.assertEqual(self.buscar('iribar'), ['José Pérez'])
+
+    def test_municipio_y_parroquia_del_catalogo(self):
+        self.assertEqual(self.buscar('palavecino'), ['María Gómez', 'Pedro Jiménez'])
+        self.assertEqual(self.buscar('catedral'), ['José Pérez'])
+
+    def test_renombrar_catalogo_reindexa(self):
+        Municipio.objects.filter(nombre='Palavecino').update(nombre='Palavecino Este')
+        Parroquia.objects.filter(nombre='Catedral').update(nombre='Catedral Vieja')
+        self.assertEqual(self.buscar('este'), ['María Gómez', 'Pedro Jiménez'])
+        self.assertEqual(self.buscar('vieja'), ['José Pérez'])
+
+    def test_edicion_reindexa(self):
+        visitante = Visitante.objects.get(nombre='José Pérez')
+        visitante.nombre = 'José Rodríguez'
+        visitante.save()
+        self.assertEqual(self.buscar('perez'), [])
+        self.assertEqual(self.buscar('rodriguez'), ['José Rodríguez'])
+
+    def test_sintaxis_fts_no_falla(self):
+        for texto in ('"', 'NEAR(', '***', 'jose"', 'AND OR NOT', '(', '-', '^jose', 'col:jose'):
+            with self.subTest(texto=texto):
+                self.buscar(texto)
+        self.assertEqual(self.buscar('"jose"'), ['José Pérez'])
+
+
+class PaginacionCursorTest(TestCase):
+    """Modo cursor del listado: páginas contiguas aunque haya empates en fecha_hora_ingreso."""
+
+    @classmethod
+    def setUpTestData(cls):
+        base = timezone.now().replace(microsecond=0)
+        # 5 grupos de 5 visitantes con la misma fecha de ingreso
+        Visitante.objects.bulk_create([
+            Visitante(nombre=f'Visitante {i}', cedula=f'V{i:07d}', fecha_hora_ingreso=base - timedelta(minutes=i // 5))
+            for i in range(25)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_paginas_contiguas_con_empates(self):
+        esperado = list(Visitante.objects.order_by('-fecha_hora_ingreso', '-id').values_list('id', flat=True))
+        vistos, paginas = [], 0
+        respuesta = self.client.get('/api/visitantes/', {'cursor': '', 'page_size': 4})
+        while True:
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertNotIn('count', respuesta.data)
+            vistos.extend(fila['id'] for fila in respuesta.data['results'])
+            paginas += 1
+            if respuesta.data['next'] is None:
+                break
+            respuesta = self.client.get(respuesta.data['next'])
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(paginas, 7)
+
+    def test_total_opcional(self):
+        respuesta = self.client.get('/api/visitantes/', {'cursor': '', 'count': 'true'})
+        self.assertEqual(respuesta.data['count'], 25)
+
+    def test_cursor_invalido(self):
+        for cursor in ('no-es-base64!', 'YWJj', 'MjAyNi0wMS0wMXx4'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/visitantes/', {'cursor': cursor}).status_code, 404)
+
+
+class BitacoraEventosTest(TestCase):
+    """Alta, edición y salida dejan un VisitanteEvento con el usuario de la petición."""
+
+    def setUp(self):
+        self.client = APIClient(HTTP_X_USUARIO='recepcion')
+
+    def test_eventos_de_alta_edicion_y_salida(self):
+        respuesta = self.client.post('/api/visitantes/', {
+            'nombre': 'Ana Pérez', 'cedula': 'V1234567', 'tipo_visita': 'ASESORIA',
+        }, format='json')
+        pk = respuesta.data['id']
+        self.assertEqual([e['accion'] for e in respuesta.data['eventos']], [VisitanteEvento.CREADO])
+
+        self.client.patch(f'/api/visitantes/{pk}/', {'observaciones': 'Trae documentos'}, format='json')
+        self.client.post(f'/api/visitantes/{pk}/registrar-salida/')
+
+        eventos = list(VisitanteEvento.objects.filter(visitante_id=pk).values_list('accion', 'usuario'))
+        self.assertEqual(eventos, [
+            (VisitanteEvento.CREADO, 'recepcion'),
+            (VisitanteEvento.ACTUALIZADO, 'recepcion'),
+            (VisitanteEvento.SALIDA, 'recepcion'),
+        ])
+        visitante = Visitante.objects.get(pk=pk)
+        self.assertEqual(VisitanteEvento.objects.get(visitante_id=pk, accion=VisitanteEvento.SALIDA).fecha,
+                         visitante.fecha_hora_salida)
+
+        detalle = self.client.get(f'/api/visitantes/{pk}/')
+        self.assertEqual([e['accion'] for e in detalle.data['eventos']],
+                         [VisitanteEvento.CREADO, VisitanteEvento.ACTUALIZADO, VisitanteEvento.SALIDA])
+
+    def test_edicion_invalida_no_deja_evento(self):
+        pk = self.client.post('/api/visitantes/', {'nombre': 'Ana', 'cedula': 'V1234567'}, format='json').data['id']
+        respuesta = self.client.patch(f'/api/visitantes/{pk}/', {'cedula': '1'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(VisitanteEvento.objects.filter(visitante_id=pk).count(), 1)
+
+
+class OperacionesLoteTest(RollupAssertsMixin, TestCase):
+    """POST /api/visitantes/bulk/ y /api/visitantes/bulk-salida/."""
+
+    def setUp(self):
+        self.client = APIClient(HTTP_X_USUARIO='recepcion')
+        cache.invalidar()
+        recargar_catalogo()
+
+    def item(self, i, **extra):
+        return {'nombre': f'Visitante {i}', 'cedula': f'V{i:07d}', 'municipio': 'Iribarren',
+                'parroquia': 'Catedral', 'tipo_visita': 'ASESORIA', **extra}
+
+    def test_alta_en_lote(self):
+        respuesta = self.client.post('/api/visitantes/bulk/', [self.item(i) for i in range(3)], format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['creados'], 3)
+        self.assertEqual(Visitante.objects.count(), 3)
+        self.assertEqual(VisitanteEvento.objects.filter(accion=VisitanteEvento.CREADO, usuario='recepcion').count(), 3)
+        self.assertEqual(filas_rollup()[0][4:], (3, 0, 0))
+        self.assertRollupReconstruido()
+
+    def test_alta_en_lote_todo_o_nada(self):
+        lote = [self.item(1, municipio='Urdaneta', parroquia='Siquisique'), self.item(2, cedula='1')]
+        respuesta = self.client.post('/api/visitantes/bulk/', lote, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([r['ok'] for r in respuesta.data['resultados']], [True, False])
+        self.assertIn('cedula', respuesta.data['resultados'][1]['errores'])
+        self.assertEqual(Visitante.objects.count(), 0)
+        self.assertEqual(filas_rollup(), [])
+        # La validación no crea entradas del catálogo
+        self.assertFalse(Municipio.objects.exists())
+        self.assertFalse(Parroquia.objects.exists())
+
+    def test_alta_y_edicion_resuelven_catalogo_al_guardar(self):
+        respuesta = self.client.post('/api/visitantes/', self.item(1, municipio=' urdaneta '), format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['municipio'], 'urdaneta')
+        # Edición parcial: la parroquia nueva se crea dentro del municipio actual
+        pk = respuesta.data['id']
+        respuesta = self.client.patch(f'/api/visitantes/{pk}/', {'parroquia': 'Siquisique'}, format='json')
+        self.assertEqual(respuesta.data['parroquia'], 'Siquisique')
+        self.assertEqual(sorted(Parroquia.objects.values_list('municipio__clave', 'nombre')),
+                         [('urdaneta', 'Catedral'), ('urdaneta', 'Siquisique')])
+        respuesta = self.client.patch(f'/api/visitantes/{pk}/', {'municipio': ''}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('parroquia', respuesta.data)
+
+    def test_cuerpos_invalidos(self):
+        for url, cuerpo in (('/api/visitantes/bulk/', {}), ('/api/visitantes/bulk/', []),
+                            ('/api/visitantes/bulk-salida/', [1]), ('/api/visitantes/bulk-salida/', {})):
+            with self.subTest(url=url, cuerpo=cuerpo):
+                self.assertEqual(self.client.post(url, cuerpo, format='json').status_code, 400)
+        respuesta = self.client.post('/api/visitantes/bulk-salida/', {'ids': ['x']}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_limite_de_items(self):
+        with mock.patch('gestion.views.MAX_ITEMS_BULK', 2):
+            respuesta = self.client.post('/api/visitantes/bulk/', [self.item(i) for i in range(3)], format='json')
+            self.assertEqual(respuesta.status_code, 400)
+            respuesta = self.client.post('/api/visitantes/bulk-salida/', {'ids': [1, 2, 3]}, format='json')
+            self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Visitante.objects.count(), 0)
+
+    def test_salida_por_ids(self):
+        abierto, completado = (Visitante.objects.create(nombre=f'V{i}', cedula=f'V{i:07d}') for i in range(2))
+        self.client.post(f'/api/visitantes/{completado.pk}/registrar-salida/')
+        respuesta = self.client.post('/api/visitantes/bulk-salida/',
+                                     {'ids': [abierto.pk, completado.pk, 999999]}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['actualizados'], 1)
+        self.assertEqual([(r['id'], r['ok'], r['estado']) for r in respuesta.data['resultados']], [
+            (abierto.pk, True, 'salida_registrada'),
+            (completado.pk, False, 'ya_completado'),
+            (999999, False, 'no_encontrado'),
+        ])
+        abierto.refresh_from_db()
+        self.assertTrue(abierto.atencion_completada)
+        self.assertIsNotNone(abierto.fecha_hora_salida)
+        self.assertEqual(abierto.actualizado_por, 'recepcion')
+        self.assertTrue(VisitanteEvento.objects.filter(visitante=abierto, accion=VisitanteEvento.SALIDA).exists())
+        self.assertRollupReconstruido()
+
+    def test_salida_abiertos_hoy(self):
+        hoy = Visitante.objects.create(nombre='Hoy', cedula='V0000001')
+        ayer = Visitante.objects.create(nombre='Ayer', cedula='V0000002',
+                                        fecha_hora_ingreso=medianoche_local(timezone.localdate()) - timedelta(hours=1))
+        respuesta = self.client.post('/api/visitantes/bulk-salida/', {'abiertos_hoy': True}, format='json')
+        self.assertEqual(respuesta.data['actualizados'], 1)
+        self.assertEqual([r['id'] for r in respuesta.data['resultados']], [hoy.pk])
+        hoy.refresh_from_db()
+        ayer.refresh_from_db()
+        self.assertTrue(hoy.atencion_completada)
+        self.assertFalse(ayer.atencion_completada)
+        self.assertRollupReconstruido()
+
+
+class EventosTest(TestCase):
+    """Deltas del dashboard en vivo: desborde de la cola y publicación al confirmar."""
+
+    def setUp(self):
+        self.client = APIClient(HTTP_X_USUARIO='recepcion')
+        self.suscripcion = eventos.difusor.suscribir()
+        self.addCleanup(eventos.difusor.desuscribir, self.suscripcion)
+        # Descarta los contadores iniciales de la conexión
+        self.suscripcion.tomar()
+
+    def tipos(self):
+        return [tipo for tipo, _ in self.suscripcion.tomar()]
+
+    def test_desborde_envia_resincronizar(self):
+        suscripcion = eventos.Suscripcion(max_pendientes=2, intervalo_contadores=0)
+        suscripcion.tomar()
+        for i in range(3):
+            suscripcion.entregar('visitante', {'id': i})
+        self.assertEqual(suscripcion.tomar(), [
+            (eventos.RESINCRONIZAR, {'descartados': 3}), (eventos.CONTADORES, None),
+        ])
+        self.assertEqual(suscripcion.descartados, 3)
+        # Después del 'resincronizar' los deltas vuelven a llegar uno por uno
+        suscripcion.entregar('salida', {'id': 9})
+        self.assertEqual(suscripcion.tomar(), [('salida', {'id': 9}), (eventos.CONTADORES, None)])
+
+    def test_publica_solo_al_confirmar(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            respuesta = self.client.post('/api/visitantes/', {'nombre': 'Ana', 'cedula': 'V1234567'}, format='json')
+            self.assertEqual(respuesta.status_code, 201)
+            self.assertEqual(self.tipos(), [])
+        for callback in callbacks:
+            callback()
+        entregados = self.suscripcion.tomar()
+        # Los contadores se agrupan por EVENTOS_INTERVALO_CONTADORES: pueden venir después
+        self.assertEqual([tipo for tipo, _ in entregados if tipo != eventos.CONTADORES], ['visitante'])
+        self.assertEqual(entregados[0][1]['id'], respuesta.data['id'])
+        self.assertEqual(entregados[0][1]['accion'], VisitanteEvento.CREADO)
+
+    def test_transaccion_revertida_no_publica(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    eventos.publicar('eliminado', {'id': 1})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.tipos(), [])
+        # Una edición inválida tampoco publica nada
+        pk = Visitante.objects.create(nombre='Ana', cedula='V1234567').pk
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.patch(f'/api/visitantes/{pk}/', {'cedula': '1'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.tipos(), [])
+
+
+class SincronizacionTest(TestCase):
+    """GET /api/visitantes/changes/: páginas por (actualizado_en, id), bajas y margen de confirmación."""
+
+    url = '/api/visitantes/changes/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.ahora = timezone.now().replace(microsecond=123456)
+        visitantes = [Visitante.objects.create(nombre=f'V{i}', cedula=f'V{i:07d}') for i in range(5)]
+        # Los dos primeros empatan en actualizado_en; el último cae dentro del margen
+        segundos = [60, 60, 50, 40, 2]
+        for visitante, atras in zip(visitantes, segundos):
+            Visitante.objects.filter(pk=visitante.pk).update(actualizado_en=self.ahora - timedelta(seconds=atras))
+        self.ids = [v.pk for v in visitantes]
+        # Bajas anteriores a la primera sincronización: una copia vacía no las necesita
+        VisitanteBorrado.objects.create(visitante_id=999999)
+        reloj = mock.patch('gestion.cambios.timezone.now', side_effect=lambda: self.ahora)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+
+    def pedir(self, **params):
+        respuesta = self.client.get(self.url, params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_token_ida_y_vuelta(self):
+        token = cambios.codificar(self.ahora, 42, 7)
+        self.assertEqual(cambios.decodificar(token), (self.ahora, 42, 7))
+        self.assertNotIn('=', token)
+
+    def test_paginas_sin_repetir_ni_saltar_empates(self):
+        primera = self.pedir(limite=1)
+        self.assertEqual([f['id'] for f in primera['cambios']], self.ids[:1])
+        self.assertTrue(primera['hay_mas'])
+        self.assertEqual(primera['borrados'], [])
+        # El segundo empata con el primero en actualizado_en y se distingue por id
+        segunda = self.pedir(limite=1, since=primera['since'])
+        self.assertEqual([f['id'] for f in segunda['cambios']], self.ids[1:2])
+        tercera = self.pedir(limite=2, since=segunda['since'])
+        self.assertEqual([f['id'] for f in tercera['cambios']], self.ids[2:4])
+        # El quinto se editó hace menos de CAMBIOS_MARGEN segundos
+        self.assertFalse(tercera['hay_mas'])
+        vacia = self.pedir(since=tercera['since'])
+        self.assertEqual((vacia['cambios'], vacia['borrados'], vacia['hay_mas']), ([], [], False))
+        self.assertEqual(vacia['since'], tercera['since'])
+
+        self.ahora += timedelta(seconds=10)
+        siguiente = self.pedir(since=tercera['since'])
+        self.assertEqual([f['id'] for f in siguiente['cambios']], self.ids[4:])
+
+    def test_bajas_y_ediciones_desde_el_token(self):
+        self.ahora += timedelta(seconds=10)
+        primera = self.pedir()
+        self.assertEqual([f['id'] for f in primera['cambios']], self.ids)
+        token = primera['since']
+        self.ahora += timedelta(seconds=10)
+        Visitante.objects.get(pk=self.ids[0]).delete()
+        visitante = Visitante.objects.get(pk=self.ids[1])
+        visitante.observaciones = 'Editado'
+        visitante.save()
+
+        # Baja y edición tienen la hora actual: salen pasado el margen
+        datos = self.pedir(since=token)
+        self.assertEqual((datos['cambios'], datos['borrados']), ([], []))
+        self.ahora += timedelta(seconds=10)
+        datos = self.pedir(since=token)
+        self.assertEqual([f['id'] for f in datos['cambios']], [self.ids[1]])
+        self.assertEqual(datos['cambios'][0]['observaciones'], 'Editado')
+        self.assertEqual(datos['borrados'], [self.ids[0]])
+        # Con el token nuevo no se repiten
+        datos = self.pedir(since=datos['since'])
+        self.assertEqual((datos['cambios'], datos['borrados']), ([], []))
+
+    def test_token_invalido(self):
+        for token in ('no-es-base64!', 'WzEsMl0', cambios.codificar(self.ahora, 1, 1)[:-3], 'Wy0xLDEsMV0'):
+            with self.subTest(token=token):
+                respuesta = self.client.get(self.url, {'since': token})
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(respuesta.data, {'error': 'Token since inválido'})
+
+
+@override_settings(ROOT_URLCONF='RegistroVisitas_Backend.urls_asgi')
+class VistasAsyncTest(TestCase):
+    """views_async.py por el URLconf ASGI: autenticación, caché, ETag y el mismo JSON que las vistas síncronas."""
+
+    URLCONF_WSGI = 'RegistroVisitas_Backend.urls'
+
+    @classmethod
+    def setUpTestData(cls):
+        ahora = timezone.now()
+        catalogo_cache.clear()
+        visitantes = []
+        for i in range(12):
+            municipio, parroquia = catalogo.resolver(['Iribarren', 'Palavecino'][i % 2], 'Catedral')
+            visitantes.append(Visitante(
+                nombre=f'Visitante {i}', cedula=f'V{i:07d}', municipio=municipio, parroquia=parroquia,
+                tipo_visita=['ASESORIA', 'TUTELA'][i % 2],
+                referir_a=['NO_REFERIDO', 'PREFECTURA', 'MINISTERIO_PUBLICO'][i % 3],
+                atencion_completada=i % 4 == 0, fecha_hora_ingreso=ahora - timedelta(days=i, hours=i),
+            ))
+        Visitante.objects.bulk_create(visitantes)
+        rollups.reconstruir()
+        cls.token = Token.objects.create(user=User.objects.create_user('recepcion'))
+
+    def setUp(self):
+        cache.invalidar()
+        recargar_catalogo()
+        # periodo_actual de los referidos lleva la hora: la misma para ambas vistas
+        reloj = mock.patch('django.utils.timezone.now', return_value=timezone.now())
+        reloj.start()
+        self.addCleanup(reloj.stop)
+
+    async def get_wsgi(self, url, **extra):
+        """La misma petición a la vista síncrona de gestion/urls.py."""
+        with self.settings(ROOT_URLCONF=self.URLCONF_WSGI):
+            return await sync_to_async(APIClient().get)(url, **extra)
+
+    async def test_mismo_json_que_las_vistas_sincronas(self):
+        urls = [
+            '/api/dashboard/estadisticas/', '/api/visitantes/estadisticas/', '/api/reportes/diario/?dias=10',
+            '/api/reportes/diario/?dias=30&municipio=Iribarren', '/api/estadisticas/referidos/',
+            '/api/opciones/tipos-visita/', '/api/opciones/instituciones/', '/api/opciones/municipios/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                # Sin caché de por medio: cada vista calcula su respuesta
+                await sync_to_async(cache.invalidar)()
+                asincrona = await self.async_client.get(url)
+                await sync_to_async(cache.invalidar)()
+                sincrona = await self.get_wsgi(url)
+                self.assertEqual((asincrona.status_code, sincrona.status_code), (200, 200))
+                self.assertEqual(asincrona['Content-Type'], 'application/json')
+                self.assertEqual(json.loads(asincrona.content), json.loads(sincrona.content))
+
+    async def test_token_invalido_y_metodo_no_permitido(self):
+        url = '/api/opciones/tipos-visita/'
+        for cabecera in ('Token malo', 'Token', 'Token a b'):
+            with self.subTest(cabecera=cabecera):
+                respuesta = await self.async_client.get(url, headers={'Authorization': cabecera})
+                self.assertEqual(respuesta.status_code, 401)
+                self.assertEqual(respuesta['WWW-Authenticate'], 'Token')
+                self.assertEqual(json.loads(respuesta.content), {'detail': 'Invalid token.'})
+        # Como DRF en la vista síncrona, aunque el endpoint no exija usuario
+        sincrona = await self.get_wsgi(url, HTTP_AUTHORIZATION='Token malo')
+        self.assertEqual(sincrona.status_code, 401)
+
+        valido = await self.async_client.get(url, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(valido.status_code, 200)
+        self.assertEqual((await self.async_client.get(url)).status_code, 200)
+
+        # require_GET antes que la autenticación y sin 403 de CSRF
+        for metodo in ('post', 'put', 'patch', 'delete'):
+            with self.subTest(metodo=metodo):
+                respuesta = await getattr(self.async_client, metodo)(url)
+                self.assertEqual(respuesta.status_code, 405)
+
+    async def test_acachear_respuesta(self):
+        url = '/api/dashboard/estadisticas/'
+        primera = await self.async_client.get(url)
+        self.assertEqual(primera['X-Cache'], 'MISS')
+        segunda = await self.async_client.get(url)
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(segunda.content, primera.content)
+        # La clave es la de cachear_respuesta(): la vista síncrona lee la misma entrada
+        self.assertEqual((await self.get_wsgi(url))['X-Cache'], 'HIT')
+
+        # Otro usuario u otros parámetros son otra entrada
+        otro = await self.async_client.get(url, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(otro['X-Cache'], 'MISS')
+        self.assertEqual((await self.async_client.get(url, {'x': '1'}))['X-Cache'], 'MISS')
+
+        # Una escritura cambia la generación
+        await sync_to_async(Visitante.objects.create)(nombre='Ana', cedula='V9999999')
+        tercera = await self.async_client.get(url)
+        self.assertEqual(tercera['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(tercera.content)['total'], await Visitante.objects.acount())
+
+    async def test_municipios_con_etag(self):
+        url = '/api/opciones/municipios/'
+        primera = await self.async_client.get(url)
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(primera['Cache-Control'], 'no-cache')
+        etag = primera['ETag']
+        self.assertEqual(etag, (await self.get_wsgi(url))['ETag'])
+
+        for valor in (etag, f'"otro", {etag}', '*'):
+            with self.subTest(valor=valor):
+                respuesta = await self.async_client.get(url, headers={'If-None-Match': valor})
+                self.assertEqual(respuesta.status_code, 304)
+                self.assertEqual(respuesta['ETag'], etag)
+                self.assertEqual(respuesta.content, b'')
+        vencido = await self.async_client.get(url, headers={'If-None-Match': '"otro"'})
+        self.assertEqual(vencido.status_code, 200)
+        self.assertEqual(vencido.content, primera.content)
+
+    async def test_eventos_por_asgi(self):
+        self.assertIs(resolve('/api/eventos/').func, views_async.eventos)
+        self.assertIs(resolve('/api/eventos/', urlconf=self.URLCONF_WSGI).func.view_class, views.EventosView)
+        # Lo que no tiene variante async se resuelve como por WSGI
+        self.assertIs(resolve('/api/reportes/referidos/').func.view_class, views.ReporteReferidosView)
+
+        clientes = eventos.difusor.estadisticas()['clientes']
+        respuesta = await self.async_client.get('/api/eventos/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertEqual(respuesta['X-Accel-Buffering'], 'no')
+        flujo = respuesta.streaming_content
+        self.assertTrue((await anext(flujo)).startswith(b'retry: '))
+        contadores = await anext(flujo)
+        self.assertTrue(contadores.startswith(b'event: contadores\n'))
+        self.assertEqual(eventos.difusor.estadisticas()['clientes'], clientes + 1)
+
+        # Al cerrar el servidor el flujo termina y la suscripción se libera
+        eventos.difusor.cerrar_todas()
+        self.assertEqual([bloque async for bloque in flujo], [])
+        self.assertEqual(eventos.difusor.estadisticas()['clientes'], clientes)
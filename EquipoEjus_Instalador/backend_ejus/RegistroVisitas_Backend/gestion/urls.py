@@ -29,6 +29,13 @@ path('dashboard/estadisticas/', views.VisitanteViewSet.as_view({'get': 'estadist
     # Exportación de reportes
     path('reportes/exportar/pdf/', views.ExportarReportePDFView.as_view(), name='exportar-reporte-pdf'),
     path('reportes/exportar/excel/', views.ExportarReporteExcelView.as_view(), name='exportar-reporte-excel'),
+    path('reportes/exportar/visitantes/', views.ExportarVisitantesView.as_view(), name='exportar-visitantes'),
+
+    # Reportes PDF/Excel en segundo plano
+    path('cache/', views.CacheEstadisticasView.as_view(), name='cache-estadisticas'),
+    path('reportes/jobs/', views.ReporteJobListView.as_view(), name='reporte-jobs'),
+    path('reportes/jobs/<uuid:pk>/', views.ReporteJobDetalleView.as_view(), name='reporte-job-detalle'),
+    path('reportes/jobs/<uuid:pk>/descargar/', views.ReporteJobDescargaView.as_view(), name='reporte-job-descargar'),
     
     # Rutas adicionales para funcionalidades específicas
     path('visitantes/<int:pk>/registrar-salida/', 
@@ -42,6 +49,8 @@ path('dashboard/estadisticas/', views.VisitanteViewSet.as_view({'get': 'estadist
     
     # API para estadísticas específicas de referidos
     path('estadisticas/referidos/', views.EstadisticasReferidosView.as_view(), name='estadisticas-referidos'),
+    # Altas, salidas y contadores en vivo (Server-Sent Events)
+    path('eventos/', views.EventosView.as_view(), name='eventos'),
     # Autenticación (token)
     path('auth/login/', views.LoginView.as_view(), name='api-login'),
     path('auth/logout/', views.LogoutView.as_view(), name='api-logout'),
@@ -50,6 +59,8 @@ path('dashboard/estadisticas/', views.VisitanteViewSet.as_view({'get': 'estadist
     # Update/version endpoints
     path('update/version/', views.version, name='api-version'),
     path('update/run/', views.update, name='api-update'),
+    # Chequeo de salud (servidor de producción, monitoreo)
+    path('salud/', views.salud, name='api-salud'),
 ]
 
 # Si necesitas una vista para obtener opciones
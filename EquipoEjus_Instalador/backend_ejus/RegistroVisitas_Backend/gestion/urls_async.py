@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import views_async
+
+# Variantes async de gestion/urls.py (solo por ASGI, ver RegistroVisitas_Backend/urls_asgi.py)
+urlpatterns = [
+    path('dashboard/estadisticas/', views_async.estadisticas, name='dashboard-estadisticas'),
+    path('visitantes/estadisticas/', views_async.estadisticas, name='visitante-estadisticas'),
+    path('reportes/diario/', views_async.reporte_diario, name='reporte-diario'),
+    path('estadisticas/referidos/', views_async.estadisticas_referidos, name='estadisticas-referidos'),
+    path('opciones/tipos-visita/', views_async.opciones_tipos_visita, name='opciones-tipos-visita'),
+    path('opciones/instituciones/', views_async.opciones_instituciones, name='opciones-instituciones'),
+    path('opciones/municipios/', views_async.opciones_municipios, name='opciones-municipios'),
+    path('eventos/', views_async.eventos, name='eventos'),
+]
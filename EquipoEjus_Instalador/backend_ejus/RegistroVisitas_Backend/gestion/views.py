@@ -1,28 +1,36 @@
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
 from rest_framework import viewsets, generics, status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
-from django.http import HttpResponse
-from io import BytesIO
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
-import pandas as pd
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from .models import Visitante
-from .Serializers import VisitanteSerializer, EstadisticasSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .models import ReporteJob, Visitante, VisitanteEvento, VisitaRollupDiario
+from .Serializers import (
+    EstadisticasSerializer, ReporteJobSerializer, VisitanteDetalleSerializer, VisitanteSerializer,
+)
+from . import cache_reportes, cambios, catalogo, documentos, eventos, exportacion, jobs, rollups, sqlite
+from .busqueda import filtrar_busqueda
+from .cache import (
+    cachear_respuesta, coincide_etag, estadisticas_cache, estadisticas_respuestas, generacion,
+    invalidar, reportes_archivos_cache,
+)
+from .contexto_reportes import ContextoReporte
+from .reportes import (
+    PERIODO_SEMANA, fecha_inicio_periodo, filtrar_visitantes, leer_entero,
+    medianoche_local, serie_por_periodo,
+)
+from .rollups import conteos
 from django.db.models.functions import ExtractHour
 import logging
-from django.db import transaction, IntegrityError
+from django.db import DatabaseError, connection, transaction, IntegrityError
 import os
 import shutil
 import tempfile
@@ -36,790 +44,643 @@ from django.http import JsonResponse, HttpResponseForbidden
 
 logger = logging.getLogger(__name__)
 
+# Tope de elementos por petición en /visitantes/bulk/ y /visitantes/bulk-salida/
+MAX_ITEMS_BULK = 500
+
 try:
-    from openpyxl.utils import get_column_letter
     import openpyxl
-    from openpyxl.styles import Font
 except Exception:
-    get_column_letter = None
     openpyxl = None
-    Font = None
+
+def usuario_actual(request):
+    """Nombre del usuario autenticado o, si no hay sesión, el de la cabecera X-Usuario."""
+    # Prefer authenticated user
+    if hasattr(request, 'user') and request.user and request.user.is_authenticated:
+        return request.user.get_full_name() or request.user.username
+    # Fallback to X-Usuario header if present
+    return request.headers.get('X-Usuario') or request.META.get('HTTP_X_USUARIO')
+
+
+def filtrar_listado(queryset, params):
+    """Filtros del listado de visitantes; los comparten VisitanteViewSet y la exportación."""
+    # Filtro manual por tipo_visita
+    tipo_visita = params.get('tipo_visita', None)
+    if tipo_visita:
+        queryset = queryset.filter(tipo_visita=tipo_visita)
+
+    # Filtro manual por atencion_completada
+    atencion_completada = params.get('atencion_completada', None)
+    if atencion_completada is not None:
+        queryset = queryset.filter(atencion_completada=(atencion_completada.lower() == 'true'))
+
+    # Búsqueda por nombre, cédula, teléfono, municipio o parroquia (índice FTS5 en SQLite)
+    search = params.get('search') or params.get('q')
+    if search:
+        queryset = filtrar_busqueda(queryset, search)
+
+    # Filtrado por referido (soporta 'NO_REFERIDO', valor específico, o 'REFERIDO' para cualquiera que no sea NO_REFERIDO)
+    referir_param = params.get('referir_a')
+    referidos_flag = params.get('referido')
+    if referidos_flag is not None:
+        # si ?referido=1 se seleccionan todos los que NO son NO_REFERIDO
+        queryset = queryset.exclude(referir_a='NO_REFERIDO')
+    elif referir_param:
+        queryset = queryset.filter(referir_a=referir_param)
+
+    # Filtrado por municipio: id o parte del nombre, resuelto contra el catálogo
+    municipio_param = params.get('municipio')
+    if municipio_param:
+        queryset = queryset.filter(municipio__in=catalogo.ids_municipio(municipio_param))
+    return queryset
+
 
 class VisitanteViewSet(viewsets.ModelViewSet):
     queryset = Visitante.objects.all()
     serializer_class = VisitanteSerializer
 
-    def perform_create(self, serializer):
-        usuario = None
-        # Prefer authenticated user
-        if hasattr(self.request, 'user') and self.request.user and self.request.user.is_authenticated:
-            usuario = self.request.user.get_full_name() or self.request.user.username
-        else:
-            # Fallback to X-Usuario header if present
-            usuario = self.request.headers.get('X-Usuario') or self.request.META.get('HTTP_X_USUARIO')
+    def _usuario_actual(self):
+        return usuario_actual(self.request)
+
+    def get_serializer_class(self):
+        # El listado no incluye los eventos de cada visitante; el detalle sí
+        if self.action == 'list':
+            return VisitanteSerializer
+        return VisitanteDetalleSerializer
 
-        # Link or create Persona by cedula so we keep a person registry
-        persona = None
+    def _resolver_persona(self, serializer):
+        """Persona de la cédula recibida (se crea si no existe); None si no hay cédula o falla."""
         cedula = serializer.validated_data.get('cedula')
-        if cedula:
-            from .models import Persona
-            try:
-                with transaction.atomic():
-                    persona, created = Persona.objects.get_or_create(
-                        cedula=cedula,
-                        defaults={'nombre': serializer.validated_data.get('nombre', '')}
-                    )
-            except IntegrityError:
-                try:
-                    persona = Persona.objects.get(cedula=cedula)
-                except Persona.DoesNotExist:
-                    persona = None
-            except Exception as e:
-                logger.exception('Error creando Persona en perform_create: %s', e)
-                persona = None
+        if not cedula:
+            return None
+        from .models import Persona
+        try:
+            with transaction.atomic():
+                persona, created = Persona.objects.get_or_create(
+                    cedula=cedula,
+                    defaults={'nombre': serializer.validated_data.get('nombre', '')}
+                )
+            return persona
+        except IntegrityError:
+            # Otra petición creó la misma persona entre el SELECT y el INSERT
+            persona = Persona.objects.filter(cedula=cedula).first()
+            if persona is None:
+                logger.exception('Persona esperada no encontrada tras IntegrityError')
+            return persona
+        except Exception as e:
+            logger.exception('Error creando o enlazando Persona: %s', e)
+            return None
 
-        instance = serializer.save(persona=persona)
-        if usuario:
-            instance.historial = (instance.historial or '') + f"\nCreado por: {usuario} - {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            instance.save()
+    def perform_create(self, serializer):
+        usuario = self._usuario_actual()
+        # Link or create Persona by cedula so we keep a person registry. Persona,
+        # visitante y evento se escriben en una sola transacción y un solo INSERT.
+        with transaction.atomic():
+            persona = self._resolver_persona(serializer)
+            instance = serializer.save(persona=persona, creado_por=usuario, actualizado_por=usuario)
+            VisitanteEvento.objects.create(visitante=instance, accion=VisitanteEvento.CREADO, usuario=usuario or '')
+            eventos.publicar('visitante', eventos.delta_visitante(instance, VisitanteEvento.CREADO))
 
     def perform_update(self, serializer):
-        usuario = None
-        if hasattr(self.request, 'user') and self.request.user and self.request.user.is_authenticated:
-            usuario = self.request.user.get_full_name() or self.request.user.username
-        else:
-            usuario = self.request.headers.get('X-Usuario') or self.request.META.get('HTTP_X_USUARIO')
-
-        # After updating, ensure persona is linked/updated if cedula changed
-        instance = serializer.save()
-        cedula = serializer.validated_data.get('cedula')
-        if cedula:
-            from .models import Persona
-            try:
-                with transaction.atomic():
-                    persona, created = Persona.objects.get_or_create(
-                        cedula=cedula,
-                        defaults={'nombre': serializer.validated_data.get('nombre', '')}
-                    )
-                if instance.persona != persona:
-                    instance.persona = persona
-                    instance.save()
-            except IntegrityError:
-                try:
-                    persona = Persona.objects.get(cedula=cedula)
-                    if instance.persona != persona:
-                        instance.persona = persona
-                        instance.save()
-                except Persona.DoesNotExist:
-                    logger.exception('Persona esperada no encontrada tras IntegrityError')
-            except Exception as e:
-                logger.exception('Error creando o enlazando Persona en perform_update: %s', e)
-
-        if usuario:
-            instance.historial = (instance.historial or '') + f"\nActualizado por: {usuario} - {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            instance.save()
+        usuario = self._usuario_actual()
+        extra = {'actualizado_por': usuario} if usuario else {}
+        with transaction.atomic():
+            # Si cambió la cédula se enlaza la persona en el mismo UPDATE
+            persona = self._resolver_persona(serializer)
+            if persona is not None and serializer.instance.persona_id != persona.pk:
+                extra['persona'] = persona
+            instance = serializer.save(**extra)
+            VisitanteEvento.objects.create(visitante=instance, accion=VisitanteEvento.ACTUALIZADO, usuario=usuario or '')
+            eventos.publicar('visitante', eventos.delta_visitante(instance, VisitanteEvento.ACTUALIZADO))
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        with transaction.atomic():
+            instance.delete()
+            eventos.publicar('eliminado', {'id': pk})
     
     def get_queryset(self):
-        # Use select_related for persona and annotate visit_count to reduce DB queries
-        queryset = Visitante.objects.select_related('persona').annotate(visit_count=Count('persona__visitas'))
-        
-        # Filtro manual por tipo_visita
-        tipo_visita = self.request.query_params.get('tipo_visita', None)
-        if tipo_visita:
-            queryset = queryset.filter(tipo_visita=tipo_visita)
-            
-        # Filtro manual por atencion_completada
-        atencion_completada = self.request.query_params.get('atencion_completada', None)
-        if atencion_completada is not None:
-            queryset = queryset.filter(atencion_completada=(atencion_completada.lower() == 'true'))
-
-        # Búsqueda por nombre, cédula, teléfono, municipio o parroquia
-        search = self.request.query_params.get('search') or self.request.query_params.get('q')
-        if search:
-            queryset = queryset.filter(
-                Q(nombre__icontains=search) |
-                Q(cedula__icontains=search) |
-                Q(telefono__icontains=search) |
-                Q(municipio__icontains=search) |
-                Q(parroquia__icontains=search)
-            )
-
-        # Filtrado por referido (soporta 'NO_REFERIDO', valor específico, o 'REFERIDO' para cualquiera que no sea NO_REFERIDO)
-        referir_param = self.request.query_params.get('referir_a')
-        referidos_flag = self.request.query_params.get('referido')
-        if referidos_flag is not None:
-            # si ?referido=1 se seleccionan todos los que NO son NO_REFERIDO
-            queryset = queryset.exclude(referir_a='NO_REFERIDO')
-        elif referir_param:
-            queryset = queryset.filter(referir_a=referir_param)
-        
-        # Filtrado por municipio (coincidencia parcial, insensible)
-        municipio_param = self.request.query_params.get('municipio')
-        if municipio_param:
-            queryset = queryset.filter(municipio__icontains=municipio_param)
-            
-        return queryset
+        # visit_count lo resuelve VisitanteListSerializer con una consulta agrupada por página
+        queryset = Visitante.objects.select_related('persona')
+        return filtrar_listado(queryset, self.request.query_params)
     
     @action(detail=False, methods=['get'])
+    @cachear_respuesta
     def estadisticas(self, request):
-        hoy = timezone.now().date()
-        inicio_semana = hoy - timedelta(days=hoy.weekday())
-        inicio_mes = hoy.replace(day=1)
-        
-        total = Visitante.objects.count()
-        diario = Visitante.objects.filter(fecha_hora_ingreso__date=hoy).count()
-        semanal = Visitante.objects.filter(fecha_hora_ingreso__date__gte=inicio_semana).count()
-        mensual = Visitante.objects.filter(fecha_hora_ingreso__date__gte=inicio_mes).count()
-        
-        # Visitantes activos (en sala)
-        en_sala = Visitante.objects.filter(atencion_completada=False).count()
-        
-        data = {
-            'total': total,
-            'diario': diario,
-            'semanal': semanal,
-            'mensual': mensual,
-            'enSala': en_sala,
-        }
+        conteos = Visitante.objects.aggregate(**self._agregados_estadisticas(timezone.localdate()))
 
         # Devolver directamente el diccionario (no es necesario serializar aquí)
-        return Response(data)
+        return Response(self._formatear_estadisticas(conteos))
+
+    @staticmethod
+    def _agregados_estadisticas(hoy):
+        """Todos los conteos del dashboard, para una sola consulta aggregate().
+
+        Los periodos son rangos semiabiertos [inicio, mañana) calculados a
+        medianoche en la zona horaria del servidor, de modo que la comparación
+        usa el índice de fecha_hora_ingreso en lugar de envolverlo en DATE().
+        """
+        manana = medianoche_local(hoy + timedelta(days=1))
+        inicio_hoy = medianoche_local(hoy)
+        inicio_semana = medianoche_local(hoy - timedelta(days=hoy.weekday()))
+        inicio_mes = medianoche_local(hoy.replace(day=1))
+
+        return {
+            'total': Count('id'),
+            'diario': Count('id', filter=Q(fecha_hora_ingreso__gte=inicio_hoy, fecha_hora_ingreso__lt=manana)),
+            'semanal': Count('id', filter=Q(fecha_hora_ingreso__gte=inicio_semana, fecha_hora_ingreso__lt=manana)),
+            'mensual': Count('id', filter=Q(fecha_hora_ingreso__gte=inicio_mes, fecha_hora_ingreso__lt=manana)),
+            # Visitantes activos (en sala)
+            'en_sala': Count('id', filter=Q(atencion_completada=False)),
+        }
+
+    @classmethod
+    def contadores_dashboard(cls):
+        """Los conteos de estadisticas() para los flujos de eventos.
+
+        Se guardan en estadisticas_cache (se vacía con cada escritura), así
+        todas las pantallas conectadas comparten una consulta por cambio.
+        """
+        hoy = timezone.localdate()
+        return estadisticas_cache.get_or_set(
+            ('dashboard', hoy),
+            lambda: cls._formatear_estadisticas(Visitante.objects.aggregate(**cls._agregados_estadisticas(hoy))),
+        )
+
+    @staticmethod
+    def _formatear_estadisticas(conteos):
+        return {
+            'total': conteos['total'],
+            'diario': conteos['diario'],
+            'semanal': conteos['semanal'],
+            'mensual': conteos['mensual'],
+            'enSala': conteos['en_sala'],
+        }
     
     @action(detail=True, methods=['post'])
     def registrar_salida(self, request, pk=None):
         visitante = self.get_object()
+        usuario = self._usuario_actual()
         visitante.fecha_hora_salida = timezone.now()
         visitante.atencion_completada = True
-        visitante.save()
+        if usuario:
+            visitante.actualizado_por = usuario
+        with transaction.atomic():
+            visitante.save(update_fields=[
+                'fecha_hora_salida', 'atencion_completada', 'actualizado_por', 'actualizado_en',
+            ])
+            VisitanteEvento.objects.create(
+                visitante=visitante, accion=VisitanteEvento.SALIDA, usuario=usuario or '',
+                fecha=visitante.fecha_hora_salida,
+            )
+            eventos.publicar('salida', {
+                'id': visitante.pk, 'fecha_hora_salida': visitante.fecha_hora_salida,
+                'actualizado_en': visitante.actualizado_en,
+            })
         
         serializer = self.get_serializer(visitante)
         return Response(serializer.data)
 
-# ========== VISTAS PARA REPORTES ==========
-
-class ReporteTramitesView(APIView):
-    def get(self, request):
-        periodo = request.GET.get('periodo', 'mes')
-        # filtros opcionales desde query params
-        municipio_param = request.GET.get('municipio')
-        tipo_param = request.GET.get('tipo_visita')
-        referir_param = request.GET.get('referir_a')
-        
-        # Calcular fecha de inicio según el período
-        fecha_actual = timezone.now()
-        if periodo == 'hoy':
-            fecha_inicio = fecha_actual.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif periodo == 'semana':
-            fecha_inicio = fecha_actual - timedelta(days=7)
-        elif periodo == 'mes':
-            fecha_inicio = fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        elif periodo == 'trimestre':
-            fecha_inicio = fecha_actual - timedelta(days=90)
-        elif periodo == 'anio':
-            fecha_inicio = fecha_actual.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            fecha_inicio = fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Consulta para agrupar por tipo de trámite
-        base_qs = Visitante.objects.filter(fecha_hora_ingreso__gte=fecha_inicio)
-        if municipio_param:
-            base_qs = base_qs.filter(municipio__icontains=municipio_param)
-        if tipo_param:
-            base_qs = base_qs.filter(tipo_visita=tipo_param)
-        if referir_param:
-            base_qs = base_qs.filter(referir_a=referir_param)
-
-        tramites = base_qs.values('tipo_visita').annotate(
-            cantidad=Count('id'),
-            completados=Count('id', filter=Q(atencion_completada=True))
-        ).order_by('-cantidad')
-        
-        # Transformar datos para el frontend
-        datos = []
-        for tramite in tramites:
-            if tramite['cantidad'] > 0:
-                porcentaje = (tramite['completados'] / tramite['cantidad']) * 100
-            else: porcentaje = 0 
-            datos.append({
-                'nombre': tramite['tipo_visita'],
-                'cantidad': tramite['cantidad'],
-                'completados': tramite['completados'],
-                'porcentaje_completados': round(porcentaje, 2)
-            })
-
+    @action(detail=False, methods=['get'], url_path='changes')
+    def sincronizar(self, request):
+        """Altas, ediciones y bajas desde el token `since`, para clientes con copia local.
 
-        
-        total_tramites = sum(t['cantidad'] for t in datos)
-        total_completados = sum(t['completados'] for t in datos)
-        
-        if total_tramites > 0:
-            porcentaje_total = round((total_completados / total_tramites) * 100, 2)
-        else:
-            porcentaje_total = 0
+        Sin `since` se recorre la tabla completa. Mientras `hay_mas` sea true
+        se vuelve a pedir con el `since` recibido (ver cambios.py).
+        """
+        limite = leer_entero(request.query_params, 'limite', MAX_ITEMS_BULK, maximo=MAX_ITEMS_BULK)
+        try:
+            visitantes, borrados, siguiente, hay_mas = cambios.cambios(request.query_params.get('since'), limite)
+        except cambios.TokenInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
-            'success': True,
-            'periodo': periodo,
-            'total_tramites': sum(t['cantidad'] for t in datos),
-            'porcentaje_total_completados': porcentaje_total,
-            'datos': datos
+            'cambios': VisitanteSerializer(visitantes, many=True).data,
+            'borrados': borrados,
+            'since': siguiente,
+            'hay_mas': hay_mas,
         })
 
-class ReporteVisitasMensualesView(APIView):
-    def get(self, request):
-        # Obtener datos de los últimos 6 meses
-        fecha_actual = timezone.now()
-        municipio_param = request.GET.get('municipio')
-        tipo_param = request.GET.get('tipo_visita')
-        referir_param = request.GET.get('referir_a')
-        meses_data = []
-        
-        for i in range(6):
-            fecha_mes = fecha_actual - timedelta(days=30*i)
-            inicio_mes = fecha_mes.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            # Calcular fin del mes
-            if fecha_mes.month == 12:
-                fin_mes = fecha_mes.replace(year=fecha_mes.year+1, month=1, day=1)
-            else:
-                fin_mes = fecha_mes.replace(month=fecha_mes.month+1, day=1)
-            
-            # Contar visitas del mes (aplicar filtros si hay)
-            base_qs = Visitante.objects.filter(
-                fecha_hora_ingreso__gte=inicio_mes,
-                fecha_hora_ingreso__lt=fin_mes
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Registra la llegada de un grupo de visitantes en una sola transacción.
+
+        Recibe una lista con el mismo formato que el POST individual. Si algún
+        elemento no es válido no se crea ninguno y se devuelve el error de cada uno.
+        """
+        datos = request.data
+        if not isinstance(datos, list) or not datos:
+            return Response({'error': 'Se espera una lista no vacía de visitantes'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(datos) > MAX_ITEMS_BULK:
+            return Response({'error': f'Máximo {MAX_ITEMS_BULK} visitantes por petición'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = VisitanteSerializer(data=datos, many=True)
+        if not serializer.is_valid():
+            resultados = [
+                {'indice': i, 'ok': not errores, 'errores': errores}
+                for i, errores in enumerate(serializer.errors)
+            ]
+            return Response({'success': False, 'resultados': resultados}, status=status.HTTP_400_BAD_REQUEST)
+
+        usuario = self._usuario_actual()
+        with transaction.atomic():
+            personas = self._resolver_personas(serializer.validated_data)
+            visitantes = Visitante.objects.bulk_create([
+                Visitante(**VisitanteSerializer.ubicar(item), persona=personas.get(item['cedula']), creado_por=usuario, actualizado_por=usuario)
+                for item in serializer.validated_data
+            ])
+            VisitanteEvento.objects.bulk_create([
+                VisitanteEvento(visitante=v, accion=VisitanteEvento.CREADO, usuario=usuario or '')
+                for v in visitantes
+            ])
+            # bulk_create no emite señales: rollup y caché se actualizan aquí
+            rollups.registrar_cambios((None, rollups.estado_rollup(v)) for v in visitantes)
+            # Un delta por visitante llenaría las colas: las pantallas recargan el listado
+            eventos.publicar(eventos.RESINCRONIZAR, {'creados': len(visitantes)})
+        invalidar()
+
+        datos_creados = VisitanteSerializer(visitantes, many=True).data
+        resultados = [
+            {'indice': i, 'ok': True, 'visitante': fila}
+            for i, fila in enumerate(datos_creados)
+        ]
+        return Response({'success': True, 'creados': len(visitantes), 'resultados': resultados},
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulk-salida')
+    def bulk_salida(self, request):
+        """Registra la salida de varios visitantes con un solo UPDATE.
+
+        Body: {"ids": [1, 2, ...]} o {"abiertos_hoy": true} para cerrar todas las
+        atenciones de hoy que sigan abiertas.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Se espera un objeto con "ids" o "abiertos_hoy"'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ids = request.data.get('ids')
+        abiertos_hoy = str(request.data.get('abiertos_hoy', '')).lower() in ('1', 'true')
+        if abiertos_hoy:
+            hoy = timezone.localdate()
+            candidatos = Visitante.objects.filter(
+                fecha_hora_ingreso__gte=medianoche_local(hoy),
+                fecha_hora_ingreso__lt=medianoche_local(hoy + timedelta(days=1)),
+                atencion_completada=False,
             )
-            if municipio_param:
-                base_qs = base_qs.filter(municipio__icontains=municipio_param)
-            if tipo_param:
-                base_qs = base_qs.filter(tipo_visita=tipo_param)
-            if referir_param:
-                base_qs = base_qs.filter(referir_a=referir_param)
-
-            total_visitas = base_qs.count()
-            
-            completados = base_qs.filter(atencion_completada=True).count()
-            
-            if total_visitas > 0:
-                porcentaje_completados = round((completados / total_visitas) * 100, 2)
-            else:
-                porcentaje_completados = 0.0
-            # Nombre del mes en español
-            meses_es = {
-                1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
-                7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'
+        elif isinstance(ids, list) and ids:
+            try:
+                ids = [int(pk) for pk in ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'ids debe ser una lista de enteros'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > MAX_ITEMS_BULK:
+                return Response({'error': f'Máximo {MAX_ITEMS_BULK} visitantes por petición'}, status=status.HTTP_400_BAD_REQUEST)
+            candidatos = Visitante.objects.filter(pk__in=ids)
+        else:
+            return Response({'error': 'Indique "ids" o "abiertos_hoy"'}, status=status.HTTP_400_BAD_REQUEST)
+
+        usuario = self._usuario_actual()
+        ahora = timezone.now()
+        with transaction.atomic():
+            encontrados = {
+                v.pk: v for v in candidatos.order_by().only(
+                    'id', 'atencion_completada', *rollups.CAMPOS_ESTADO
+                )
             }
-            
-            meses_data.append({
-                'mes': meses_es.get(inicio_mes.month, inicio_mes.strftime('%b')),
-                'mes_numero': inicio_mes.month,
-                'total_visitas': total_visitas,
-                'completados': completados,
-                'porcentaje_completados': porcentaje_completados
-            })
-        
-        # Ordenar por mes (más antiguo primero)
-        meses_data.reverse()
-        
+            abiertos = [v for v in encontrados.values() if not v.atencion_completada]
+            cambios = []
+            for v in abiertos:
+                anterior = rollups.estado_rollup(v)
+                v.atencion_completada = True
+                cambios.append((anterior, rollups.estado_rollup(v)))
+
+            cambios_visitante = {
+                'fecha_hora_salida': ahora, 'atencion_completada': True, 'actualizado_en': ahora,
+            }
+            if usuario:
+                cambios_visitante['actualizado_por'] = usuario
+            Visitante.objects.filter(pk__in=[v.pk for v in abiertos]).update(**cambios_visitante)
+            VisitanteEvento.objects.bulk_create([
+                VisitanteEvento(visitante_id=v.pk, accion=VisitanteEvento.SALIDA, usuario=usuario or '', fecha=ahora)
+                for v in abiertos
+            ])
+            # update() no emite señales: rollup y caché se actualizan aquí
+            rollups.registrar_cambios(cambios)
+            if abiertos:
+                eventos.publicar(eventos.RESINCRONIZAR, {'salidas': len(abiertos)})
+        invalidar()
+
+        cerrados = {v.pk for v in abiertos}
+        solicitados = ids if not abiertos_hoy else sorted(encontrados)
+        resultados = []
+        for pk in solicitados:
+            if pk in cerrados:
+                estado = 'salida_registrada'
+            elif pk in encontrados:
+                estado = 'ya_completado'
+            else:
+                estado = 'no_encontrado'
+            resultados.append({'id': pk, 'ok': pk in cerrados, 'estado': estado})
         return Response({
             'success': True,
-            'datos': meses_data
+            'actualizados': len(cerrados),
+            'fecha_hora_salida': ahora,
+            'resultados': resultados,
         })
 
+    def _resolver_personas(self, items):
+        """Persona de cada cédula del lote, creando en bloque las que falten. {cedula: Persona}"""
+        from .models import Persona
+        nombres = {}
+        for item in items:
+            nombres.setdefault(item['cedula'], item.get('nombre', ''))
+        personas = {p.cedula: p for p in Persona.objects.filter(cedula__in=nombres)}
+        faltantes = [Persona(cedula=c, nombre=n) for c, n in nombres.items() if c not in personas]
+        if faltantes:
+            # ignore_conflicts: otra petición pudo crear alguna entre el SELECT y el INSERT
+            Persona.objects.bulk_create(faltantes, ignore_conflicts=True)
+            personas.update(
+                (p.cedula, p) for p in Persona.objects.filter(cedula__in=[p.cedula for p in faltantes])
+            )
+        return personas
+
+# ========== VISTAS PARA REPORTES ==========
+
+class ReporteTramitesView(APIView):
+    @cachear_respuesta
+    def get(self, request):
+        return Response(ContextoReporte(request.GET).tramites())
+
+class ReporteVisitasMensualesView(APIView):
+    """Visitas por mes calendario para los últimos N meses (?months=N, por defecto 6)."""
+    @cachear_respuesta
+    def get(self, request):
+        return Response(ContextoReporte(request.GET).visitas_mensuales())
+
 class ReporteTendenciaSemanalView(APIView):
+    """Visitas por semana (lunes a domingo) para las últimas N semanas (?weeks=N, por defecto 6)."""
+    @cachear_respuesta
     def get(self, request):
-        # Obtener datos de las últimas 6 semanas
-        fecha_actual = timezone.now()
-        municipio_param = request.GET.get('municipio')
-        tipo_param = request.GET.get('tipo_visita')
-        referir_param = request.GET.get('referir_a')
+        semanas = leer_entero(request.GET, 'weeks', 6, maximo=520)
+
         semanas_data = []
-        
-        for i in range(6):
-            inicio_semana = fecha_actual - timedelta(weeks=i, days=fecha_actual.weekday())
-            fin_semana = inicio_semana + timedelta(days=7)
-            
-            base_qs = Visitante.objects.filter(
-                fecha_hora_ingreso__gte=inicio_semana,
-                fecha_hora_ingreso__lt=fin_semana
-            )
-            if municipio_param:
-                base_qs = base_qs.filter(municipio__icontains=municipio_param)
-            if tipo_param:
-                base_qs = base_qs.filter(tipo_visita=tipo_param)
-            if referir_param:
-                base_qs = base_qs.filter(referir_a=referir_param)
-
-            # Contar visitas de la semana
-            total_visitas = base_qs.count()
-            
+        for numero, periodo in enumerate(serie_por_periodo(request.GET, PERIODO_SEMANA, semanas), 1):
+            total_visitas = periodo['total']
+
             # Calcular promedio diario
             promedio_diario = round(total_visitas / 7, 2) if total_visitas > 0 else 0
-            
+
             semanas_data.append({
-                'semana': f"Sem {6-i}",
-                'semana_numero': 6 - i,
+                'semana': f"Sem {numero}",
+                'semana_numero': numero,
                 'total_visitas': total_visitas,
+                'completados': periodo['completados'],
                 'promedio_diario': promedio_diario,
-                'fecha_inicio': inicio_semana.strftime('%d/%m'),
-                'fecha_fin': fin_semana.strftime('%d/%m')
+                'fecha_inicio': periodo['inicio'].strftime('%d/%m'),
+                'fecha_fin': periodo['fin'].strftime('%d/%m')
             })
-        
-        # Ordenar por semana (más antigua primero)
-        semanas_data.reverse()
-        
+
+        # La serie ya viene ordenada de la semana más antigua a la actual
         return Response({
             'success': True,
+            'semanas': semanas,
             'datos': semanas_data
         })
 
 
 class ReporteDiarioView(APIView):
     """Devuelve conteo de visitas por día para los últimos N días (por defecto 14)."""
+    @cachear_respuesta
     def get(self, request):
-        try:
-            dias = int(request.GET.get('days', 14))
-        except ValueError:
-            dias = 14
-
-        fecha_actual = timezone.now().date()
-        datos = []
+        dias = self._leer_dias(request.GET)
+        fecha_actual = timezone.localdate()
+
+        # Una sola consulta agrupada por día sobre el rollup diario para toda la ventana
+        inicio = medianoche_local(fecha_actual - timedelta(days=dias - 1))
+        por_dia = {
+            fila['fecha']: fila['total']
+            for fila in conteos(request.GET, desde=inicio, campos=['fecha'])
+        }
+        return Response(self._respuesta(fecha_actual, dias, por_dia))
 
-        municipio_param = request.GET.get('municipio')
-        tipo_param = request.GET.get('tipo_visita')
-        referir_param = request.GET.get('referir_a')
+    @staticmethod
+    def _leer_dias(params):
+        return leer_entero(params, 'days', 14, minimo=1, maximo=366)
 
+    @staticmethod
+    def _respuesta(fecha_actual, dias, por_dia):
+        datos = []
+        # Rellenar en Python los días sin visitas
         for i in range(dias - 1, -1, -1):
             dia = fecha_actual - timedelta(days=i)
-            base_qs = Visitante.objects.filter(fecha_hora_ingreso__date=dia)
-            if municipio_param:
-                base_qs = base_qs.filter(municipio__icontains=municipio_param)
-            if tipo_param:
-                base_qs = base_qs.filter(tipo_visita=tipo_param)
-            if referir_param:
-                base_qs = base_qs.filter(referir_a=referir_param)
-
-            total = base_qs.count()
+            total = por_dia.get(dia, 0)
             datos.append({
                 'fecha': dia.strftime('%Y-%m-%d'),
                 'label': dia.strftime('%d/%m'),
                 'visitas': total
             })
 
-        return Response({
+        return {
             'success': True,
             'dias': dias,
             'datos': datos
-        })
+        }
 
 class ReporteEstadisticasView(APIView):
+    @cachear_respuesta
     def get(self, request):
-        fecha_actual = timezone.now()
-
-        # aceptar filtros opcionales para estadísticas
-        municipio_param = request.GET.get('municipio')
-        tipo_param = request.GET.get('tipo_visita')
-        referir_param = request.GET.get('referir_a')
-
-        # Base queryset con filtros aplicados
-        base_qs = Visitante.objects.all()
-        if municipio_param:
-            base_qs = base_qs.filter(municipio__icontains=municipio_param)
-        if tipo_param:
-            base_qs = base_qs.filter(tipo_visita=tipo_param)
-        if referir_param:
-            base_qs = base_qs.filter(referir_a=referir_param)
-
-        # 1. CALCULAR PROMEDIO DESDE PRIMERA VISITA (sobre la muestra filtrada)
-        primera_visita = base_qs.order_by('fecha_hora_ingreso').first()
-        if not primera_visita:
-            return Response({
-                'success': True,
-                'total_visitas': 0,
-                'promedio_diario': 0,
-                'tramite_mas_comun': 'No disponible',
-                'porcentaje_completados': 0,
-                'municipio_mas_visitado': 'No disponible',
-                'mensaje': 'No hay visitas registradas en el periodo/filtro seleccionado'
-            })
+        # aceptar filtros opcionales para estadísticas (municipio, tipo_visita, referir_a)
+        return Response(ContextoReporte(request.GET).estadisticas())
 
-        primera_fecha = primera_visita.fecha_hora_ingreso.date()
-        hoy = fecha_actual.date()
-        dias_transcurridos = (hoy - primera_fecha).days + 1
-        if dias_transcurridos < 1:
-            dias_transcurridos = 1
+class ExportarReportePDFView(APIView):
+    @cache_reportes.con_cache_de_archivo('pdf', documentos.CONTENT_TYPE_PDF)
+    def get(self, request):
+        try:
+            contenido, nombre, content_type = documentos.generar_pdf(request.GET, usuario_actual(request))
+        except Exception as e:
+            # Fallback: return simple text response if generation fails
+            logger.exception('Error generando PDF: %s', e)
+            return HttpResponse(f"Error generando PDF: {e}", status=500)
+        return respuesta_descarga(contenido, nombre, content_type)
 
-        total_visitas = base_qs.count()
-        promedio_diario = total_visitas / dias_transcurridos if dias_transcurridos > 0 else 0
+class ExportarReporteExcelView(APIView):
+    @cache_reportes.con_cache_de_archivo('excel', documentos.CONTENT_TYPE_EXCEL)
+    def get(self, request):
+        contenido, nombre, content_type = documentos.generar_excel(request.GET, usuario_actual(request))
+        return respuesta_descarga(contenido, nombre, content_type)
 
-        tramite_mas_comun_data = base_qs.values('tipo_visita').annotate(count=Count('id')).order_by('-count').first()
-        tramite_mas_comun = tramite_mas_comun_data['tipo_visita'] if tramite_mas_comun_data else 'No disponible'
 
-        completados_total = base_qs.filter(atencion_completada=True).count()
-        porcentaje_completados = round((completados_total / total_visitas) * 100, 2) if total_visitas > 0 else 0.0
+def respuesta_descarga(contenido, nombre, content_type):
+    response = HttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
 
-        try:
-            municipio_mas_visitado_data = base_qs.exclude(municipio__isnull=True).exclude(municipio='').values('municipio').annotate(count=Count('id')).order_by('-count').first()
-            municipio = municipio_mas_visitado_data['municipio'] if municipio_mas_visitado_data else 'No disponible'
-        except:
-            municipio = 'No disponible'
 
-        
+class ExportarVisitantesView(APIView):
+    """Exporta los registros de visitantes, fila a fila, en CSV o XLSX.
+
+    Acepta los mismos filtros que /api/visitantes/ más ?desde= y ?hasta=
+    (AAAA-MM-DD, inclusivos). ?formato=csv (por defecto) o xlsx.
+    """
+    def get(self, request):
+        formato = request.GET.get('formato', 'csv').lower()
+        if formato not in ('csv', 'xlsx'):
+            return Response({'error': 'formato debe ser csv o xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = filtrar_listado(Visitante.objects.all(), request.GET)
         try:
-            parroquia_mas_visitada_data = base_qs.exclude(parroquia__isnull=True).exclude(parroquia='').values('parroquia').annotate(count=Count('id')).order_by('-count').first()
-            parroquia = parroquia_mas_visitada_data['parroquia'] if parroquia_mas_visitada_data else 'No disponible'
-        except:
-            parroquia = 'No disponible'
+            desde = parse_date(request.GET['desde']) if request.GET.get('desde') else None
+            hasta = parse_date(request.GET['hasta']) if request.GET.get('hasta') else None
+        except ValueError:
+            desde = hasta = None
+        if (request.GET.get('desde') and not desde) or (request.GET.get('hasta') and not hasta):
+            return Response({'error': 'Fechas inválidas, use AAAA-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if desde:
+            queryset = queryset.filter(fecha_hora_ingreso__gte=medianoche_local(desde))
+        if hasta:
+            queryset = queryset.filter(fecha_hora_ingreso__lt=medianoche_local(hasta + timedelta(days=1)))
+
+        nombre = f"visitantes_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+        if formato == 'csv':
+            response = StreamingHttpResponse(
+                exportacion.generar_csv(queryset), content_type='text/csv; charset=utf-8'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+            return response
+
+        if openpyxl is None:
+            return Response({'error': 'openpyxl no está instalado'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        return FileResponse(
+            exportacion.escribir_xlsx(queryset, openpyxl),
+            as_attachment=True,
+            filename=nombre,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+def jobs_del_usuario(request):
+    """Jobs que puede ver quien hace la petición: los suyos, o todos si es administrador."""
+    if request.user and request.user.is_staff:
+        return ReporteJob.objects.all()
+    return ReporteJob.objects.filter(solicitado_por=usuario_actual(request) or '')
+
+
+class ReporteJobListView(APIView):
+    """Encola reportes PDF/Excel para generarlos en segundo plano y lista los recientes del usuario.
+
+    POST {"tipo": "pdf"|"excel", "parametros": {"periodo": "mes", ...}} responde
+    202 con el job; luego se consulta /reportes/jobs/<id>/ hasta que esté COMPLETADO.
+    """
+    def get(self, request):
+        recientes = jobs_del_usuario(request)[:20]
+        return Response(ReporteJobSerializer(recientes, many=True, context={'request': request}).data)
 
-        tipos_tramite_count = base_qs.values('tipo_visita').distinct().count()
-        activos = base_qs.filter(atencion_completada=False).count()
+    def post(self, request):
+        tipo = request.data.get('tipo')
+        if tipo not in jobs.TIPOS:
+            return Response({'error': 'tipo debe ser pdf o excel'}, status=status.HTTP_400_BAD_REQUEST)
+        parametros = request.data.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            return Response({'error': 'parametros debe ser un objeto'}, status=status.HTTP_400_BAD_REQUEST)
+        # Se guardan como los recibiría la vista de exportación en la query string
+        parametros = {str(k): str(v) for k, v in parametros.items() if v is not None}
+
+        job = jobs.encolar(tipo, parametros, usuario_actual(request))
+        return Response(ReporteJobSerializer(job, context={'request': request}).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class ReporteJobDetalleView(APIView):
+    def get(self, request, pk):
+        # Los jobs de otro usuario se responden como inexistentes
+        job = jobs_del_usuario(request).filter(pk=pk).first()
+        if job is None:
+            return Response({'error': 'Reporte no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ReporteJobSerializer(job, context={'request': request}).data)
+
+
+class ReporteJobDescargaView(APIView):
+    def get(self, request, pk):
+        job = jobs_del_usuario(request).filter(pk=pk).first()
+        if job is None:
+            return Response({'error': 'Reporte no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        if job.estado != ReporteJob.COMPLETADO:
+            return Response({'error': 'El reporte aún no está listo', 'estado': job.estado},
+                            status=status.HTTP_409_CONFLICT)
+        if not os.path.exists(job.archivo):
+            return Response({'error': 'El archivo del reporte ya no existe'}, status=status.HTTP_410_GONE)
+        return FileResponse(open(job.archivo, 'rb'), as_attachment=True,
+                            filename=job.nombre_archivo, content_type=job.content_type or None)
+
+
+class CacheEstadisticasView(APIView):
+    """Aciertos, fallos y latencia de la caché de respuestas (solo administradores)."""
+    permission_classes = [IsAdminUser]
 
+    def get(self, request):
         return Response({
-            'success': True,
-            'total_visitas': total_visitas,
-            'visitas_completadas': completados_total,
-            'visitas_pendientes': total_visitas - completados_total,
-            'visitas_activas': activos,
-            'promedio_diario': round(promedio_diario, 2),
-            'tramite_mas_comun': tramite_mas_comun,
-            'porcentaje_completados': porcentaje_completados,
-            'municipio_mas_visitado': municipio,
-            'parroquia_mas_visitada': parroquia,
-            'tipos_tramite_diferentes': tipos_tramite_count,
-            'dias_transcurridos': dias_transcurridos,
-            'primera_visita_fecha': primera_fecha.strftime('%d/%m/%Y'),
-            'hoy': hoy.strftime('%d/%m/%Y'),
-            '_formula_promedio': f"{total_visitas} visitas / {dias_transcurridos} días = {round(promedio_diario, 2)}",
-            '_muestra_tramites': base_qs.values('tipo_visita').annotate(count=Count('id')).order_by('-count')[:5]
+            'backend': settings.CACHE_RESPUESTAS,
+            'ttl': settings.CACHE_RESPUESTAS_TTL,
+            'generacion': generacion(),
+            'vistas': estadisticas_respuestas.resumen(),
+            'reportes_archivos': reportes_archivos_cache.estadisticas(),
+            'eventos': eventos.difusor.estadisticas(),
         })
 
-class ExportarReportePDFView(APIView):
-    def get(self, request):
-        periodo = request.GET.get('periodo', 'mes')
 
-        # Preparar respuesta
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_{periodo}_{datetime.now().strftime("%Y%m%d")}.pdf"'
-
-        buffer = BytesIO()
-
-        # Usar Platypus para estructura profesional
-        doc = SimpleDocTemplate(buffer, pagesize=letter,
-                                rightMargin=40, leftMargin=40,
-                                topMargin=60, bottomMargin=40)
-        styles = getSampleStyleSheet()
-        styleH = ParagraphStyle('Heading', parent=styles['Heading1'], fontSize=14, leading=18)
-        styleN = ParagraphStyle('Normal', parent=styles['Normal'], fontSize=10, leading=14)
-
-        elements = []
-
-        # Portada con líneas exactas solicitadas
-        cover_style = ParagraphStyle('Cover', parent=styles['Title'], alignment=1, fontSize=14, leading=18)
-        cover_lines = [
-            'REPUBLICA BOLIVARIANA DE VENEZUELA',
-            'TRIBUNAL SUPREMO DE JUSTICIA',
-            'DIRECCION EJECUTIVA DE LA MAGISTRATURA',
-            'EQUIPO DE JUSTICIA SOCIAL',
-            'BARQUISIMETO-ESTADO LARA'
-        ]
-        elements.append(Spacer(1, 40))
-        for line in cover_lines:
-            elements.append(Paragraph(line, cover_style))
-            elements.append(Spacer(1, 6))
-        # Subtítulo con período y fecha de generación
-        subtitle = Paragraph(f'Reporte de Visitas - Período: {periodo}', ParagraphStyle('Subtitle', parent=styles['Normal'], alignment=1, fontSize=11))
-        genDate = Paragraph(f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}', ParagraphStyle('GenDate', parent=styles['Normal'], alignment=1, fontSize=9))
-        # Detectar usuario que generó el reporte
-        usuario = None
-        if hasattr(request, 'user') and request.user and request.user.is_authenticated:
-            usuario = request.user.get_full_name() or request.user.username
-        else:
-            usuario = request.headers.get('X-Usuario') or request.META.get('HTTP_X_USUARIO')
-        genUser = Paragraph(f'Generado por: {usuario}' if usuario else 'Generado por: Usuario no identificado', ParagraphStyle('GenUser', parent=styles['Normal'], alignment=1, fontSize=9))
-        elements.extend([Spacer(1, 12), subtitle, Spacer(1, 6), genDate, Spacer(1,4), genUser, PageBreak()])
-
-        # En lugar de tabla de contenidos, colocamos directamente las secciones
-        # Todas las tablas se agregarán en la misma hoja (sin saltos de página entre ellas)
-
-        # Estadísticas principales (diseño más profesional)
-        elements.append(Paragraph('Estadísticas Principales', styleH))
-        stats_view = ReporteEstadisticasView()
-        stats_response = stats_view.get(request)
-        stats_data = stats_response.data if getattr(stats_response, 'data', None) is not None else {}
-
-        stats_table_data = []
-        stats_rows = [
-            ('Total visitas', stats_data.get('total_visitas', 0)),
-            ('Promedio diario', stats_data.get('promedio_diario', 0)),
-            ('Trámite más común', stats_data.get('tramite_mas_comun', 'N/A')),
-            ('Porcentaje completados', f"{stats_data.get('porcentaje_completados', 0)}%"),
-            ('Municipio más visitado', stats_data.get('municipio_mas_visitado', 'N/A')),
-        ]
+class RendererEventos(BaseRenderer):
+    """Acepta 'Accept: text/event-stream' (EventSource); los errores salen como evento 'error'."""
+    media_type = 'text/event-stream'
+    format = 'sse'
 
-        # Crear filas con clave en negrita y valor alineado a la izquierda
-        for k, v in stats_rows:
-            stats_table_data.append([Paragraph(f'<b>{k}</b>', styleN), Paragraph(str(v), styleN)])
-
-        t = Table(stats_table_data, colWidths=[240, 260], hAlign='LEFT')
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (0,-1), colors.HexColor('#F3F6FA')),
-            ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#D6DCE6')),
-            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-            ('LEFTPADDING', (0,0), (-1,-1), 8),
-            ('RIGHTPADDING', (0,0), (-1,-1), 8),
-            ('TOPPADDING', (0,0), (-1,-1), 6),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-        ]))
-        elements.extend([Spacer(1,8), t, Spacer(1,12)])
-
-        # Distribución por trámite
-        elements.append(Paragraph('Distribución por Trámite', styleH))
-        tramites_view = ReporteTramitesView()
-        tramites_response = tramites_view.get(request)
-        tramites_data = tramites_response.data if getattr(tramites_response, 'data', None) is not None else {'datos': []}
-        tramites_table = [[ 'Trámite', 'Cantidad', 'Completados', '% Completados' ]]
-        for tr in tramites_data.get('datos', []):
-            tramites_table.append([ tr.get('nombre',''), tr.get('cantidad',0), tr.get('completados',0), tr.get('porcentaje_completados','') ])
-        if len(tramites_table) == 1:
-            tramites_table.append(['No hay datos', '', '', ''])
-
-        tt = Table(tramites_table, colWidths=[260, 80, 80, 80], hAlign='LEFT')
-        tt.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2C7857')),
-            ('TEXTCOLOR',(0,0),(-1,0),colors.white),
-            ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#D6DCE6')),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('ALIGN',(1,1),(-1,-1),'CENTER'),
-            ('LEFTPADDING', (0,0), (-1,-1), 6),
-            ('RIGHTPADDING', (0,0), (-1,-1), 6),
-        ]))
-        elements.extend([Spacer(1,6), tt, Spacer(1,12)])
-
-        # Visitas mensuales
-        elements.append(Paragraph('Visitas Mensuales', styleH))
-        mensual_view = ReporteVisitasMensualesView()
-        mensual_response = mensual_view.get(request)
-        mensual_data = mensual_response.data if getattr(mensual_response, 'data', None) is not None else {'datos': []}
-        mensual_table = [[ 'Mes', 'Visitas', 'Completados' ]]
-        for m in mensual_data.get('datos', []):
-            mensual_table.append([ m.get('mes',''), m.get('total_visitas', m.get('visitas',0)), m.get('completados',0) ])
-        if len(mensual_table) == 1:
-            mensual_table.append(['No hay datos', '', ''])
-
-        mt = Table(mensual_table, colWidths=[200, 160, 160], hAlign='LEFT')
-        mt.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2B6CE4')),
-            ('TEXTCOLOR',(0,0),(-1,0),colors.white),
-            ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#D6DCE6')),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('ALIGN',(1,1),(-1,-1),'CENTER'),
-            ('LEFTPADDING', (0,0), (-1,-1), 6),
-            ('RIGHTPADDING', (0,0), (-1,-1), 6),
-        ]))
-        elements.extend([Spacer(1,6), mt, Spacer(1,12)])
-
-        # Agregar firmas al final de la misma hoja (dos bloques lado a lado)
-        elements.append(Spacer(1, 18))
-        sign_table_data = [
-            ['_______________________________', '_______________________________'],
-            ['Coordinadora de Equipo de Justicia Social', 'Directora Administrativa Regional']
-        ]
-        sign_table = Table(sign_table_data, colWidths=[260, 260], hAlign='CENTER')
-        sign_table.setStyle(TableStyle([
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,1), (-1,1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0,0), (-1,-1), 11),
-            ('TOPPADDING', (0,0), (-1,-1), 12),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-        ]))
-        elements.append(sign_table)
-        elements.append(Spacer(1, 18))
-        elements.append(Paragraph('Fin del reporte', styleN))
-
-        # Build PDF
-        try:
-            doc.build(elements)
-            pdf = buffer.getvalue()
-            buffer.close()
-            response.write(pdf)
-            return response
-        except Exception as e:
-            # Fallback: return simple text response if generation fails
-            logger.exception('Error generando PDF: %s', e)
-            buffer.close()
-            return HttpResponse(f"Error generando PDF: {e}", status=500)
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return eventos.mensaje('error', data)
+
+
+class EventosView(APIView):
+    """Altas, salidas y contadores del dashboard en vivo (Server-Sent Events, ver eventos.py).
+
+    Cada conexión ocupa un hilo del servidor mientras está abierta: pasado
+    EVENTOS_MAX_FLUJOS se responde 503 y el cliente sigue consultando como antes.
+    """
+    renderer_classes = [JSONRenderer, RendererEventos]
 
-class ExportarReporteExcelView(APIView):
     def get(self, request):
-        periodo = request.GET.get('periodo', 'mes')
-        
-        # Obtener datos
-        tramites_view = ReporteTramitesView()
-        tramites_response = tramites_view.get(request)
-        tramites_data = tramites_response.data if tramites_response.status_code == 200 else {'datos': []}
-        
-        mensual_view = ReporteVisitasMensualesView()
-        mensual_response = mensual_view.get(request)
-        mensual_data = mensual_response.data if mensual_response.status_code == 200 else {'datos': []}
-        
-        stats_view = ReporteEstadisticasView()
-        stats_response = stats_view.get(request)
-        stats_data = stats_response.data if stats_response.status_code == 200 else {}
-        
-        # Crear DataFrames de pandas
-        df_tramites = pd.DataFrame(tramites_data.get('datos', []))
-        df_mensual = pd.DataFrame(mensual_data.get('datos', []))
-        
-        # Crear archivo Excel en memoria
-        output = BytesIO()
-        
-        try:
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                # Hoja de resumen
-                df_resumen = pd.DataFrame([{
-                    'Total Visitas': stats_data.get('total_visitas', 0),
-                    'Promedio Diario': stats_data.get('promedio_diario', 0),
-                    'Trámite más Común': stats_data.get('tramite_mas_comun', ''),
-                    'Porcentaje Completados': f"{stats_data.get('porcentaje_completados', 0)}%",
-                    'Municipio más Visitado': stats_data.get('municipio_mas_visitado', ''),
-                    # 'Hora Pico' removed per request
-                    'Período Reporte': periodo
-                }])
-                df_resumen.to_excel(writer, sheet_name='Resumen', index=False)
-                
-                # Hoja de trámites
-                if not df_tramites.empty:
-                    df_tramites.to_excel(writer, sheet_name='Trámites', index=False)
-                
-                # Hoja mensual
-                if not df_mensual.empty:
-                    df_mensual.to_excel(writer, sheet_name='Visitas Mensuales', index=False)
-                
-                # Hoja de metadata
-                df_metadata = pd.DataFrame([{
-                    'Período': periodo,
-                    'Fecha Generación': datetime.now().strftime('%d/%m/%Y %H:%M'),
-                    'Generado por': (request.user.get_full_name() or request.user.username) if hasattr(request, 'user') and request.user.is_authenticated else (request.headers.get('X-Usuario') or request.META.get('HTTP_X_USUARIO') or ''),
-                    'Total Registros': len(df_tramites) + len(df_mensual)
-                }])
-                df_metadata.to_excel(writer, sheet_name='Metadata', index=False)
-                # Hoja de firmas (en Excel para impresión)
-                df_firmas = pd.DataFrame({
-                    'Coordinadora': [''],
-                    'Directora Administrativa Regional': ['']
-                })
-                df_firmas.to_excel(writer, sheet_name='Firmas', index=False)
-
-                # Mejoras de formato si openpyxl está disponible
-                try:
-                    if openpyxl is not None and get_column_letter is not None:
-                        wb = writer.book
-                        # Formato resumen
-                        ws_res = writer.sheets.get('Resumen') or wb['Resumen']
-                        # Ajustar anchos de columna
-                        for i, col in enumerate(df_resumen.columns, 1):
-                            ws_res.column_dimensions[get_column_letter(i)].width = max(15, len(col) + 6)
-                        # Encabezados en negrita
-                        if Font is not None:
-                            for cell in ws_res[1]:
-                                cell.font = Font(bold=True)
-
-                        # Formato trámites
-                        if not df_tramites.empty:
-                            ws_tr = writer.sheets.get('Trámites') or wb['Trámites']
-                            for i, col in enumerate(df_tramites.columns, 1):
-                                ws_tr.column_dimensions[get_column_letter(i)].width = max(12, len(str(col)) + 6)
-                            for cell in ws_tr[1]:
-                                cell.font = Font(bold=True)
-
-                        # Formato mensual
-                        if not df_mensual.empty:
-                            ws_m = writer.sheets.get('Visitas Mensuales') or wb['Visitas Mensuales']
-                            for i, col in enumerate(df_mensual.columns, 1):
-                                ws_m.column_dimensions[get_column_letter(i)].width = max(12, len(str(col)) + 6)
-                            for cell in ws_m[1]:
-                                cell.font = Font(bold=True)
-
-                        # Hoja firmas: ajustar ancho y centrar texto
-                        ws_f = writer.sheets.get('Firmas') or wb['Firmas']
-                        ws_f.column_dimensions[get_column_letter(1)].width = 40
-                        ws_f.column_dimensions[get_column_letter(2)].width = 40
-                        for cell in ws_f[1]:
-                            cell.font = Font(bold=False)
-                        # Poner líneas de firma como texto grande
-                        ws_f.cell(row=1, column=1).value = '_______________________________'
-                        ws_f.cell(row=1, column=2).value = '_______________________________'
-                        ws_f.cell(row=2, column=1).value = 'Coordinadora de Equipo de Justicia Social'
-                        ws_f.cell(row=2, column=2).value = 'Directora Administrativa Regional'
-                except Exception as fe:
-                    # Si falla el formateo con openpyxl, seguir sin formato
-                    logger.warning('No se pudo aplicar formato Excel (openpyxl): %s', fe)
-            
-            output.seek(0)
-            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            filename = f"reporte_{periodo}_{datetime.now().strftime('%Y%m%d')}.xlsx"
-            
-        except Exception as e:
-            # Fallback simple si hay error con pandas
-            output = BytesIO()
-            output.write(b"Reporte generado el " + datetime.now().strftime('%d/%m/%Y %H:%M').encode())
-            output.write(b"\nPeriodo: " + periodo.encode())
-            output.seek(0)
-            content_type = 'text/plain'
-            filename = f"reporte_{periodo}_{datetime.now().strftime('%Y%m%d')}.txt"
-        
-        # Preparar respuesta
-        response = HttpResponse(output.getvalue(), content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
-    
-    # ========== VISTA PARA REPORTE DE REFERIDOS ==========
+        suscripcion = eventos.difusor.suscribir(limite=settings.EVENTOS_MAX_FLUJOS)
+        if suscripcion is None:
+            response = Response({'error': 'Demasiadas conexiones de eventos abiertas'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(settings.EVENTOS_REINTENTO_MS // 1000)
+            return response
+        return respuesta_eventos(eventos.flujo(suscripcion, VisitanteViewSet.contadores_dashboard))
+
+
+def respuesta_eventos(cuerpo):
+    response = StreamingHttpResponse(cuerpo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Que ningún proxy intermedio acumule el flujo
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Nombres legibles de las opciones, resueltos una vez al importar
+NOMBRES_INSTITUCION = dict(Visitante.INSTITUCION_CHOICES)
+NOMBRES_TIPO_VISITA = dict(Visitante.TIPO_VISITA_CHOICES)
+
+# ========== VISTA PARA REPORTE DE REFERIDOS ==========
 
 class ReporteReferidosView(APIView):
+    @cachear_respuesta
     def get(self, request):
         periodo = request.GET.get('periodo', 'mes')
         
         # Calcular fecha de inicio según el período
-        fecha_actual = timezone.now()
-        if periodo == 'hoy':
-            fecha_inicio = fecha_actual.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif periodo == 'semana':
-            fecha_inicio = fecha_actual - timedelta(days=7)
-        elif periodo == 'mes':
-            fecha_inicio = fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        elif periodo == 'trimestre':
-            fecha_inicio = fecha_actual - timedelta(days=90)
-        elif periodo == 'anio':
-            fecha_inicio = fecha_actual.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            fecha_inicio = fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # filtros opcionales
-        municipio_param = request.GET.get('municipio')
-        tipo_param = request.GET.get('tipo_visita')
-        referir_param = request.GET.get('referir_a')
-
-        # 1. Obtener total de visitantes en el período (aplicar filtros si existen)
-        base_total = Visitante.objects.filter(fecha_hora_ingreso__gte=fecha_inicio)
-        if municipio_param:
-            base_total = base_total.filter(municipio__icontains=municipio_param)
-        if tipo_param:
-            base_total = base_total.filter(tipo_visita=tipo_param)
-        if referir_param:
-            base_total = base_total.filter(referir_a=referir_param)
-
-        total_visitantes = base_total.count()
-
-        # 2. Obtener visitantes referidos (excluyendo 'NO_REFERIDO')
-        visitantes_referidos = Visitante.objects.filter(fecha_hora_ingreso__gte=fecha_inicio).exclude(referir_a='NO_REFERIDO')
-        if municipio_param:
-            visitantes_referidos = visitantes_referidos.filter(municipio__icontains=municipio_param)
-        if tipo_param:
-            visitantes_referidos = visitantes_referidos.filter(tipo_visita=tipo_param)
-        if referir_param:
-            visitantes_referidos = visitantes_referidos.filter(referir_a=referir_param)
+        fecha_actual = timezone.localtime()
+        fecha_inicio = fecha_inicio_periodo(periodo, fecha_actual)
         
-        total_referidos = visitantes_referidos.count()
+        # filtros opcionales (municipio, tipo_visita, referir_a)
+        params = request.GET
+
+        # 1-2. Una sola consulta agrupada por (institución, trámite): de ella salen los
+        # totales, los referidos por institución y los trámites más comunes de cada una
+        grupos = conteos(params, desde=fecha_inicio, campos=['referir_a', 'tipo_visita'])
+        total_visitantes = sum(g['total'] for g in grupos)
+        total_referidos = sum(g['referidos'] for g in grupos)
         
         # 3. Calcular porcentaje de referidos
         if total_visitantes > 0:
@@ -828,20 +689,30 @@ class ReporteReferidosView(APIView):
             porcentaje_referidos = 0.0
         
         # 4. Agrupar por institución
-        instituciones_data = visitantes_referidos.values('referir_a').annotate(
-            total_referidos=Count('id'),
-            tramites_comunes=Count('tipo_visita', distinct=True)
-        ).order_by('-total_referidos')
+        por_institucion = {}
+        for grupo in grupos:
+            if grupo['referir_a'] != 'NO_REFERIDO':
+                por_institucion.setdefault(grupo['referir_a'], []).append(grupo)
+        instituciones_data = sorted(
+            (
+                {'referir_a': referir_a, 'total': sum(t['total'] for t in tramites), 'tramites': tramites}
+                for referir_a, tramites in por_institucion.items()
+            ),
+            key=lambda i: i['total'], reverse=True
+        )
         
         # 5. Transformar datos para el frontend
         instituciones_formateadas = []
         for inst in instituciones_data:
             # Obtener nombre legible de la institución
-            nombre_institucion = dict(Visitante.INSTITUCION_CHOICES).get(inst['referir_a'], inst['referir_a'])
+            nombre_institucion = NOMBRES_INSTITUCION.get(inst['referir_a'], inst['referir_a'])
             
             # Para OTRA_INSTITUCION, obtener el valor específico
             if inst['referir_a'] == 'OTRA_INSTITUCION':
-                # Obtener las otras instituciones especificadas
+                # otra_institucion no forma parte del rollup: se consulta sobre Visitante
+                visitantes_referidos = filtrar_visitantes(
+                    Visitante.objects.filter(fecha_hora_ingreso__gte=fecha_inicio), params
+                )
                 otras_instituciones = visitantes_referidos.filter(
                     referir_a='OTRA_INSTITUCION'
                 ).values('otra_institucion').annotate(
@@ -851,25 +722,21 @@ class ReporteReferidosView(APIView):
                 nombre_institucion = "Otras Instituciones"
                 tramites_list = [item['otra_institucion'] for item in otras_instituciones if item['otra_institucion']]
             else:
-                # Obtener trámites más comunes para esta institución
-                tramites_comunes = visitantes_referidos.filter(
-                    referir_a=inst['referir_a']
-                ).values('tipo_visita').annotate(
-                    count=Count('id')
-                ).order_by('-count')[:3]
+                # Trámites más comunes para esta institución
+                tramites_comunes = sorted(inst['tramites'], key=lambda t: t['total'], reverse=True)[:3]
                 
-                tramites_list = [dict(Visitante.TIPO_VISITA_CHOICES).get(t['tipo_visita'], t['tipo_visita']) 
+                tramites_list = [NOMBRES_TIPO_VISITA.get(t['tipo_visita'], t['tipo_visita'])
                                for t in tramites_comunes]
             
-            if inst['total_referidos'] > 0:
-                porcentaje = round((inst['total_referidos'] / total_referidos) * 100, 2) if total_referidos > 0 else 0
+            if inst['total'] > 0:
+                porcentaje = round((inst['total'] / total_referidos) * 100, 2) if total_referidos > 0 else 0
             else:
                 porcentaje = 0.0
             
             instituciones_formateadas.append({
                 'institucion': nombre_institucion,
                 'codigo_institucion': inst['referir_a'],
-                'total_referidos': inst['total_referidos'],
+                'total_referidos': inst['total'],
                 'porcentaje': porcentaje,
                 'tramites_comunes': tramites_list[:3]  # Máximo 3 trámites
             })
@@ -895,97 +762,118 @@ class ReporteReferidosView(APIView):
 # ========== VISTA PARA ESTADÍSTICAS DE REFERIDOS ==========
 
 class EstadisticasReferidosView(APIView):
+    @cachear_respuesta
     def get(self, request):
         """Estadísticas específicas de referidos para dashboard"""
-        fecha_actual = timezone.now()
-        
-        # Estadísticas de hoy
-        inicio_hoy = fecha_actual.replace(hour=0, minute=0, second=0, microsecond=0)
-        referidos_hoy = Visitante.objects.filter(
-            fecha_hora_ingreso__gte=inicio_hoy
-        ).exclude(referir_a='NO_REFERIDO').count()
-        
-        total_hoy = Visitante.objects.filter(
-            fecha_hora_ingreso__gte=inicio_hoy
-        ).count()
-        
-        # Estadísticas de la semana
-        inicio_semana = fecha_actual - timedelta(days=7)
-        referidos_semana = Visitante.objects.filter(fecha_hora_ingreso__gte=inicio_semana).exclude(referir_a='NO_REFERIDO').count()
-        
-        total_semana = Visitante.objects.filter(
-            fecha_hora_ingreso__gte=inicio_semana
-        ).count()
-        
-        # Estadísticas del mes
-        inicio_mes = fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        referidos_mes = Visitante.objects.filter(fecha_hora_ingreso__gte=inicio_mes).exclude(referir_a='NO_REFERIDO').count()
-        
-        total_mes = Visitante.objects.filter(
-            fecha_hora_ingreso__gte=inicio_mes
-        ).count()
-        
-        # Instituciones más frecuentes (top 5)
-        instituciones_top = Visitante.objects.exclude(referir_a='NO_REFERIDO').values('referir_a').annotate(
-            total=Count('id')
-        ).order_by('-total')[:5]
-        
-        instituciones_top_formateadas = []
-        for inst in instituciones_top:
-            nombre = dict(Visitante.INSTITUCION_CHOICES).get(inst['referir_a'], inst['referir_a'])
-            instituciones_top_formateadas.append({
-                'institucion': nombre,
-                'total': inst['total'],
-                'codigo': inst['referir_a']
-            })
-        
-        # Calcular porcentajes
-        porcentaje_hoy = round((referidos_hoy / total_hoy * 100), 2) if total_hoy > 0 else 0
-        porcentaje_semana = round((referidos_semana / total_semana * 100), 2) if total_semana > 0 else 0
-        porcentaje_mes = round((referidos_mes / total_mes * 100), 2) if total_mes > 0 else 0
-        
+        fecha_actual = timezone.localtime()
         return Response({
             'success': True,
-            'estadisticas': {
-                'hoy': {
-                    'referidos': referidos_hoy,
-                    'total': total_hoy,
-                    'porcentaje': porcentaje_hoy
-                },
-                'semana': {
-                    'referidos': referidos_semana,
-                    'total': total_semana,
-                    'porcentaje': porcentaje_semana
-                },
-                'mes': {
-                    'referidos': referidos_mes,
-                    'total': total_mes,
-                    'porcentaje': porcentaje_mes
-                },
-                'total_general': Visitante.objects.filter(referir_a__ne='NO_REFERIDO').count(),
-                'instituciones_top': instituciones_top_formateadas
-            },
+            'estadisticas': self._calcular(fecha_actual),
             'periodo_actual': fecha_actual.strftime('%Y-%m-%d %H:%M:%S')
         })
+
+    @classmethod
+    def _calcular(cls, fecha_actual):
+        """Hoy, últimos 7 días, mes, total general y top 5 de instituciones.
+
+        Una consulta agrupada por institución sobre el rollup, con una suma
+        filtrada por ventana, da todos los conteos; solo el tramo parcial del
+        primer día de la ventana móvil de 7 días se cuenta sobre Visitante.
+        """
+        por_institucion, tramo, agregados_tramo = cls._consultas(fecha_actual)
+        return cls._resumir(list(por_institucion), tramo.aggregate(**agregados_tramo))
+
+    @staticmethod
+    def _consultas(fecha_actual):
+        """(conteos por institución, queryset del tramo parcial, agregados del tramo)."""
+        hoy = fecha_actual.date()
+        inicio_semana = fecha_actual - timedelta(days=7)
+        primer_dia_semana = inicio_semana.date() + timedelta(days=1)
+
+        por_institucion = VisitaRollupDiario.objects.values('referir_a').annotate(
+            general=Sum('total'),
+            hoy=Sum('total', filter=Q(fecha__gte=hoy)),
+            semana=Sum('total', filter=Q(fecha__gte=primer_dia_semana)),
+            mes=Sum('total', filter=Q(fecha__gte=hoy.replace(day=1))),
+        ).order_by()
+        tramo = Visitante.objects.filter(
+            fecha_hora_ingreso__gte=inicio_semana,
+            fecha_hora_ingreso__lt=medianoche_local(primer_dia_semana),
+        )
+        return por_institucion, tramo, {
+            'total': Count('id'),
+            'referidos': Count('id', filter=~Q(referir_a='NO_REFERIDO')),
+        }
+
+    @staticmethod
+    def _resumir(por_institucion, tramo_semana):
+        periodos = {
+            'hoy': {'referidos': 0, 'total': 0},
+            'semana': tramo_semana,
+            'mes': {'referidos': 0, 'total': 0},
+            'general': {'referidos': 0, 'total': 0},
+        }
+        instituciones = []
+        for fila in por_institucion:
+            referida = fila['referir_a'] != 'NO_REFERIDO'
+            for nombre, conteo in periodos.items():
+                valor = fila[nombre] or 0
+                conteo['total'] += valor
+                if referida:
+                    conteo['referidos'] += valor
+            if referida and fila['general']:
+                instituciones.append(fila)
+
+        # Instituciones más frecuentes (top 5)
+        instituciones_top = sorted(instituciones, key=lambda i: i['general'], reverse=True)[:5]
+
+        def resumen(conteo):
+            total = conteo['total']
+            porcentaje = round((conteo['referidos'] / total * 100), 2) if total > 0 else 0
+            return {'referidos': conteo['referidos'], 'total': total, 'porcentaje': porcentaje}
+
+        return {
+            'hoy': resumen(periodos['hoy']),
+            'semana': resumen(periodos['semana']),
+            'mes': resumen(periodos['mes']),
+            'total_general': periodos['general']['referidos'],
+            'instituciones_top': [
+                {
+                    'institucion': NOMBRES_INSTITUCION.get(inst['referir_a'], inst['referir_a']),
+                    'total': inst['general'],
+                    'codigo': inst['referir_a']
+                }
+                for inst in instituciones_top
+            ]
+        }
     
 # ========== VISTAS PARA OPCIONES ==========
 
 class OpcionesTipoVisitaView(APIView):
     """Vista para obtener las opciones de tipo de visita"""
+    @cachear_respuesta
     def get(self, request):
         return Response(Visitante.TIPO_VISITA_CHOICES)
 
 class OpcionesInstitucionesView(APIView):
     """Vista para obtener las opciones de instituciones"""
+    @cachear_respuesta
     def get(self, request):
         return Response(Visitante.INSTITUCION_CHOICES)
 
 
 class OpcionesMunicipiosView(APIView):
-    """Vista para obtener la lista de municipios únicos"""
+    """Lista de municipios del catálogo, desde memoria y con ETag para la caché del navegador"""
     def get(self, request):
-        municipios = Visitante.objects.exclude(municipio__isnull=True).exclude(municipio='').values_list('municipio', flat=True).distinct().order_by('municipio')
-        return Response(list(municipios))
+        municipios, etag = catalogo.municipios()
+        if coincide_etag(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(municipios)
+        response['ETag'] = etag
+        # El navegador puede guardar la lista, pero debe revalidarla en cada uso
+        response['Cache-Control'] = 'no-cache'
+        return response
 
 
 class LoginView(APIView):
@@ -1084,6 +972,19 @@ def version(request):
     return JsonResponse({'version': v})
 
 
+@require_GET
+def salud(request):
+    """Chequeo de salud para el lanzador o un monitor: 200 si la base responde, 503 si no."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError as e:
+        logger.warning('Chequeo de salud: la base no responde: %s', e)
+        return JsonResponse({'estado': 'error', 'base_datos': str(e)}, status=503)
+    return JsonResponse({'estado': 'ok', 'base_datos': 'ok'})
+
+
 @csrf_exempt
 @require_POST
 def update(request):
@@ -1109,8 +1010,9 @@ def update(request):
         except Exception:
             pass
 
-        # Backup DB
+        # Backup DB (en modo WAL los últimos commits pueden estar aún en db.sqlite3-wal)
         if os.path.exists(db_path):
+            sqlite.checkpoint(connection)
             shutil.copy2(db_path, backup_path)
 
         # Download installer to temp if URL provided
@@ -0,0 +1,144 @@
+"""Variantes async de los endpoints de lectura que el dashboard consulta en bucle.
+
+Se sirven solo por el punto de entrada ASGI (RegistroVisitas_Backend/asgi.py,
+con las rutas de RegistroVisitas_Backend/urls_asgi.py), en las mismas URLs
+que sus versiones síncronas de views.py; por WSGI todo sigue igual. Las
+consultas son las mismas (se comparten los métodos que las arman) pero se
+ejecutan con el ORM async (aaggregate, iteración async), y la respuesta se
+renderiza igual que en DRF, así que el JSON no cambia.
+
+DRF no tiene vistas async, por eso la autenticación por token o sesión se
+resuelve aquí (autenticado): como con DRF, un token inválido da 401 aunque
+el endpoint no exija usuario, y otro método que GET da 405 (no 403 de CSRF).
+
+eventos() es el flujo SSE de views.EventosView: por ASGI cada conexión
+abierta espera en el bucle de eventos en lugar de ocupar un hilo.
+"""
+import functools
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from . import catalogo
+from .cache import acachear_respuesta, coincide_etag
+from .eventos import aflujo, difusor
+from .models import Visitante
+from .reportes import medianoche_local
+from .rollups import aconteos
+from .views import EstadisticasReferidosView, ReporteDiarioView, VisitanteViewSet, respuesta_eventos
+
+
+async def _usuario(request):
+    """Usuario como lo resuelven TokenAuthentication y SessionAuthentication; None si el token no vale."""
+    cabecera = request.headers.get('Authorization', '').split()
+    if cabecera and cabecera[0].lower() == 'token':
+        if len(cabecera) != 2:
+            return None
+        token = await Token.objects.select_related('user').filter(key=cabecera[1]).afirst()
+        if token is None or not token.user.is_active:
+            return None
+        return token.user
+    return await request.auser()
+
+
+def autenticado(vista):
+    @functools.wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        usuario = await _usuario(request)
+        if usuario is None:
+            response = HttpResponse(JSONRenderer().render({'detail': 'Invalid token.'}),
+                                    content_type='application/json', status=401)
+            response['WWW-Authenticate'] = 'Token'
+            return response
+        request.usuario_api = usuario
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+@acachear_respuesta
+async def estadisticas(request):
+    agregados = VisitanteViewSet._agregados_estadisticas(timezone.localdate())
+    return VisitanteViewSet._formatear_estadisticas(await Visitante.objects.aaggregate(**agregados))
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+@acachear_respuesta
+async def estadisticas_referidos(request):
+    fecha_actual = timezone.localtime()
+    por_institucion, tramo, agregados_tramo = EstadisticasReferidosView._consultas(fecha_actual)
+    return {
+        'success': True,
+        'estadisticas': EstadisticasReferidosView._resumir(
+            [fila async for fila in por_institucion],
+            await tramo.aaggregate(**agregados_tramo),
+        ),
+        'periodo_actual': fecha_actual.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+@acachear_respuesta
+async def reporte_diario(request):
+    dias = ReporteDiarioView._leer_dias(request.GET)
+    fecha_actual = timezone.localdate()
+    inicio = medianoche_local(fecha_actual - timedelta(days=dias - 1))
+    por_dia = {
+        fila['fecha']: fila['total']
+        for fila in await aconteos(request.GET, desde=inicio, campos=['fecha'])
+    }
+    return ReporteDiarioView._respuesta(fecha_actual, dias, por_dia)
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+@acachear_respuesta
+async def opciones_tipos_visita(request):
+    return Visitante.TIPO_VISITA_CHOICES
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+@acachear_respuesta
+async def opciones_instituciones(request):
+    return Visitante.INSTITUCION_CHOICES
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+async def opciones_municipios(request):
+    # El catálogo vive en memoria; solo tras vencer la caché se lee de la base
+    municipios, etag = await sync_to_async(catalogo.municipios)()
+    if coincide_etag(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(JSONRenderer().render(municipios), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@csrf_exempt
+@require_GET
+@autenticado
+async def eventos(request):
+    # Sin límite de conexiones: esperar eventos no ocupa un hilo
+    suscripcion = difusor.suscribir()
+    return respuesta_eventos(
+        aflujo(suscripcion, sync_to_async(VisitanteViewSet.contadores_dashboard))
+    )
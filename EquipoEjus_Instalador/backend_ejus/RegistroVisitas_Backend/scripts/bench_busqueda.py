@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""Benchmark del parámetro ?search= de /api/visitantes/.
+
+Compara los cinco __icontains anteriores con el índice FTS5. Mide lo que
+ejecuta la paginación: el COUNT y la primera página de 10 resultados.
+
+Uso: python scripts/bench_busqueda.py [filas]   (por defecto 1000000)
+"""
+import sys
+
+import bench_utils
+
+TERMINOS = ['Jose', 'gonz', 'Cabudare', '0414123', '12345', 'maria lopez']
+
+
+def run():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bench_utils.setup()
+    bench_utils.seed(filas)
+
+    from django.db.models import Q
+    from gestion.busqueda import filtrar_busqueda, fts_disponible
+    from gestion.models import Visitante
+
+    if not fts_disponible():
+        print('La base no tiene el índice FTS5 (¿SQLite sin FTS5?)')
+        return
+
+    def icontains(texto):
+        qs = Visitante.objects.filter(
+            Q(nombre__icontains=texto) | Q(cedula__icontains=texto) | Q(telefono__icontains=texto) |
+            Q(municipio__nombre__icontains=texto) | Q(parroquia__nombre__icontains=texto)
+        )
+        return qs.count(), list(qs[:10])
+
+    def fts(texto):
+        qs = filtrar_busqueda(Visitante.objects.all(), texto)
+        return qs.count(), list(qs[:10])
+
+    print(f'{"término":<14} {"icontains ms":>13} {"filas":>8} {"fts ms":>9} {"filas":>8}')
+    for termino in TERMINOS:
+        antes, _ = bench_utils.medir(lambda: icontains(termino), repeticiones=3)
+        despues, _ = bench_utils.medir(lambda: fts(termino), repeticiones=3)
+        print(f'{termino:<14} {antes:>13.1f} {icontains(termino)[0]:>8} {despues:>9.1f} {fts(termino)[0]:>8}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""Benchmark de contención de locks en SQLite: lectores y escritores a la vez.
+
+N procesos lectores consultan los reportes del dashboard (estadísticas,
+reporte diario, referidos) mientras M procesos escritores registran
+entradas de visitantes (POST /api/visitantes/). Se comparan dos perfiles
+sobre la misma base (BENCH_DB):
+
+- legado: journal DELETE, transacciones diferidas y una conexión nueva por
+  petición (la configuración anterior).
+- actual: settings.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, ...),
+  transaction_mode IMMEDIATE y conexiones persistentes.
+
+Cada lector/escritor es un proceso aparte (así el lock que se mide es el
+de SQLite y no el GIL) que llama a las vistas sin servidor HTTP; después de
+cada operación se hace lo que Django hace al terminar una petición
+(close_old_connections). La caché de respuestas se desactiva para que cada
+lectura llegue a la base. Se informan operaciones por segundo, latencias
+p50/p95 y errores ("database is locked").
+
+Uso: python scripts/bench_concurrencia.py [--lectores 4] [--escritores 2] [--segundos 10]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import bench_utils
+
+FILAS_BASE = 100_000
+
+
+def aplicar_perfil(perfil):
+    """Ajusta settings antes de django.setup() (las conexiones se abren después)."""
+    from django.conf import settings
+    base = settings.DATABASES['default']
+    if perfil == 'legado':
+        settings.SQLITE_PRAGMAS = {'journal_mode': 'DELETE'}
+        base['OPTIONS'] = {}
+        base['CONN_MAX_AGE'] = 0
+        base['CONN_HEALTH_CHECKS'] = False
+    settings.CACHES['bench'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    settings.CACHE_RESPUESTAS = 'bench'
+
+
+def trabajar(rol, indice, segundos):
+    """Proceso hijo: repite su operación durante `segundos` e imprime métricas en JSON."""
+    from django.db import close_old_connections
+    from gestion.views import EstadisticasReferidosView, ReporteDiarioView, VisitanteViewSet
+
+    rnd = random.Random(indice)
+    if rol == 'lector':
+        vistas = [
+            (VisitanteViewSet.as_view({'get': 'estadisticas'}), '/api/dashboard/estadisticas/'),
+            (ReporteDiarioView.as_view(), '/api/reportes/diario/'),
+            (EstadisticasReferidosView.as_view(), '/api/estadisticas/referidos/'),
+        ]
+
+        def operacion(n):
+            vista, ruta = vistas[n % len(vistas)]
+            return bench_utils.llamar_vista(vista, ruta)
+    else:
+        crear = VisitanteViewSet.as_view({'post': 'create'})
+
+        def operacion(n):
+            return bench_utils.llamar_vista(crear, '/api/visitantes/', method='post', data={
+                'nombre': f'{rnd.choice(bench_utils.NOMBRES)} {rnd.choice(bench_utils.APELLIDOS)}',
+                'cedula': str(rnd.randint(10_000_000, 10_002_000)),
+                'telefono': '04141234567',
+                'municipio': rnd.choice(bench_utils.MUNICIPIOS),
+                'parroquia': rnd.choice(bench_utils.PARROQUIAS),
+                'tipo_visita': 'ASESORIA',
+                'referir_a': 'NO_REFERIDO',
+            }, headers={'X-Usuario': 'recepcion'})
+
+    latencias, errores, n = [], 0, indice
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        n += 1
+        inicio = time.perf_counter()
+        try:
+            respuesta = operacion(n)
+            if respuesta.status_code >= 400:
+                errores += 1
+            else:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+        except Exception:
+            # OperationalError: database is locked (el busy timeout se agotó)
+            errores += 1
+        close_old_connections()
+    print(json.dumps({'latencias': latencias, 'errores': errores, 'segundos': segundos}))
+
+
+def resumir(resultados):
+    latencias = sorted(l for r in resultados for l in r['latencias'])
+    errores = sum(r['errores'] for r in resultados)
+    segundos = resultados[0]['segundos']
+    if not latencias:
+        return 0.0, 0.0, 0.0, errores
+    p95 = latencias[max(int(len(latencias) * 0.95) - 1, 0)]
+    return len(latencias) / segundos, statistics.median(latencias), p95, errores
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lectores', type=int, default=4)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--rol', choices=['preparar', 'lector', 'escritor'], help=argparse.SUPPRESS)
+    parser.add_argument('--perfil', choices=['legado', 'actual'], help=argparse.SUPPRESS)
+    parser.add_argument('--indice', type=int, default=0, help=argparse.SUPPRESS)
+    opciones = parser.parse_args()
+
+    if opciones.rol:
+        aplicar_perfil(opciones.perfil)
+        bench_utils.setup(migrar=False)
+        if opciones.rol == 'preparar':
+            from django.db import connection
+            connection.ensure_connection()
+        else:
+            trabajar(opciones.rol, opciones.indice, opciones.segundos)
+        return
+
+    bench_utils.setup()
+    bench_utils.seed(FILAS_BASE)
+    # Con una conexión abierta no se puede cambiar journal_mode
+    from django.db import connections
+    connections.close_all()
+
+    print(f'{opciones.lectores} lectores, {opciones.escritores} escritores, {opciones.segundos:g}s por perfil')
+    print(f'{"perfil":<8} {"rol":<9} {"ops/s":>8} {"p50 ms":>8} {"p95 ms":>9} {"errores":>8}')
+    for perfil in ('legado', 'actual'):
+        # journal_mode se guarda en el archivo: se fija antes de lanzar los procesos
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--rol', 'preparar', '--perfil', perfil],
+                       check=True)
+
+        procesos = []
+        for rol, cantidad in (('lector', opciones.lectores), ('escritor', opciones.escritores)):
+            for i in range(cantidad):
+                comando = [sys.executable, os.path.abspath(__file__), '--rol', rol, '--perfil', perfil,
+                           '--indice', str(i), '--segundos', str(opciones.segundos)]
+                procesos.append((rol, subprocess.Popen(comando, stdout=subprocess.PIPE, text=True)))
+        resultados = {'lector': [], 'escritor': []}
+        for rol, proceso in procesos:
+            salida, _ = proceso.communicate()
+            resultados[rol].append(json.loads(salida.strip().splitlines()[-1]))
+        for rol in ('lector', 'escritor'):
+            if resultados[rol]:
+                ops, p50, p95, errores = resumir(resultados[rol])
+                print(f'{perfil:<8} {rol:<9} {ops:>8.1f} {p50:>8.1f} {p95:>9.1f} {errores:>8}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Benchmark de escritura de /api/visitantes/ (alta y edición sostenidas).
+
+Compara el flujo anterior (varios save() en autocommit: visitante, segundo
+save de auditoría y reenlace de persona) con el actual (una transacción,
+un INSERT/UPDATE con la persona ya resuelta y update_fields). Reporta
+peticiones por segundo y transacciones (commits en disco) por petición,
+llamando al ViewSet sin servidor HTTP.
+
+Uso: python scripts/bench_escritura.py [peticiones]   (por defecto 500)
+"""
+import random
+import sys
+import time
+
+import bench_utils
+
+FILAS_BASE = 50_000
+
+
+def viewset_anterior():
+    """VisitanteViewSet con el perform_create/perform_update previos (un commit por save)."""
+    from gestion.models import Persona, VisitanteEvento
+    from gestion.views import VisitanteViewSet
+
+    class VisitanteViewSetAnterior(VisitanteViewSet):
+        def perform_create(self, serializer):
+            usuario = self._usuario_actual()
+            persona, _ = Persona.objects.get_or_create(
+                cedula=serializer.validated_data['cedula'],
+                defaults={'nombre': serializer.validated_data.get('nombre', '')},
+            )
+            instance = serializer.save(persona=persona)
+            instance.creado_por = instance.actualizado_por = usuario
+            instance.save()
+            VisitanteEvento.objects.create(visitante=instance, accion=VisitanteEvento.CREADO, usuario=usuario)
+
+        def perform_update(self, serializer):
+            usuario = self._usuario_actual()
+            instance = serializer.save()
+            persona, _ = Persona.objects.get_or_create(
+                cedula=serializer.validated_data['cedula'],
+                defaults={'nombre': serializer.validated_data.get('nombre', '')},
+            )
+            if instance.persona != persona:
+                instance.persona = persona
+                instance.save()
+            instance.actualizado_por = usuario
+            instance.save()
+            VisitanteEvento.objects.create(visitante=instance, accion=VisitanteEvento.ACTUALIZADO, usuario=usuario)
+
+    return VisitanteViewSetAnterior
+
+
+def contar_transacciones(fn):
+    """Cuenta los commits de fn: COMMIT explícitos más escrituras sueltas en autocommit."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with CaptureQueriesContext(connection) as ctx:
+        fn()
+    transacciones, abierta = 0, False
+    for consulta in ctx.captured_queries:
+        sql = consulta['sql'].lstrip().upper()
+        if sql.startswith('BEGIN'):
+            abierta = True
+        elif sql.startswith('COMMIT'):
+            abierta = False
+            transacciones += 1
+        elif not abierta and sql.startswith(('INSERT', 'UPDATE', 'DELETE')):
+            transacciones += 1
+    return transacciones
+
+
+def cuerpo(rnd):
+    return {
+        'nombre': f'{rnd.choice(bench_utils.NOMBRES)} {rnd.choice(bench_utils.APELLIDOS)}',
+        # Un grupo reducido de cédulas para que se repitan personas, como en la práctica
+        'cedula': str(rnd.randint(10_000_000, 10_002_000)),
+        'telefono': '04141234567',
+        'municipio': rnd.choice(bench_utils.MUNICIPIOS),
+        'parroquia': rnd.choice(bench_utils.PARROQUIAS),
+        'tipo_visita': 'ASESORIA',
+        'referir_a': 'NO_REFERIDO',
+    }
+
+
+def carga(viewset, peticiones, semilla):
+    """Crea `peticiones` visitantes y luego edita cada uno; devuelve métricas de ambas fases."""
+    crear = viewset.as_view({'post': 'create'})
+    editar = viewset.as_view({'put': 'update'})
+    cabeceras = {'X-Usuario': 'recepcion'}
+    rnd = random.Random(semilla)
+
+    ids = []
+    t0 = time.perf_counter()
+    for _ in range(peticiones):
+        respuesta = bench_utils.llamar_vista(crear, '/api/visitantes/', method='post', data=cuerpo(rnd), headers=cabeceras)
+        ids.append(respuesta.data['id'])
+    alta = peticiones / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for pk in ids:
+        bench_utils.llamar_vista(editar, f'/api/visitantes/{pk}/', method='put', data=cuerpo(rnd), headers=cabeceras, pk=pk)
+    edicion = peticiones / (time.perf_counter() - t0)
+
+    commits_alta = contar_transacciones(lambda: bench_utils.llamar_vista(
+        crear, '/api/visitantes/', method='post', data=cuerpo(rnd), headers=cabeceras))
+    commits_edicion = contar_transacciones(lambda: bench_utils.llamar_vista(
+        editar, f'/api/visitantes/{ids[0]}/', method='put', data=cuerpo(rnd), headers=cabeceras, pk=ids[0]))
+    return alta, commits_alta, edicion, commits_edicion
+
+
+def run():
+    peticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    bench_utils.setup()
+    bench_utils.seed(FILAS_BASE)
+
+    from gestion.views import VisitanteViewSet
+
+    print(f'{"flujo":<10} {"altas/s":>9} {"commits":>8} {"ediciones/s":>12} {"commits":>8}')
+    for nombre, viewset, semilla in (('anterior', viewset_anterior(), 1), ('actual', VisitanteViewSet, 2)):
+        alta, commits_alta, edicion, commits_edicion = carga(viewset, peticiones, semilla)
+        print(f'{nombre:<10} {alta:>9.1f} {commits_alta:>8} {edicion:>12.1f} {commits_edicion:>8}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Benchmark de ReporteDiarioView (?days=14/90/365).
+
+Compara el bucle anterior (un COUNT por día con fecha_hora_ingreso__date=)
+con la consulta agrupada por TruncDate.
+
+Uso: python scripts/bench_reporte_diario.py [filas]   (por defecto 500000)
+"""
+import sys
+from datetime import timedelta
+
+import bench_utils
+
+
+def reporte_diario_por_dia(dias):
+    """Implementación anterior: una consulta por día."""
+    from django.utils import timezone
+    from gestion.models import Visitante
+    hoy = timezone.localdate()
+    return [
+        Visitante.objects.filter(fecha_hora_ingreso__date=hoy - timedelta(days=i)).count()
+        for i in range(dias - 1, -1, -1)
+    ]
+
+
+def run():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    bench_utils.setup()
+    bench_utils.seed(filas)
+
+    from gestion.views import ReporteDiarioView
+    view = ReporteDiarioView.as_view()
+
+    # El bucle anterior recorre la tabla completa una vez por día: se mide
+    # una vez con 14 días y se extrapola linealmente para ventanas mayores.
+    base_ms, _ = bench_utils.medir(lambda: reporte_diario_por_dia(14), repeticiones=1, calentamiento=0)
+    por_dia_ms = base_ms / 14
+
+    print(f'{"días":>6} {"anterior ms":>14} {"queries":>8} {"agrupado ms":>12} {"queries":>8}')
+    for dias in (14, 90, 365):
+        marca = ' ' if dias == 14 else '*'
+        llamada = lambda: bench_utils.llamar_vista(view, '/api/reportes/diario/', {'days': dias})
+        despues, _ = bench_utils.medir(llamada)
+        q_despues = bench_utils.contar_queries(llamada)
+        print(f'{dias:>6} {por_dia_ms * dias:>13.1f}{marca} {dias:>8} {despues:>12.1f} {q_despues:>8}')
+    print('* estimado a partir de la medición de 14 días')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""Prueba de carga HTTP: runserver, waitress (WSGI) y uvicorn (ASGI).
+
+Arranca cada servidor en un proceso aparte sobre la base de benchmark
+(BENCH_DB), espera a que /api/salud/ responda y lanza N clientes (hilos con
+conexiones keep-alive) contra el listado de visitantes y los endpoints de
+lectura del dashboard durante unos segundos por caso; por ASGI estos
+últimos son las vistas async de gestion/views_async.py. Informa peticiones
+por segundo, latencias p50/p95 y errores.
+
+La caché de respuestas se desactiva en el servidor (cada petición consulta
+la base) salvo con --con-cache. Los clientes corren en este proceso y los
+servidores en otro, así no compiten por el mismo GIL.
+
+Uso: python scripts/bench_servidor.py [--filas 100000] [--clientes 8] [--segundos 10]
+                                      [--hilos 8] [--con-cache]
+                                      [--servidores runserver,waitress,uvicorn]
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import bench_utils
+
+ENDPOINTS = [
+    ('listado', '/api/visitantes/?page={n}'),
+    ('dashboard/estadisticas', '/api/dashboard/estadisticas/'),
+    ('reportes/estadisticas', '/api/reportes/estadisticas/'),
+    ('reportes/diario', '/api/reportes/diario/'),
+    ('estadisticas/referidos', '/api/estadisticas/referidos/'),
+    ('opciones/tipos-visita', '/api/opciones/tipos-visita/'),
+]
+SERVIDORES = ('runserver', 'waitress', 'uvicorn')
+
+
+def servir(tipo, puerto, hilos, con_cache):
+    """Proceso hijo: sirve la base de benchmark con runserver, waitress o uvicorn."""
+    from django.conf import settings
+    if not con_cache:
+        settings.CACHES['bench'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        settings.CACHE_RESPUESTAS = 'bench'
+    bench_utils.setup()
+    if tipo == 'waitress':
+        from RegistroVisitas_Backend import servidor
+        from RegistroVisitas_Backend.wsgi import application
+        # Con log de accesos como en producción, pero fuera del proyecto
+        servidor.configurar_log(os.path.join(tempfile.gettempdir(), 'ejus_bench_accesos.log'))
+        instancia = servidor.Servidor(application, host='127.0.0.1', puerto=puerto, hilos=hilos)
+        signal.signal(signal.SIGTERM, instancia.detener)
+        instancia.ejecutar()
+    elif tipo == 'uvicorn':
+        import uvicorn
+        from RegistroVisitas_Backend import servidor
+        from RegistroVisitas_Backend.asgi import application
+        servidor.configurar_log(os.path.join(tempfile.gettempdir(), 'ejus_bench_accesos.log'))
+        uvicorn.run(servidor.RegistroAccesosASGI(application), host='127.0.0.1', port=puerto,
+                    http='h11', loop='asyncio', lifespan='off', log_config=None, access_log=False)
+    else:
+        # Lo que hace "manage.py runserver --noreload" una vez pasadas las comprobaciones
+        from django.core.servers.basehttp import get_internal_wsgi_application, run
+        run('127.0.0.1', puerto, get_internal_wsgi_application(), threading=True)
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar_salud(puerto, limite=60):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=5)
+            conexion.request('GET', '/api/salud/')
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'El servidor no respondió en el puerto {puerto}')
+
+
+def cargar(puerto, ruta, clientes, segundos):
+    """Lanza `clientes` hilos contra la ruta; devuelve (req/s, p50 ms, p95 ms, errores)."""
+    latencias = []
+    errores = [0]
+    lock = threading.Lock()
+    fin = time.monotonic() + segundos
+
+    def cliente(indice):
+        conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+        propias = []
+        fallos = 0
+        n = indice
+        while time.monotonic() < fin:
+            # Páginas distintas por cliente para no pedir siempre lo mismo
+            n = n % 50 + 1
+            inicio = time.perf_counter()
+            try:
+                conexion.request('GET', ruta.format(n=n))
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status != 200:
+                    fallos += 1
+                    continue
+                propias.append((time.perf_counter() - inicio) * 1000)
+            except (OSError, http.client.HTTPException):
+                fallos += 1
+                conexion.close()
+                conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+        conexion.close()
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallos
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    if not latencias:
+        return 0.0, 0.0, 0.0, errores[0]
+    latencias.sort()
+    return (
+        len(latencias) / duracion,
+        statistics.median(latencias),
+        latencias[int(len(latencias) * 0.95) - 1],
+        errores[0],
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=100_000)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--hilos', type=int, default=8, help='Hilos de waitress')
+    parser.add_argument('--con-cache', action='store_true')
+    parser.add_argument('--servidores', default=','.join(SERVIDORES))
+    parser.add_argument('--servir', choices=SERVIDORES, help=argparse.SUPPRESS)
+    parser.add_argument('--puerto', type=int, help=argparse.SUPPRESS)
+    opciones = parser.parse_args()
+
+    if opciones.servir:
+        servir(opciones.servir, opciones.puerto, opciones.hilos, opciones.con_cache)
+        return
+
+    # Siembra (y migra) una vez antes de arrancar los servidores
+    bench_utils.setup()
+    bench_utils.seed(opciones.filas)
+    from django.db import connections
+    connections.close_all()
+
+    print(f'{opciones.clientes} clientes, {opciones.segundos:g}s por caso, '
+          f'caché de respuestas {"activa" if opciones.con_cache else "desactivada"}')
+    print(f'{"servidor":<10} {"endpoint":<24} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"errores":>8}')
+    for tipo in opciones.servidores.split(','):
+        puerto = _puerto_libre()
+        comando = [sys.executable, os.path.abspath(__file__), '--servir', tipo, '--puerto', str(puerto),
+                   '--hilos', str(opciones.hilos)]
+        if opciones.con_cache:
+            comando.append('--con-cache')
+        proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _esperar_salud(puerto)
+            for nombre, ruta in ENDPOINTS:
+                # Calentamiento: imports perezosos, conexiones, plan de consultas
+                cargar(puerto, ruta, 1, 1)
+                rps, p50, p95, errores = cargar(puerto, ruta, opciones.clientes, opciones.segundos)
+                print(f'{tipo:<10} {nombre:<24} {rps:>8.1f} {p50:>8.1f} {p95:>8.1f} {errores:>8}')
+        finally:
+            proceso.terminate()
+            proceso.wait(30)
+
+
+if __name__ == '__main__':
+    run()
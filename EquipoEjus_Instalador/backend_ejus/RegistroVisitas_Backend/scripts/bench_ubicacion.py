@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Benchmark de los filtros y agrupaciones por municipio/parroquia.
+
+Mide el listado filtrado por municipio (nombre exacto y parcial), el
+reporte de estadísticas filtrado (incluye la parroquia más visitada, que se
+agrupa sobre Visitante), la agrupación municipio/parroquia sobre Visitante,
+la reconstrucción del rollup y el tamaño de la base.
+
+El esquema cambia de texto a claves del catálogo, así que no hay una
+versión "anterior" dentro del script: se ejecuta con el código de cada
+versión sobre una copia de la misma base (BENCH_DB) y se comparan las
+tablas. Las cachés de respuesta se invalidan antes de cada medición.
+
+Uso: python scripts/bench_ubicacion.py [filas]   (por defecto 1000000)
+"""
+import sys
+
+import bench_utils
+
+
+def run():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bench_utils.setup()
+    bench_utils.seed(filas)
+
+    from django.db import connection
+    from django.db.models import Count
+    from gestion import rollups
+    from gestion.cache import invalidar
+    from gestion.models import Visitante
+    from gestion.views import ReporteEstadisticasView, VisitanteViewSet
+
+    listado = VisitanteViewSet.as_view({'get': 'list'})
+    # La paginación arma enlaces absolutos: el host debe estar en ALLOWED_HOSTS
+    cabeceras = {'Host': 'localhost'}
+    estadisticas = ReporteEstadisticasView.as_view()
+
+    def en_frio(fn):
+        def medicion():
+            invalidar()
+            return fn()
+        return medicion
+
+    casos = [
+        ('listado ?municipio=Iribarren', en_frio(lambda: bench_utils.llamar_vista(
+            listado, '/api/visitantes/', {'municipio': 'Iribarren'}, headers=cabeceras))),
+        ('listado ?municipio=pala', en_frio(lambda: bench_utils.llamar_vista(
+            listado, '/api/visitantes/', {'municipio': 'pala'}, headers=cabeceras))),
+        ('estadísticas ?municipio=Torres', en_frio(lambda: bench_utils.llamar_vista(
+            estadisticas, '/api/reportes/estadisticas/', {'municipio': 'Torres'}))),
+        ('GROUP BY municipio, parroquia', lambda: list(
+            Visitante.objects.values('municipio', 'parroquia').annotate(n=Count('id')).order_by())),
+        ('rollups.reconstruir()', rollups.reconstruir),
+    ]
+
+    print(f'{"caso":<34} {"mediana ms":>11} {"mín ms":>9} {"queries":>8}')
+    for nombre, fn in casos:
+        if fn is rollups.reconstruir:
+            mediana, minimo = bench_utils.medir(fn, repeticiones=1, calentamiento=0)
+        else:
+            mediana, minimo = bench_utils.medir(fn)
+        print(f'{nombre:<34} {mediana:>11.1f} {minimo:>9.1f} {bench_utils.contar_queries(fn):>8}')
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'gestion_visitante%'")
+        tamano = cursor.fetchone()[0]
+    print(f'gestion_visitante + índices + FTS: {tamano / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,136 @@
+"""Utilidades compartidas por los scripts de benchmark (scripts/bench_*.py).
+
+Los benchmarks NUNCA usan db.sqlite3: trabajan sobre una base aparte
+(por defecto bench.sqlite3 junto a manage.py, o la ruta en BENCH_DB) que se
+migra y se siembra con datos sintéticos la primera vez.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RegistroVisitas_Backend.settings')
+
+MUNICIPIOS = [
+    'Iribarren', 'Palavecino', 'Torres', 'Jiménez', 'Morán', 'Crespo',
+    'Urdaneta', 'Andrés Eloy Blanco', 'Simón Planas',
+]
+PARROQUIAS = [
+    'Catedral', 'Concepción', 'El Cují', 'Juan de Villegas', 'Santa Rosa',
+    'Tamaca', 'Unión', 'Cabudare', 'José Gregorio Bastidas', 'Agua Viva',
+]
+NOMBRES = ['José', 'María', 'Luis', 'Ana', 'Carlos', 'Rosa', 'Pedro', 'Carmen', 'Jesús', 'Yolanda']
+APELLIDOS = ['Pérez', 'González', 'Rodríguez', 'Hernández', 'García', 'Martínez', 'López', 'Díaz']
+
+
+def setup(db_path=None, migrar=True):
+    """Configura Django apuntando a la base de benchmark y la migra.
+
+    migrar=False para procesos auxiliares que usan una base ya migrada.
+    """
+    from django.conf import settings
+    db_path = db_path or os.environ.get('BENCH_DB') or os.path.join(BASE_DIR, 'bench.sqlite3')
+    # Debe hacerse antes de django.setup(): las conexiones se crean perezosamente
+    settings.DATABASES['default']['NAME'] = db_path
+    import django
+    django.setup()
+    if migrar:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    return db_path
+
+
+def seed(n, days=730, batch=5000):
+    """Asegura que la tabla Visitante tenga al menos n filas repartidas en `days` días."""
+    from django.db import transaction
+    from django.utils import timezone
+    from gestion import catalogo
+    from gestion.models import Visitante
+
+    actuales = Visitante.objects.count()
+    if actuales >= n:
+        return actuales
+
+    rnd = random.Random(42)
+    tipos = [c[0] for c in Visitante.TIPO_VISITA_CHOICES]
+    instituciones = [c[0] for c in Visitante.INSTITUCION_CHOICES]
+    ahora = timezone.now()
+    ubicaciones = [catalogo.resolver(m, p) for m in MUNICIPIOS for p in PARROQUIAS]
+    faltan = n - actuales
+    print(f'Sembrando {faltan} visitantes en {os.path.basename(str(_db_name()))}...')
+    t0 = time.perf_counter()
+    while faltan > 0:
+        lote = []
+        for _ in range(min(batch, faltan)):
+            ingreso = ahora - timedelta(seconds=rnd.randint(0, days * 86400))
+            completada = rnd.random() < 0.8
+            referir = 'NO_REFERIDO' if rnd.random() < 0.6 else rnd.choice(instituciones)
+            municipio, parroquia = rnd.choice(ubicaciones)
+            lote.append(Visitante(
+                nombre=f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}',
+                cedula=str(rnd.randint(1_000_000, 30_000_000)),
+                telefono=f'0414{rnd.randint(1000000, 9999999)}',
+                municipio=municipio,
+                parroquia=parroquia,
+                tipo_visita=rnd.choice(tipos),
+                referir_a=referir,
+                otra_institucion='Consejo Comunal' if referir == 'OTRA_INSTITUCION' else None,
+                fecha_hora_ingreso=ingreso,
+                fecha_hora_salida=ingreso + timedelta(minutes=rnd.randint(5, 120)) if completada else None,
+                atencion_completada=completada,
+            ))
+        with transaction.atomic():
+            Visitante.objects.bulk_create(lote, batch_size=batch)
+        faltan -= len(lote)
+    # bulk_create no emite señales: recalcular el rollup diario de una vez
+    from gestion import rollups
+    rollups.reconstruir()
+    print(f'Sembrado en {time.perf_counter() - t0:.1f}s')
+    return Visitante.objects.count()
+
+
+def _db_name():
+    from django.conf import settings
+    return settings.DATABASES['default']['NAME']
+
+
+def medir(fn, repeticiones=5, calentamiento=1):
+    """Ejecuta fn varias veces y devuelve (mediana, mínimo) en milisegundos."""
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos), min(tiempos)
+
+
+def contar_queries(fn):
+    """Devuelve el número de consultas SQL que ejecuta fn."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with CaptureQueriesContext(connection) as ctx:
+        fn()
+    return len(ctx.captured_queries)
+
+
+def llamar_vista(view, path, params=None, method='get', data=None, headers=None, **kwargs):
+    """Invoca una vista DRF directamente (sin servidor HTTP) y devuelve la respuesta.
+
+    kwargs se pasan a la vista (p. ej. pk=... para acciones de detalle).
+    """
+    from rest_framework.test import APIRequestFactory
+    factory = APIRequestFactory()
+    if method == 'get':
+        request = factory.get(path, params or {}, headers=headers)
+    else:
+        request = getattr(factory, method)(path, data or {}, format='json', headers=headers)
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
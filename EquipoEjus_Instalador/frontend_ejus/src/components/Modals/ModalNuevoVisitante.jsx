@@ -14,8 +14,8 @@ const ModalNuevoVisitante = ({ isOpen, onClose, onSuccess }) => {
       const resp = await tsjService.createVisitante(formData);
       const created = resp.data;
       let message = 'Visitante creado exitosamente';
-      if (created?.historial) {
-        message += `\n\nHistorial:\n${created.historial}`;
+      if (created?.creado_por) {
+        message += `\n\nCreado por: ${created.creado_por}`;
       }
       showToast(message, 'success');
       onSuccess?.();
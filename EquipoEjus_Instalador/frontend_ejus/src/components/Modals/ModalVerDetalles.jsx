@@ -135,12 +135,15 @@ const ModalVerDetalles = ({ isOpen, onClose, visitante }) => {
                 </div>
               )}
 
-              {visitante.historial && (
+              {visitante.eventos?.length > 0 && (
                 <div className="detalle-item full-width">
                   <label>Historial</label>
                   <div className="historial-content">
-                    {visitante.historial.split('\n').map((line, idx) => (
-                      <div key={idx} className="historial-line">{line}</div>
+                    {visitante.eventos.map((evento) => (
+                      <div key={evento.id} className="historial-line">
+                        {new Date(evento.fecha).toLocaleString('es-VE')} - {evento.detalle || evento.accion_display}
+                        {evento.usuario && ` (${evento.usuario})`}
+                      </div>
                     ))}
                   </div>
                 </div>
@@ -118,9 +118,16 @@ const Registrar = () => {
   // ========== FUNCIONES PARA MODALES ==========
   
   // Ver detalles
-  const handleAbrirVer = (visitante) => {
+  const handleAbrirVer = async (visitante) => {
     setSelectedVisitante(visitante);
     setModalVerOpen(true);
+    // El listado no trae el historial de eventos: se pide el detalle completo
+    try {
+      const resp = await tsjService.getVisitante(visitante.id);
+      setSelectedVisitante((actual) => (actual?.id === visitante.id ? resp.data : actual));
+    } catch (err) {
+      console.error('Error cargando detalle del visitante:', err);
+    }
   };
 
   // Historial por cédula (abre modal específico)
@@ -53,6 +53,28 @@ api.interceptors.response.use(
     }
 );
 
+// Los reportes PDF/Excel se generan en segundo plano en el backend: se encola
+// el job, se consulta su estado y al terminar se descarga el archivo.
+const INTERVALO_SONDEO_MS = 1000;
+const MAX_ESPERA_REPORTE_MS = 10 * 60 * 1000;
+
+const generarReporteEnSegundoPlano = async (tipo, parametros) => {
+    const { data: job } = await api.post('/reportes/jobs/', { tipo, parametros });
+    const limite = Date.now() + MAX_ESPERA_REPORTE_MS;
+    let estado = job;
+    while (estado.estado === 'PENDIENTE' || estado.estado === 'EN_PROCESO') {
+        if (Date.now() > limite) {
+            throw new Error('El reporte tardó demasiado en generarse');
+        }
+        await new Promise((resolve) => setTimeout(resolve, INTERVALO_SONDEO_MS));
+        estado = (await api.get(`/reportes/jobs/${job.id}/`)).data;
+    }
+    if (estado.estado !== 'COMPLETADO') {
+        throw new Error(estado.error || 'Error generando el reporte');
+    }
+    return api.get(`/reportes/jobs/${job.id}/descargar/`, { responseType: 'blob' });
+};
+
 export const tsjService = {
     // Visitantes
     getVisitantes: (params) => api.get('/visitantes/', { params }),
@@ -150,12 +172,7 @@ export const tsjService = {
 
     exportarReportePDF: async (periodo = 'mes', filters = {}) => {
         try {
-            const params = { periodo, ...filters };
-            const response = await api.get('/reportes/exportar/pdf/', {
-                params,
-                responseType: 'blob'
-            });
-            return response;
+            return await generarReporteEnSegundoPlano('pdf', { periodo, ...filters });
         } catch (error) {
             console.error('Error exportando PDF:', error);
             throw error;
@@ -164,17 +181,12 @@ export const tsjService = {
 
     exportarReporteExcel: async (periodo = 'mes', filters = {}) => {
         try {
-            const params = { periodo, ...filters };
-            const response = await api.get('/reportes/exportar/excel/', {
-                params,
-                responseType: 'blob'
-            });
-            return response;
+            return await generarReporteEnSegundoPlano('excel', { periodo, ...filters });
         } catch (error) {
             console.error('Error exportando Excel:', error);
             throw error;
         }
-    }
+    },
 };
 
 // Update endpoints
@@ -19,7 +19,8 @@ function startDjango() {
   
   backendDir = path.dirname(backendPath);
 
-  djangoProcess = spawn(backendPath, ['runserver', '127.0.0.1:8000', '--noreload'], {
+  // Servidor de producción (waitress); sin --produccion arranca runserver
+  djangoProcess = spawn(backendPath, ['--produccion', '--host', '127.0.0.1', '--puerto', '8000'], {
     shell: false,
     cwd: backendDir // Asegura que la DB se lea de la carpeta de instalación
   });